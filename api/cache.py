@@ -0,0 +1,174 @@
+import functools
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Protocol, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import ResponseValidationError
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.metrics import REGISTRY
+
+CACHE_MAX_ENTRIES = int(os.getenv('API_CACHE_MAX_ENTRIES', '1024'))
+CACHE_MAX_AGE = int(os.getenv('API_CACHE_MAX_AGE', '60'))
+DATA_VERSION_TTL = float(os.getenv('API_DATA_VERSION_TTL', '5'))
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "api_response_cache_requests_total", "Report cache lookups by outcome", ["result"]
+)
+
+# One entity-tag (optionally weak) or "*" from an If-None-Match list
+_ETAG_LIST_ITEM = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of ``etag`` against an ``If-None-Match`` header (RFC 9110)."""
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in _ETAG_LIST_ITEM.findall(if_none_match or ""):
+        if candidate == "*" or (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+@functools.lru_cache(maxsize=None)
+def _adapter(response_model: Any) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def serialize(data: Any, response_model: Any = None) -> bytes:
+    """JSON body for ``data``, validated and filtered through ``response_model`` like FastAPI does."""
+    if response_model is None:
+        return json.dumps(jsonable_encoder(data), ensure_ascii=False).encode("utf-8")
+    adapter = _adapter(response_model)
+    try:
+        return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+    except ValidationError as e:
+        raise ResponseValidationError(errors=e.errors(include_url=False), body=data)
+
+
+class CacheBackend(Protocol):
+    """Storage used by ``ResponseCache``; swap in e.g. a Redis adapter to share entries across workers."""
+
+    def get(self, key: str) -> Optional[bytes]: ...
+
+    def set(self, key: str, value: bytes) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class LRUBackend:
+    """In-process LRU keyed by string, holding serialized response bodies."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max(max_entries, 1)
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ResponseCache:
+    """Cache JSON report responses until the warehouse data version changes.
+
+    The data version is the stamp in ``raw.data_version`` that the pipeline
+    bumps after ``dbt run``/``dbt test`` succeed; it is re-read at most every
+    ``version_ttl`` seconds. Keys combine the version, path and sorted query
+    parameters, and the ETag is derived from the key, so a matching
+    ``If-None-Match`` is answered with 304 without touching the database.
+    Bodies are validated against the endpoint's ``response_model`` before
+    they are cached, since the raw ``Response`` bypasses FastAPI's check.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        max_age: int = CACHE_MAX_AGE,
+        version_ttl: float = DATA_VERSION_TTL,
+    ) -> None:
+        self.backend = backend or LRUBackend()
+        self.max_age = max_age
+        self.version_ttl = version_ttl
+        self._version: Optional[str] = None
+        self._version_checked = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    async def data_version(self, db: AsyncSession) -> str:
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked >= self.version_ttl:
+            try:
+                result = await db.execute(text("SELECT version FROM raw.data_version WHERE id = 1"))
+                version = str(result.scalar_one_or_none() or 0)
+            except Exception:
+                # Table not created yet (no pipeline run): treat as version 0
+                await db.rollback()
+                version = "0"
+            if version != self._version:
+                self.backend.clear()
+            self._version, self._version_checked = version, now
+        return self._version
+
+    @staticmethod
+    def cache_key(request: Request, version: str) -> Tuple[str, str]:
+        params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        key = f"{version}|{request.url.path}?{params}"
+        etag = '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + '"'
+        return key, etag
+
+    def _headers(self, etag: str, version: str) -> dict:
+        return {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={self.max_age}, must-revalidate",
+            "X-Data-Version": version,
+        }
+
+    async def respond(
+        self,
+        request: Request,
+        db: AsyncSession,
+        produce: Callable[[], Awaitable[Any]],
+        response_model: Any = None,
+    ) -> Response:
+        version = await self.data_version(db)
+        key, etag = self.cache_key(request, version)
+        headers = self._headers(etag, version)
+
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            CACHE_REQUESTS.inc(result="not_modified")
+            return Response(status_code=304, headers=headers)
+
+        body = self.backend.get(key)
+        if body is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc(result="miss")
+            body = serialize(await produce(), response_model)
+            self.backend.set(key, body)
+        else:
+            self.hits += 1
+            CACHE_REQUESTS.inc(result="hit")
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,180 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import anyio
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncResult
+from sqlalchemy.sql.elements import TextClause
+
+from src.metrics import REGISTRY
+from . import database
+
+EXPORT_FETCH_SIZE = int(os.getenv('API_EXPORT_FETCH_SIZE', '2000'))
+# Exports legitimately outlive the API's default statement timeout
+EXPORT_STATEMENT_TIMEOUT_MS = int(os.getenv('API_EXPORT_STATEMENT_TIMEOUT_MS', '600000'))
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+EXPORT_ROWS = REGISTRY.counter(
+    "api_export_rows_total", "Rows streamed by the bulk export endpoints", ["table", "format"]
+)
+
+# Columns are selected explicitly: exports are a public contract, not SELECT *
+EXPORTS: Dict[str, Dict[str, Any]] = {
+    "fct_messages": {
+        "columns": [
+            ("f.message_id", "message_id"),
+            ("c.channel_name", "channel_name"),
+            ("f.message_date", "message_date"),
+            ("f.message_text", "message_text"),
+            ("f.message_length", "message_length"),
+            ("f.view_count", "view_count"),
+            ("f.forward_count", "forward_count"),
+            ("f.has_media", "has_media"),
+            ("f.image_path", "image_path"),
+        ],
+        "from": """
+            dbt_maireg.fct_messages f
+            JOIN dbt_maireg.dim_channels c ON f.channel_key = c.channel_key
+        """,
+    },
+    "fct_image_detections": {
+        "columns": [
+            ("d.message_id", "message_id"),
+            ("c.channel_name", "channel_name"),
+            ("f.message_date", "message_date"),
+            ("d.image_category", "image_category"),
+            ("d.detected_class", "detected_class"),
+            ("d.confidence_score", "confidence_score"),
+            ("d.detected_at", "detected_at"),
+        ],
+        "from": """
+            dbt_maireg.fct_image_detections d
+            JOIN dbt_maireg.fct_messages f ON f.message_key = d.message_key
+            JOIN dbt_maireg.dim_channels c ON d.channel_key = c.channel_key
+        """,
+    },
+}
+
+
+def build_export_query(
+    table: str,
+    *,
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> Tuple[TextClause, Dict[str, Any], List[str]]:
+    """SELECT for one export table, filtered by channel and message date (inclusive days).
+
+    No ORDER BY: a sort would have to finish before the first row could be
+    sent. Rows come back in scan order.
+    """
+    spec = EXPORTS[table]
+    filters: List[str] = []
+    params: Dict[str, Any] = {}
+    # Filters are appended only when set: asyncpg can't type a bare NULL parameter
+    if channel:
+        filters.append("c.channel_name = :channel")
+        params["channel"] = channel
+    if date_from:
+        filters.append("f.message_date >= :date_from")
+        params["date_from"] = datetime.combine(date_from, time.min)
+    if date_to:
+        filters.append("f.message_date < :date_to")
+        params["date_to"] = datetime.combine(date_to + timedelta(days=1), time.min)
+
+    select_list = ", ".join(f"{expr} AS {name}" for expr, name in spec["columns"])
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    query = text(f"SELECT {select_list} FROM {spec['from']} {where}")
+    return query, params, [name for _, name in spec["columns"]]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def encode_ndjson(rows: Sequence[Row], columns: List[str]) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default) + "\n"
+        for row in rows
+    )
+
+
+def encode_csv(rows: Sequence[Row], columns: Optional[List[str]] = None) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if columns is not None:
+        writer.writerow(columns)
+    writer.writerows(
+        [value.isoformat() if isinstance(value, (datetime, date)) else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue()
+
+
+async def open_export(query: TextClause, params: Dict[str, Any]) -> Tuple[AsyncConnection, AsyncResult]:
+    """Start a server-side cursor on a dedicated connection.
+
+    Run before the response starts, so a failing query still becomes a
+    proper error status instead of a truncated 200. The request-scoped
+    session can't be used: it is closed before a streamed body is sent.
+    """
+    conn = await database.engine.connect()
+    try:
+        await conn.begin()
+        await conn.execute(text(f"SET LOCAL statement_timeout = {int(EXPORT_STATEMENT_TIMEOUT_MS)}"))
+        result = await conn.stream(query.execution_options(yield_per=EXPORT_FETCH_SIZE), params)
+    except Exception:
+        await conn.close()
+        raise
+    return conn, result
+
+
+async def release_export(conn: AsyncConnection, result: AsyncResult) -> None:
+    # Shielded: runs while the request is being cancelled (client disconnect)
+    with anyio.CancelScope(shield=True):
+        # Closing rolls back the read transaction and returns the connection to the pool
+        await result.close()
+        await conn.close()
+
+
+async def stream_export(result: AsyncResult, table: str, columns: List[str], fmt: str) -> AsyncIterator[str]:
+    """Yield the encoded body ``EXPORT_FETCH_SIZE`` rows at a time."""
+    if fmt == "csv":
+        yield encode_csv([], columns)
+    async for rows in result.partitions():
+        EXPORT_ROWS.inc(len(rows), table=table, format=fmt)
+        yield encode_ndjson(rows, columns) if fmt == "ndjson" else encode_csv(rows)
+
+
+class ExportResponse(StreamingResponse):
+    """Streams an opened export and always releases its connection afterwards.
+
+    The release lives in ``__call__`` rather than in the body generator:
+    a generator that never starts (client gone before the first chunk) never
+    runs its ``finally``, and Starlette skips background tasks on disconnect.
+    """
+
+    def __init__(
+        self, conn: AsyncConnection, result: AsyncResult, table: str, columns: List[str], fmt: str, **kwargs: Any
+    ) -> None:
+        super().__init__(stream_export(result, table, columns, fmt), media_type=MEDIA_TYPES[fmt], **kwargs)
+        self.conn = conn
+        self.result = result
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await release_export(self.conn, self.result)
@@ -1,58 +1,220 @@
-from fastapi import FastAPI, Depends, Query
-from sqlalchemy.orm import Session
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from typing import List
+from typing import List, Optional
 from . import database, schemas
+from .cache import response_cache
+from .export import ExportResponse, build_export_query, open_export
+from .search import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, build_search_query, encode_cursor
+from src.metrics import HTTP_LATENCY, REGISTRY
 
-app = FastAPI(title="Medical Telegram Analytics API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await database.engine.dispose()
 
-# 1. Top Products/Mentions
+app = FastAPI(title="Medical Telegram Analytics API", lifespan=lifespan)
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep the series count bounded
+        route = request.scope.get("route")
+        HTTP_LATENCY.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint: request latency histograms and cache counters."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# 1. Top Products (ranked from the precomputed fct_product_mentions mart)
 @app.get("/api/reports/top-products", response_model=List[schemas.ProductMention])
-def get_top_products(limit: int = 10, db: Session = Depends(database.get_db)):
-    query = text("""
-        SELECT f.message_text, c.channel_name 
-        FROM dbt_maireg.fct_messages f
-        JOIN dbt_maireg.dim_channels c ON f.channel_key = c.channel_key
-        WHERE f.message_text IS NOT NULL 
+async def get_top_products(
+    request: Request,
+    limit: int = Query(10, ge=1, le=100),
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: AsyncSession = Depends(database.get_db),
+):
+    # Range on mention_date (+ exact channel) so the mart's indexes serve the filter
+    filters = []
+    params = {"limit": limit}
+    if channel:
+        filters.append("channel_name = :channel")
+        params["channel"] = channel
+    if date_from:
+        filters.append("mention_date >= :date_from")
+        params["date_from"] = date_from
+    if date_to:
+        filters.append("mention_date <= :date_to")
+        params["date_to"] = date_to
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+    query = text(f"""
+        SELECT product, max(product_category), sum(message_count), sum(mention_count),
+               sum(total_views), count(DISTINCT channel_name)
+        FROM dbt_maireg.fct_product_mentions
+        {where}
+        GROUP BY product
+        ORDER BY sum(message_count) DESC, sum(total_views) DESC, product
         LIMIT :limit
     """)
-    result = db.execute(query, {"limit": limit}).fetchall()
-    return [{"message_text": r[0], "channel_name": r[1]} for r in result]
 
-# 2. Channel Activity (Daily Trends)
+    async def produce():
+        result = await database.fetch_all(db, query, params)
+        return [
+            {
+                "product": r[0],
+                "category": r[1],
+                "message_count": r[2],
+                "mention_count": r[3],
+                "total_views": r[4],
+                "channel_count": r[5],
+            }
+            for r in result
+        ]
+
+    return await response_cache.respond(request, db, produce, List[schemas.ProductMention])
+
+# 2. Channel Activity (Daily Trends, pre-aggregated in fct_channel_daily)
 @app.get("/api/channels/{channel_name}/activity", response_model=List[schemas.ChannelActivity])
-def get_channel_activity(channel_name: str, db: Session = Depends(database.get_db)):
-    query = text("""
-        SELECT d.full_date, COUNT(f.message_id)
-        FROM dbt_maireg.fct_messages f
-        JOIN dbt_maireg.dim_channels c ON f.channel_key = c.channel_key
-        JOIN dbt_maireg.dim_dates d ON f.date_key = d.date_key
-        WHERE c.channel_name ILIKE :name
-        GROUP BY d.full_date
-        ORDER BY d.full_date
+async def get_channel_activity(
+    request: Request,
+    channel_name: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: AsyncSession = Depends(database.get_db),
+):
+    # Exact match so the (channel_name, activity_date) index serves a range scan
+    filters = ["channel_name = :name"]
+    params = {"name": channel_name}
+    if date_from:
+        filters.append("activity_date >= :date_from")
+        params["date_from"] = date_from
+    if date_to:
+        filters.append("activity_date <= :date_to")
+        params["date_to"] = date_to
+
+    query = text(f"""
+        SELECT activity_date, message_count, total_views, total_forwards, media_count
+        FROM dbt_maireg.fct_channel_daily
+        WHERE {' AND '.join(filters)}
+        ORDER BY activity_date
     """)
-    result = db.execute(query, {"name": f"%{channel_name}%"}).fetchall()
-    return [{"date": str(r[0]), "message_count": r[1]} for r in result]
 
-# 3. Message Search
+    async def produce():
+        result = await database.fetch_all(db, query, params)
+        return [
+            {
+                "date": str(r[0]),
+                "message_count": r[1],
+                "total_views": r[2],
+                "total_forwards": r[3],
+                "media_count": r[4],
+            }
+            for r in result
+        ]
+
+    return await response_cache.respond(request, db, produce, List[schemas.ChannelActivity])
+
+# 3. Message Search (ranked full-text + trigram, keyset-paginated)
 @app.get("/api/search/messages", response_model=List[schemas.MessageResponse])
-def search_messages(query: str = Query(..., min_length=3), db: Session = Depends(database.get_db)):
-    sql = text("""
-        SELECT message_id, message_text, view_count 
-        FROM dbt_maireg.fct_messages 
-        WHERE message_text ILIKE :q 
-        LIMIT 20
-    """)
-    result = db.execute(sql, {"q": f"%{query}%"}).fetchall()
-    return [{"message_id": r[0], "message_text": r[1], "views": r[2]} for r in result]
+async def search_messages(
+    response: Response,
+    query: str = Query(..., min_length=3),
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(database.get_db),
+):
+    try:
+        sql, params = build_search_query(
+            query, channel=channel, date_from=date_from, date_to=date_to, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = await database.fetch_all(db, sql, params)
+    page = result[:limit]
+    if len(result) > limit:
+        last = page[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last[5], last[6], last[0])
+    return [
+        {
+            "message_id": r[0],
+            "message_text": r[1],
+            "views": r[2],
+            "channel_name": r[3],
+            "message_date": r[4].isoformat() if r[4] else None,
+            "rank": r[5],
+        }
+        for r in page
+    ]
 
 # 4. Visual Content Stats (YOLO Results)
 @app.get("/api/reports/visual-content", response_model=List[schemas.VisualStat])
-def get_visual_stats(db: Session = Depends(database.get_db)):
+async def get_visual_stats(request: Request, db: AsyncSession = Depends(database.get_db)):
     query = text("""
         SELECT image_category, COUNT(*) 
         FROM dbt_maireg.fct_image_detections 
         GROUP BY image_category
     """)
-    result = db.execute(query).fetchall()
-    return [{"image_category": r[0], "count": r[1]} for r in result]
\ No newline at end of file
+
+    async def produce():
+        result = await database.fetch_all(db, query)
+        return [{"image_category": r[0], "count": r[1]} for r in result]
+
+    return await response_cache.respond(request, db, produce, List[schemas.VisualStat])
+
+# 5. Bulk exports: streamed NDJSON/CSV straight off a server-side cursor
+async def export_table(
+    table: str,
+    fmt: str,
+    channel: Optional[str],
+    date_from: Optional[date],
+    date_to: Optional[date],
+) -> ExportResponse:
+    query, params, columns = build_export_query(table, channel=channel, date_from=date_from, date_to=date_to)
+    conn, result = await open_export(query, params)
+    return ExportResponse(
+        conn, result, table, columns, fmt,
+        headers={"Content-Disposition": f'attachment; filename="{table}.{fmt}"'},
+    )
+
+@app.get("/api/export/messages", response_class=StreamingResponse)
+async def export_messages(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    """Every fct_messages row matching the filters, streamed with constant memory."""
+    return await export_table("fct_messages", format, channel, date_from, date_to)
+
+@app.get("/api/export/detections", response_class=StreamingResponse)
+async def export_detections(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    """Every fct_image_detections row matching the filters, streamed with constant memory."""
+    return await export_table("fct_image_detections", format, channel, date_from, date_to)
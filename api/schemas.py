@@ -2,12 +2,19 @@ from pydantic import BaseModel
 from typing import List, Optional
 
 class ProductMention(BaseModel):
-    message_text: Optional[str]
-    channel_name: str
+    product: str
+    category: Optional[str] = None
+    message_count: int
+    mention_count: int
+    total_views: Optional[int] = None
+    channel_count: int
 
 class ChannelActivity(BaseModel):
     date: str
     message_count: int
+    total_views: Optional[int] = None
+    total_forwards: Optional[int] = None
+    media_count: Optional[int] = None
 
 class VisualStat(BaseModel):
     image_category: str
@@ -16,4 +23,7 @@ class VisualStat(BaseModel):
 class MessageResponse(BaseModel):
     message_id: int
     message_text: Optional[str]
-    views: Optional[int]
\ No newline at end of file
+    views: Optional[int]
+    channel_name: Optional[str] = None
+    message_date: Optional[str] = None
+    rank: Optional[float] = None
\ No newline at end of file
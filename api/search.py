@@ -0,0 +1,87 @@
+import base64
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(rank: float, channel_key: str, message_id: int) -> str:
+    raw = json.dumps([rank, channel_key, message_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str, int]:
+    """Inverse of ``encode_cursor``; raises ValueError on a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, channel_key, message_id = json.loads(base64.urlsafe_b64decode(padded))
+        return float(rank), str(channel_key), int(message_id)
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
+def build_search_query(
+    q: str,
+    *,
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[TextClause, Dict[str, Any]]:
+    """Ranked message search over the GIN-indexed tsvector and trigram columns.
+
+    A row matches when its ``search_vector`` matches the web-style query or
+    the query is a close trigram match for a word in the text (catches
+    misspelled drug names). Rank is ``ts_rank + word_similarity``. Pages are
+    keyset-paginated on (rank, channel_key, message_id): results stay stable
+    and no OFFSET rows are skipped, but the rank is computed, not indexed, so
+    every page still scores all matching rows before sorting. The GIN indexes
+    only narrow the match set. One extra row is fetched to detect a next page.
+    """
+    filters = ["(f.search_vector @@ websearch_to_tsquery('simple', :q) OR :q <% f.message_text)"]
+    params: Dict[str, Any] = {"q": q, "limit": limit + 1}
+
+    # Filters are appended only when set: asyncpg can't type a bare NULL parameter
+    if channel:
+        filters.append("c.channel_name = :channel")
+        params["channel"] = channel
+    if date_from:
+        filters.append("f.message_date >= :date_from")
+        params["date_from"] = datetime.combine(date_from, time.min)
+    if date_to:
+        filters.append("f.message_date < :date_to")
+        params["date_to"] = datetime.combine(date_to + timedelta(days=1), time.min)
+
+    keyset = ""
+    if cursor:
+        rank, channel_key, message_id = decode_cursor(cursor)
+        keyset = "WHERE (rank, channel_key, message_id) < (:cursor_rank, :cursor_channel_key, :cursor_message_id)"
+        params.update(cursor_rank=rank, cursor_channel_key=channel_key, cursor_message_id=message_id)
+
+    sql = text(f"""
+        SELECT message_id, message_text, view_count, channel_name, message_date, rank, channel_key
+        FROM (
+            SELECT
+                f.message_id,
+                f.message_text,
+                f.view_count,
+                c.channel_name,
+                f.message_date,
+                f.channel_key,
+                (ts_rank(f.search_vector, websearch_to_tsquery('simple', :q))
+                    + word_similarity(:q, f.message_text))::float8 AS rank
+            FROM dbt_maireg.fct_messages f
+            JOIN dbt_maireg.dim_channels c ON f.channel_key = c.channel_key
+            WHERE {' AND '.join(filters)}
+        ) ranked
+        {keyset}
+        ORDER BY rank DESC, channel_key DESC, message_id DESC
+        LIMIT :limit
+    """)
+    return sql, params
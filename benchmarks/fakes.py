@@ -0,0 +1,202 @@
+"""
+Offline stand-ins for Telegram and YOLO used by the benchmark suite.
+
+``FakeTelegramClient`` implements the slice of the Telethon client the
+scraper uses (``start``, ``get_entity``, ``iter_messages``,
+``download_media``) over deterministic synthetic channels.
+``StubYoloModel`` mimics the ultralytics call signature with a tunable
+per-image cost. Neither needs credentials, network or weights.
+"""
+
+import asyncio
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+from telethon.tl.types import MessageMediaPhoto
+
+PRODUCT_TEXTS = [
+    "Paracetamol 500mg tablets in stock",
+    "Amoxicillin 250mg capsules, call to order",
+    "Vitamin C 1000mg effervescent",
+    "Ibuprofen 400mg - new delivery",
+    "Omeprazole 20mg available now",
+    "Cetirizine 10mg allergy relief",
+    "Metformin 850mg wholesale price",
+    "Sunscreen SPF 50 and skincare sets",
+]
+
+
+def synthetic_jpeg(seed: int, size: int = 256) -> bytes:
+    """A random but deterministic JPEG; different seeds are visually distinct."""
+    rng = np.random.default_rng(seed)
+    # Low-frequency blocks upscaled, so the dHash is stable and seeds don't collide
+    blocks = rng.integers(0, 255, (8, 8, 3), dtype=np.uint8)
+    img = Image.fromarray(blocks).resize((size, size), Image.BILINEAR)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class FakeTelegramClient:
+    """Synthetic channels with ``messages_per_channel`` messages each.
+
+    ``photo_ratio`` of the messages carry a photo, and ``duplicate_ratio`` of
+    those reuse an earlier image (reposts, exercised by the dHash dedup).
+    ``request_latency`` is slept per history page / entity lookup and
+    ``download_latency`` per download, to model network time.
+    """
+
+    def __init__(
+        self,
+        messages_per_channel: int = 1000,
+        photo_ratio: float = 0.5,
+        duplicate_ratio: float = 0.2,
+        image_size: int = 256,
+        request_latency: float = 0.0,
+        download_latency: float = 0.0,
+        page_size: int = 100,
+        seed: int = 0,
+    ) -> None:
+        self.messages_per_channel = messages_per_channel
+        self.photo_ratio = photo_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.image_size = image_size
+        self.request_latency = request_latency
+        self.download_latency = download_latency
+        self.page_size = page_size
+        self.seed = seed
+        self.requests = 0
+        self.downloads = 0
+        self._images: Dict[int, bytes] = {}
+        self._channels: Dict[str, List[Any]] = {}
+
+    async def start(self) -> "FakeTelegramClient":
+        return self
+
+    async def __aenter__(self) -> "FakeTelegramClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        return None
+
+    async def _request(self) -> None:
+        self.requests += 1
+        if self.request_latency:
+            await asyncio.sleep(self.request_latency)
+
+    async def get_entity(self, channel: str) -> Any:
+        await self._request()
+        return SimpleNamespace(title=f"Synthetic {channel.strip('@')}", username=channel.strip("@"))
+
+    def _messages(self, channel: str) -> List[Any]:
+        if channel not in self._channels:
+            rng = random.Random(f"{self.seed}:{channel}")
+            start = datetime.now(timezone.utc) - timedelta(days=30)
+            step = timedelta(days=30) / max(self.messages_per_channel, 1)
+            messages, image_seeds = [], []
+            for i in range(self.messages_per_channel):
+                media = None
+                if rng.random() < self.photo_ratio:
+                    if image_seeds and rng.random() < self.duplicate_ratio:
+                        image_seed = rng.choice(image_seeds)
+                    else:
+                        image_seed = rng.randrange(1 << 30)
+                        image_seeds.append(image_seed)
+                    media = MessageMediaPhoto(photo=None)
+                    media.image_seed = image_seed
+                messages.append(SimpleNamespace(
+                    id=i + 1,
+                    date=start + step * i,
+                    message=f"{rng.choice(PRODUCT_TEXTS)} #{i}",
+                    media=media,
+                    views=rng.randrange(50, 5000),
+                    forwards=rng.randrange(0, 50),
+                ))
+            self._channels[channel] = messages
+        return self._channels[channel]
+
+    async def iter_messages(
+        self,
+        entity: Any,
+        limit: Optional[int] = None,
+        min_id: int = 0,
+        offset_id: int = 0,
+        offset_date: Optional[datetime] = None,
+        reverse: bool = False,
+        **_: Any,
+    ):
+        messages = [m for m in self._messages(entity.username) if m.id > min_id]
+        if offset_date is not None:
+            messages = [m for m in messages if (m.date > offset_date if reverse else m.date < offset_date)]
+        if offset_id:
+            messages = [m for m in messages if (m.id > offset_id if reverse else m.id < offset_id)]
+        if not reverse:
+            messages = messages[::-1]
+        if limit is not None:
+            messages = messages[:limit]
+        for i, message in enumerate(messages):
+            if i % self.page_size == 0:
+                await self._request()
+            yield message
+
+    async def download_media(self, media: Any, path: str) -> str:
+        self.downloads += 1
+        if self.download_latency:
+            await asyncio.sleep(self.download_latency)
+        data = self._images.get(media.image_seed)
+        if data is None:
+            data = self._images[media.image_seed] = synthetic_jpeg(media.image_seed, self.image_size)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+
+class StubYoloModel:
+    """ultralytics-compatible callable that sleeps ``cost_ms`` per image.
+
+    Returns one ``bottle`` box per image so categories and sinks see
+    realistic rows. ``busy=True`` spins the CPU instead of sleeping, to
+    model a compute-bound detector (and exercise process sharding).
+    """
+
+    names = {0: "bottle", 1: "person"}
+
+    def __init__(self, cost_ms: float = 5.0, busy: bool = False) -> None:
+        self.cost = cost_ms / 1000.0
+        self.busy = busy
+        self.version = f"stub-{cost_ms:g}ms{'-busy' if busy else ''}"
+
+    def _spend(self, images: int) -> None:
+        seconds = self.cost * images
+        if not self.busy:
+            time.sleep(seconds)
+            return
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+
+    def __call__(self, imgs: Any, imgsz: int = 640, verbose: bool = False) -> List[Any]:
+        batch = imgs if isinstance(imgs, list) else [imgs]
+        self._spend(len(batch))
+        return [
+            SimpleNamespace(boxes=SimpleNamespace(cls=np.array([0.0]), conf=np.array([0.87])))
+            for _ in batch
+        ]
+
+
+class StubModelFactory:
+    """Picklable factory for ``run_detection(model_factory=..., workers>1)``."""
+
+    def __init__(self, cost_ms: float = 5.0, busy: bool = False) -> None:
+        self.cost_ms = cost_ms
+        self.busy = busy
+        self.version = StubYoloModel(cost_ms, busy).version
+
+    def __call__(self) -> StubYoloModel:
+        return StubYoloModel(self.cost_ms, self.busy)
@@ -0,0 +1,338 @@
+"""
+End-to-end pipeline benchmark on synthetic data.
+
+Runs scrape -> lake -> load -> mentions -> detect -> dbt -> API with a fake Telegram
+client and a stub YOLO model, so it needs neither credentials nor weights.
+The load/mentions/dbt/API stages need a local Postgres: point POSTGRES_DB at a
+scratch database (synthetic rows use ``bench_`` channel names and are
+deleted afterwards unless ``--keep-rows``).
+
+    python benchmarks/run_benchmarks.py --offline                 # scrape + detect only
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --baseline bench.json     # exit 1 on regression
+
+Each stage reports wall seconds, items and items/s, the peak Python
+allocation during the stage (tracemalloc) and the process's peak RSS.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.fakes import FakeTelegramClient, StubModelFactory, StubYoloModel
+from src import metrics
+from src.datalake import phash_index_path, telegram_images_dir
+from src.image_store import ImageStore
+from src.media import MediaDownloadPool, MediaIndex
+from src.phash import PHashIndex
+from src.ratelimit import TokenBucket
+
+ALL_STAGES = ["scrape", "load", "mentions", "detect", "dbt", "api"]
+OFFLINE_STAGES = ["scrape", "detect"]
+CHANNEL_PREFIX = "bench_channel_"
+
+StageFn = Callable[[], Tuple[Dict[str, float], Dict[str, Any]]]
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _lake_bytes(base_path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(base_path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def measure(name: str, fn: StageFn, trace_memory: bool = True) -> Dict[str, Any]:
+    if trace_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    items, extra = fn()
+    seconds = time.perf_counter() - started
+    result: Dict[str, Any] = {"seconds": round(seconds, 3)}
+    for unit, amount in items.items():
+        result[unit] = amount
+        result[f"{unit}_per_second"] = round(amount / seconds, 2) if seconds else 0.0
+    if trace_memory:
+        result["peak_alloc_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        tracemalloc.stop()
+    result["max_rss_mb"] = _max_rss_mb()
+    result.update(extra)
+    print(f"⏱️ {name}: {result['seconds']}s " + " ".join(
+        f"{unit}={items[unit]} ({result[f'{unit}_per_second']}/s)" for unit in items
+    ))
+    return result
+
+
+# --- Stages -----------------------------------------------------------------
+
+def stage_scrape(args, base_path: str) -> StageFn:
+    from src.scraper import scrape_all_channels
+
+    def run():
+        client = FakeTelegramClient(
+            messages_per_channel=args.messages,
+            photo_ratio=args.photo_ratio,
+            duplicate_ratio=args.duplicate_ratio,
+            image_size=args.image_size,
+            request_latency=args.request_latency_ms / 1000,
+            download_latency=args.download_latency_ms / 1000,
+        )
+        channels = [f"@{CHANNEL_PREFIX}{i}" for i in range(args.channels)]
+        limiter = TokenBucket(args.rate, args.rate)
+
+        async def scrape():
+            pool = MediaDownloadPool(
+                client, MediaIndex(base_path), workers=args.download_workers, limiter=limiter,
+                phash=PHashIndex(phash_index_path(base_path)),
+                store=ImageStore.for_lake(base_path),
+            )
+            return await scrape_all_channels(
+                client, channels, base_path, args.messages, 0, 0,
+                concurrency=args.concurrency, limiter=limiter, downloads=pool,
+            )
+
+        counts = asyncio.run(scrape())
+        items = {
+            "messages": sum(counts.values()),
+            "images": client.downloads,
+            "bytes": _lake_bytes(base_path),
+        }
+        return items, {"telegram_requests": client.requests}
+    return run
+
+
+def stage_load(args, base_path: str) -> StageFn:
+    from src.loader import load_raw_data
+
+    def run():
+        before = metrics.STAGE_ITEMS.get(stage="load", unit="rows")
+        load_raw_data(base_path, reload=True)
+        return {"rows": int(metrics.STAGE_ITEMS.get(stage="load", unit="rows") - before)}, {}
+    return run
+
+
+def stage_mentions(args, base_path: str) -> StageFn:
+    from src.mentions import extract_mentions
+
+    def run():
+        before = metrics.STAGE_ITEMS.get(stage="mentions", unit="messages")
+        rows = extract_mentions()
+        return {"messages": int(metrics.STAGE_ITEMS.get(stage="mentions", unit="messages") - before)}, {"rows": rows}
+    return run
+
+
+def stage_detect(args, base_path: str, with_db: bool) -> StageFn:
+    from src.yolo_detect import run_detection
+
+    def run():
+        sink = None
+        if with_db:
+            from src.detection_sink import PostgresDetectionSink
+            sink = PostgresDetectionSink()
+        before = metrics.STAGE_ITEMS.get(stage="detect", unit="images")
+        factory = StubModelFactory(args.model_cost_ms, busy=args.busy_model)
+        df = run_detection(
+            telegram_images_dir(base_path),
+            output_csv=None,
+            batch_size=args.batch_size,
+            model=None if args.workers > 1 else StubYoloModel(args.model_cost_ms, busy=args.busy_model),
+            model_factory=factory,
+            cache_path=os.path.join(base_path, "yolo_cache.sqlite"),
+            workers=args.workers,
+            sink=sink,
+        )
+        if sink:
+            sink.close()
+        inferred = int(metrics.STAGE_ITEMS.get(stage="detect", unit="images") - before)
+        return {"images": inferred, "rows": 0 if df is None else len(df)}, {}
+    return run
+
+
+def stage_dbt(args, base_path: str) -> StageFn:
+    def run():
+        from dbt.cli.main import dbtRunner
+
+        project_dir = os.path.join(PROJECT_ROOT, "medical_warehouse")
+        for command in ("seed", "run"):
+            result = dbtRunner().invoke([command, "--project-dir", project_dir])
+            if not result.success:
+                raise RuntimeError(f"dbt {command} failed: {result.exception}")
+        return {"models": len(getattr(result.result, "results", []) or [])}, {}
+    return run
+
+
+def stage_api(args, base_path: str) -> StageFn:
+    def run():
+        import httpx
+        from api.main import app
+        from scripts.load_test_api import run as load_test
+
+        endpoints = [
+            "/api/reports/top-products?limit=10",
+            "/api/reports/visual-content",
+            f"/api/channels/{CHANNEL_PREFIX}0/activity",
+            "/api/search/messages?query=paracetamol",
+        ]
+        report = asyncio.run(load_test(
+            "http://bench", endpoints, args.api_concurrency, args.api_duration,
+            transport=httpx.ASGITransport(app=app),
+        ))
+        per_endpoint = report["endpoints"]
+        extra = {
+            "p95_ms": max((e["p95_ms"] for e in per_endpoint.values()), default=0.0),
+            "errors": sum(e["errors"] for e in per_endpoint.values()),
+            "endpoints": per_endpoint,
+        }
+        return {"requests": report["requests"]}, extra
+    return run
+
+
+def cleanup_rows() -> None:
+    from sqlalchemy import text
+    from src.loader import connect_db
+
+    pattern = CHANNEL_PREFIX.replace("_", "\\_") + "%"
+    with connect_db().begin() as conn:
+        conn.execute(text("DELETE FROM raw.telegram_messages WHERE channel_name LIKE :p"), {"p": pattern})
+        conn.execute(text("DELETE FROM raw.yolo_results WHERE channel_name LIKE :p"), {"p": pattern})
+        if conn.execute(text("SELECT to_regclass('raw.product_mentions')")).scalar():
+            conn.execute(text("DELETE FROM raw.product_mentions WHERE channel_name LIKE :p"), {"p": pattern})
+        conn.execute(text("DELETE FROM raw.load_ledger WHERE partition_path LIKE :p"), {"p": "%/" + pattern})
+
+
+# --- Regression check ---------------------------------------------------------
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Throughput (``*_per_second``) may not drop, nor latency/memory rise, by more than ``tolerance``."""
+    problems = []
+    for stage, now in current["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if not before:
+            continue
+        for key, old in before.items():
+            new = now.get(key)
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+                continue
+            if key.endswith("_per_second") and new < old * (1 - tolerance):
+                problems.append(f"{stage}.{key}: {new} < {old} (-{(1 - new / old) * 100:.0f}%)")
+            elif (key == "p95_ms" or key == "peak_alloc_mb") and new > old * (1 + tolerance):
+                problems.append(f"{stage}.{key}: {new} > {old} (+{(new / old - 1) * 100:.0f}%)")
+    return problems
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(args) -> Dict[str, Any]:
+    stages = OFFLINE_STAGES if args.offline else [s.strip() for s in args.stages.split(",") if s.strip()]
+    with_db = any(stage in stages for stage in ("load", "mentions", "dbt", "api"))
+    base_path = args.path or tempfile.mkdtemp(prefix="tg_bench_")
+
+    builders = {
+        "scrape": lambda: stage_scrape(args, base_path),
+        "load": lambda: stage_load(args, base_path),
+        "mentions": lambda: stage_mentions(args, base_path),
+        "detect": lambda: stage_detect(args, base_path, with_db),
+        "dbt": lambda: stage_dbt(args, base_path),
+        "api": lambda: stage_api(args, base_path),
+    }
+    results: Dict[str, Any] = {}
+    try:
+        for stage in ALL_STAGES:
+            if stage in stages:
+                results[stage] = measure(stage, builders[stage](), trace_memory=not args.no_trace_memory)
+    finally:
+        if with_db and not args.keep_rows:
+            cleanup_rows()
+        if not args.path and not args.keep_lake:
+            shutil.rmtree(base_path, ignore_errors=True)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "baseline")}
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": config,
+        },
+        "stages": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--stages", type=str, default=",".join(ALL_STAGES),
+                        help=f"Comma-separated subset of {','.join(ALL_STAGES)}")
+    parser.add_argument("--offline", action="store_true", help="Only the stages that need no Postgres")
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=500, help="Messages per channel")
+    parser.add_argument("--photo-ratio", type=float, default=0.5)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.2)
+    parser.add_argument("--image-size", type=int, default=256)
+    parser.add_argument("--request-latency-ms", type=float, default=0.0)
+    parser.add_argument("--download-latency-ms", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=3)
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=10000.0, help="Token bucket rate for the fake client")
+    parser.add_argument("--model-cost-ms", type=float, default=5.0, help="Stub model time per image")
+    parser.add_argument("--busy-model", action="store_true", help="Spin the CPU instead of sleeping")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--api-concurrency", type=int, default=10)
+    parser.add_argument("--api-duration", type=float, default=5.0)
+    parser.add_argument("--path", type=str, default=None, help="Lake directory (default: a temp dir)")
+    parser.add_argument("--keep-lake", action="store_true")
+    parser.add_argument("--keep-rows", action="store_true", help="Leave the bench_ rows in Postgres")
+    parser.add_argument("--no-trace-memory", action="store_true")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report here")
+    parser.add_argument("--baseline", type=str, default=None, help="Previous JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Wrote {args.output}")
+    else:
+        print(json.dumps(report["stages"], indent=2))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
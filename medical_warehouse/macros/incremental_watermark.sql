@@ -0,0 +1,12 @@
+{#
+    Lower bound for "rows changed since the last run" filters.
+
+    loaded_at / detected_at / extracted_at are set with now(), i.e. the
+    writing transaction's *start* time: a load that began before the last
+    dbt run but committed after it carries a timestamp older than max(...)
+    in the target. Subtracting var('watermark_lookback') re-reads that
+    window; the models are delete+insert, so re-processing it is harmless.
+#}
+{% macro incremental_watermark(column) -%}
+    (select coalesce(max({{ column }}), '1900-01-01') - interval '{{ var("watermark_lookback") }}' from {{ this }})
+{%- endmacro %}
@@ -1,15 +1,36 @@
-with staging as (
-    select * from {{ ref('stg_telegram') }}
+{{ config(
+    materialized='incremental',
+    unique_key='channel_key',
+    incremental_strategy='delete+insert',
+    indexes=[
+        {'columns': ['channel_key'], 'unique': True},
+        {'columns': ['channel_name'], 'unique': True},
+    ]
+) }}
+
+-- Rolled up from the incremental fct_channel_daily instead of re-scanning
+-- every message: incremental runs only recompute channels whose daily rows
+-- changed since the last run.
+
+with daily as (
+    select * from {{ ref('fct_channel_daily') }}
+    {% if is_incremental() %}
+    where channel_name in (
+        select channel_name from {{ ref('fct_channel_daily') }}
+        where last_loaded_at > {{ incremental_watermark('last_loaded_at') }}
+    )
+    {% endif %}
 ),
 
 channel_stats as (
     select
         channel_name,
-        min(message_date) as first_seen,
-        max(message_date) as last_seen,
-        count(*) as total_messages,
-        avg(view_count) as avg_views
-    from staging
+        min(first_message_at) as first_seen,
+        max(last_message_at) as last_seen,
+        sum(message_count) as total_messages,
+        sum(total_views)::numeric / nullif(sum(message_count), 0) as avg_views,
+        max(last_loaded_at) as last_loaded_at
+    from daily
     group by channel_name
 )
 
@@ -19,5 +40,6 @@ select
     first_seen,
     last_seen,
     total_messages,
-    avg_views
-from channel_stats
\ No newline at end of file
+    avg_views,
+    last_loaded_at
+from channel_stats
@@ -1,10 +1,26 @@
-with date_series as (
-    -- Generate dates for the next 5 years starting from 2024
+{{ config(
+    materialized='table',
+    indexes=[
+        {'columns': ['date_key'], 'unique': True},
+    ]
+) }}
+
+with bounds as (
+    -- Span the messages actually loaded (via the small dim_channels rollup)
+    select
+        min(first_seen)::date as first_day,
+        max(last_seen)::date as last_day
+    from {{ ref('dim_channels') }}
+),
+
+date_series as (
     select generate_series(
-        '2024-01-01'::timestamp, 
-        '2030-01-01'::timestamp, 
+        first_day::timestamp,
+        last_day::timestamp,
         '1 day'::interval
     ) as date_day
+    from bounds
+    where first_day is not null
 ),
 
 formatted_dates as (
@@ -28,4 +44,4 @@ formatted_dates as (
     from date_series
 )
 
-select * from formatted_dates
\ No newline at end of file
+select * from formatted_dates
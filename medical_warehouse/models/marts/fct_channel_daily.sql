@@ -0,0 +1,48 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['channel_name', 'activity_date'],
+    incremental_strategy='delete+insert',
+    indexes=[
+        {'columns': ['channel_name', 'activity_date'], 'unique': True},
+    ]
+) }}
+
+-- Per-channel, per-day rollup read by /api/channels/{channel_name}/activity.
+-- Incremental runs only recompute the (channel, day) pairs that received
+-- new or re-loaded messages since the last run.
+
+with messages as (
+    select * from {{ ref('stg_telegram') }}
+),
+
+{% if is_incremental() %}
+affected_days as (
+    select distinct channel_name, cast(message_date as date) as activity_date
+    from messages
+    where loaded_at > {{ incremental_watermark('last_loaded_at') }}
+),
+{% endif %}
+
+daily as (
+    select
+        m.channel_key,
+        m.channel_name,
+        cast(m.message_date as date) as activity_date,
+        m.date_key,
+        count(*) as message_count,
+        sum(m.view_count) as total_views,
+        sum(m.forward_count) as total_forwards,
+        count(*) filter (where m.has_media) as media_count,
+        min(m.message_date) as first_message_at,
+        max(m.message_date) as last_message_at,
+        max(m.loaded_at) as last_loaded_at
+    from messages m
+    {% if is_incremental() %}
+    inner join affected_days a
+        on m.channel_name = a.channel_name
+        and cast(m.message_date as date) = a.activity_date
+    {% endif %}
+    group by 1, 2, 3, 4
+)
+
+select * from daily
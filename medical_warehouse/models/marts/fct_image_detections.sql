@@ -1,20 +1,52 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    unique_key='message_key',
+    incremental_strategy='delete+insert',
+    indexes=[
+        {'columns': ['message_key'], 'unique': True},
+        {'columns': ['channel_key']},
+        {'columns': ['date_key']},
+    ]
+) }}
 
-WITH messages AS (
+WITH
+{% if is_incremental() %}
+changed AS (
+    -- New detections, or messages re-loaded since the last run
+    SELECT channel_name, message_id FROM {{ source('raw', 'yolo_results') }}
+    WHERE detected_at > {{ incremental_watermark('detected_at') }}
+    UNION
+    SELECT channel_name, message_id FROM {{ ref('stg_telegram') }}
+    WHERE loaded_at > {{ incremental_watermark('message_loaded_at') }}
+),
+{% endif %}
+
+messages AS (
     SELECT * FROM {{ ref('fct_messages') }}
 ),
 
 detections AS (
-    -- This pulls from the raw table you uploaded via Python
-    SELECT * FROM {{ source('raw', 'yolo_results') }}
+    -- Streamed into raw.yolo_results by src/yolo_detect.py; one row per model version
+    SELECT DISTINCT ON (y.channel_name, y.message_id)
+        y.*,
+        {{ dbt_utils.generate_surrogate_key(['y.channel_name', 'y.message_id']) }} AS message_key
+    FROM {{ source('raw', 'yolo_results') }} y
+    {% if is_incremental() %}
+    INNER JOIN changed USING (channel_name, message_id)
+    {% endif %}
+    ORDER BY y.channel_name, y.message_id, y.detected_at DESC
 )
 
 SELECT 
+    m.message_key,
     m.message_id,
     m.channel_key,
     m.date_key,
     d.image_category,
     d.confidence_score,
-    d.detected_class
-FROM messages m
-INNER JOIN detections d ON m.message_id = d.message_id
\ No newline at end of file
+    d.detected_class,
+    d.detected_at,
+    m.loaded_at AS message_loaded_at
+FROM detections d
+-- Same surrogate as stg_telegram.message_key: unambiguous across channels, indexed on fct_messages
+INNER JOIN messages m ON m.message_key = d.message_key
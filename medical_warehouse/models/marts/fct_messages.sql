@@ -1,5 +1,21 @@
+{{ config(
+    materialized='incremental',
+    unique_key='message_key',
+    incremental_strategy='delete+insert',
+    indexes=[
+        {'columns': ['message_key'], 'unique': True},
+        {'columns': ['channel_key', 'message_date']},
+        {'columns': ['date_key']},
+        {'columns': ['search_vector'], 'type': 'gin'},
+        {'columns': ['message_text gin_trgm_ops'], 'type': 'gin'},
+    ]
+) }}
+
 with messages as (
     select * from {{ ref('stg_telegram') }}
+    {% if is_incremental() %}
+    where loaded_at > {{ incremental_watermark('loaded_at') }}
+    {% endif %}
 ),
 
 channels as (
@@ -11,17 +27,21 @@ dates as (
 )
 
 select
+    m.message_key,
     m.message_id,
     c.channel_key,
-    d.date_key,  -- NEW: Connecting to the date dimension
+    d.date_key,
     m.message_date,
     m.message_text,
     m.message_length,
     m.view_count,
     m.forward_count,
     m.has_media,
-    m.image_path
+    m.image_path,
+    m.loaded_at,
+    -- Full-text search: 'simple' keeps Amharic and English tokens unstemmed
+    to_tsvector('simple', coalesce(m.message_text, '')) as search_vector
 from messages m
-left join channels c on m.channel_name = c.channel_name
--- Create the join key on the fly (YYYYMMDD)
-left join dates d on to_char(m.message_date, 'YYYYMMDD')::integer = d.date_key
\ No newline at end of file
+-- Keys precomputed in stg_telegram: plain equi-joins on indexed columns
+left join channels c on m.channel_key = c.channel_key
+left join dates d on m.date_key = d.date_key
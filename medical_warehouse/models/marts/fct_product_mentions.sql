@@ -0,0 +1,65 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['channel_name', 'mention_date'],
+    incremental_strategy='delete+insert',
+    indexes=[
+        {'columns': ['product', 'channel_name', 'mention_date'], 'unique': True},
+        {'columns': ['mention_date']},
+        {'columns': ['channel_name', 'mention_date']},
+    ]
+) }}
+
+-- Per-product, per-channel, per-day mention counts read by
+-- /api/reports/top-products. Mentions are extracted in Python
+-- (src/mentions.py) into raw.product_mentions; incremental runs only
+-- recompute the (channel, day) pairs whose mentions were (re-)extracted
+-- since the last run. Run with --full-refresh after removing lexicon products.
+
+with mentions as (
+    select * from {{ source('raw', 'product_mentions') }}
+    where mention_date is not null
+),
+
+{% if is_incremental() %}
+affected_days as (
+    select distinct channel_name, mention_date
+    from mentions
+    where extracted_at > {{ incremental_watermark('last_extracted_at') }}
+),
+{% endif %}
+
+lexicon as (
+    select product, category from {{ ref('product_lexicon') }}
+),
+
+daily as (
+    select
+        m.product,
+        m.channel_name,
+        m.mention_date,
+        count(*) as message_count,
+        sum(m.mention_count) as mention_count,
+        sum(coalesce(m.views, 0)) as total_views,
+        max(m.extracted_at) as last_extracted_at
+    from mentions m
+    {% if is_incremental() %}
+    inner join affected_days a
+        on m.channel_name = a.channel_name
+        and m.mention_date = a.mention_date
+    {% endif %}
+    group by 1, 2, 3
+)
+
+select
+    d.product,
+    l.category as product_category,
+    {{ dbt_utils.generate_surrogate_key(['d.channel_name']) }} as channel_key,
+    d.channel_name,
+    cast(to_char(d.mention_date, 'YYYYMMDD') as integer) as date_key,
+    d.mention_date,
+    d.message_count,
+    d.mention_count,
+    d.total_views,
+    d.last_extracted_at
+from daily d
+left join lexicon l on d.product = l.product
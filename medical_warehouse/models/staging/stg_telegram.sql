@@ -1,3 +1,13 @@
+{{ config(
+    materialized='incremental',
+    unique_key=['channel_name', 'message_id'],
+    incremental_strategy='delete+insert',
+    indexes=[
+        {'columns': ['channel_name', 'message_id'], 'unique': True},
+        {'columns': ['loaded_at']},
+    ]
+) }}
+
 with raw_data as (
     select * from {{ source('telegram', 'telegram_messages') }}
 ),
@@ -8,6 +18,11 @@ cleaned as (
         -- but here we assume (channel_name + message_id) is unique.
         cast(message_id as integer) as message_id,
         cast(channel_name as varchar(100)) as channel_name,
+
+        -- Join keys computed once per row here, so marts join on indexed columns
+        {{ dbt_utils.generate_surrogate_key(['channel_name', 'message_id']) }} as message_key,
+        {{ dbt_utils.generate_surrogate_key(['channel_name']) }} as channel_key,
+        cast(to_char(cast(message_date as timestamp), 'YYYYMMDD') as integer) as date_key,
         
         -- Fix timestamp format
         cast(message_date as timestamp) as message_date,
@@ -22,10 +37,17 @@ cleaned as (
         
         -- Metrics (default to 0 if null)
         coalesce(views, 0) as view_count,
-        coalesce(forwards, 0) as forward_count
+        coalesce(forwards, 0) as forward_count,
+
+        -- Set/refreshed by src/loader.py on every upsert; watermark for incremental models
+        loaded_at
 
     from raw_data
     where message_date is not null
+    {% if is_incremental() %}
+      -- Only rows inserted or re-loaded since the last run; `dbt run --full-refresh` rebuilds
+      and loaded_at > {{ incremental_watermark('loaded_at') }}
+    {% endif %}
 )
 
 select * from cleaned
\ No newline at end of file
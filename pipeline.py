@@ -1,68 +1,207 @@
-import subprocess
+import asyncio
 import os
-import sys
-from dagster import asset, Definitions, define_asset_job, ScheduleDefinition
+from datetime import date, timedelta
+from dagster import (
+    AssetExecutionContext,
+    DailyPartitionsDefinition,
+    Definitions,
+    Failure,
+    MaterializeResult,
+    MultiPartitionKey,
+    MultiPartitionsDefinition,
+    RunRequest,
+    ScheduleDefinition,
+    StaticPartitionsDefinition,
+    asset,
+    define_asset_job,
+    schedule,
+)
+from src import metrics
+from src.datalake import (
+    channel_messages_ndjson_path,
+    compact_partitions,
+    describe_partition,
+    merge_partition_records,
+    partition_files,
+)
+from src.loader import bump_data_version, load_partition_file
+from src.mentions import extract_mentions
+from src.scraper import TARGET_CHANNELS, get_client, scrape_day
 
 # Get absolute path to project root
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+IMAGE_DIR = os.path.join(DATA_DIR, "raw", "images")
+
+# --- PARTITIONS: one per (message date, channel) ---
+# Backfills of many days/channels fan out as independent runs, and Dagster
+# only re-materializes the partitions that are missing or stale.
+date_partitions = DailyPartitionsDefinition(start_date=os.getenv("PIPELINE_START_DATE", "2024-01-01"))
+channel_partitions = StaticPartitionsDefinition([channel.strip("@") for channel in TARGET_CHANNELS])
+message_partitions = MultiPartitionsDefinition({"date": date_partitions, "channel": channel_partitions})
+
+# Telegram rate limits are per account, but every run is its own process with
+# its own TokenBucket: the "telegram" pool (limited to 1 in dagster.yaml)
+# serializes the scrapes so one bucket's rate is the account's rate
+TELEGRAM_POOL = "telegram"
+
+
+def partition_keys(context: AssetExecutionContext):
+    keys = context.partition_key.keys_by_dimension
+    return date.fromisoformat(keys["date"]), keys["channel"]
 
-@asset
-def telegram_data():
-    """Task 1: Scrape Telegram Data from src/scraper.py"""
-    script_path = os.path.join(BASE_DIR, "src", "scraper.py")
-    subprocess.run([sys.executable, script_path], check=True)
 
-@asset(deps=[telegram_data])
-def yolo_enrichment():
-    """Task 3: Run YOLOv8 Detection from src/yolo_detect.py"""
-    script_path = os.path.join(BASE_DIR, "src", "yolo_detect.py")
-    subprocess.run([sys.executable, script_path], check=True)
+@asset(partitions_def=message_partitions, pool=TELEGRAM_POOL)
+def telegram_data(context: AssetExecutionContext) -> MaterializeResult:
+    """Task 1: Scrape one channel's messages for one day into the lake partition"""
+    day, channel = partition_keys(context)
 
-@asset(deps=[yolo_enrichment])
-def load_to_postgres():
-    """Task 3: Load YOLO CSV to DB from scripts/load_yolo_to_db.py"""
-    script_path = os.path.join(BASE_DIR, "scripts", "load_yolo_to_db.py")
-    subprocess.run([sys.executable, script_path], check=True)
+    async def scrape():
+        async with get_client() as client:
+            return await scrape_day(client, f"@{channel}", day, base_path=DATA_DIR)
+
+    new_rows = asyncio.run(scrape())
+    path = channel_messages_ndjson_path(DATA_DIR, day.isoformat(), channel)
+    partition = describe_partition(path) if os.path.exists(path) else {"rows": 0, "bytes": 0}
+    return MaterializeResult(metadata={
+        "new_rows": new_rows,
+        "rows": partition["rows"],
+        "bytes": partition["bytes"],
+        "path": path,
+        **metrics.stage_summary(["scrape", "download"]),
+    })
+
+@asset(partitions_def=message_partitions, deps=[telegram_data])
+def yolo_enrichment(context: AssetExecutionContext) -> MaterializeResult:
+    """Task 3: Run YOLOv8 on the partition's images, streaming results into raw.yolo_results"""
+    # Imported here so the scrape/load steps never pay for importing ultralytics
+    from src.detection_sink import PostgresDetectionSink
+    from src.yolo_detect import record_jobs, run_detection
+
+    day, channel = partition_keys(context)
+    # Row file and/or its compacted Parquet, whichever the day has by now
+    paths = partition_files(DATA_DIR, day.isoformat(), day.isoformat(), [channel])
+    # The partition names its own images: no listing of the whole lake per partition
+    jobs = record_jobs(merge_partition_records(paths))
+    if not jobs or not os.path.isdir(IMAGE_DIR):
+        return MaterializeResult(metadata={"images": 0, "detections": 0})
+
+    with PostgresDetectionSink() as sink:
+        df = run_detection(IMAGE_DIR, output_csv=None, sink=sink, jobs=jobs)
+    detections = 0 if df is None else len(df)
+    return MaterializeResult(metadata={
+        "images": len(jobs),
+        "detections": detections,
+        "rows_written": sink.rows,
+        **metrics.stage_summary(["detect", "load_detections"]),
+    })
+
+@asset(partitions_def=message_partitions, deps=[telegram_data])
+def load_to_postgres(context: AssetExecutionContext) -> MaterializeResult:
+    """Task 3: Upsert the partition file into raw.telegram_messages"""
+    day, channel = partition_keys(context)
+    paths = partition_files(DATA_DIR, day.isoformat(), day.isoformat(), [channel])
+    rows = sum(load_partition_file(path, base_path=DATA_DIR) for path in paths)
+    return MaterializeResult(metadata={"rows": rows, **metrics.stage_summary(["load"])})
 
 @asset(deps=[load_to_postgres])
-def dbt_transformations():
+def product_mentions() -> MaterializeResult:
+    """Extract lexicon product mentions from messages loaded since the last run"""
+    rows = extract_mentions()
+    return MaterializeResult(metadata={"rows": rows, **metrics.stage_summary(["mentions"])})
+
+@asset(deps=[load_to_postgres, yolo_enrichment, product_mentions])
+def dbt_transformations() -> MaterializeResult:
     """
     Task 2 & 3: Run dbt models AND automated tests.
     Addressing feedback: Added 'dbt test' for production hardening.
+    The models are incremental, so each run only processes newly loaded rows.
     """
+    from dbt.cli.main import dbtRunner
+
     dbt_dir = os.path.join(BASE_DIR, "medical_warehouse")
-    
-    # 1. Run the transformations
-    print("Running dbt models...")
-    subprocess.run(["dbt", "run", "--project-dir", dbt_dir], check=True)
-    
-    # 2. Run the tests (Enforces data quality in production)
-    print("Running dbt tests...")
-    subprocess.run(["dbt", "test", "--project-dir", dbt_dir], check=True)
+    dbt = dbtRunner()
+    metadata = {}
+
+    # 1. Load the seeds (product lexicon), 2. run the transformations,
+    # 3. then the tests (Enforces data quality in production)
+    for command in ("seed", "run", "test"):
+        print(f"Running dbt {command}...")
+        with metrics.timed(f"dbt_{command}") as timer:
+            result = dbt.invoke([command, "--project-dir", dbt_dir])
+        if not result.success:
+            raise Failure(description=f"dbt {command} failed", metadata={"exception": str(result.exception)})
+        metadata[f"dbt_{command}_nodes"] = len(getattr(result.result, "results", []) or [])
+        metadata[f"dbt_{command}_seconds"] = round(timer.seconds, 3)
+
+    # 4. Invalidate the API's report cache now that the marts have changed
+    metadata["data_version"] = bump_data_version()
+    return MaterializeResult(metadata=metadata)
+
+@asset(deps=[load_to_postgres, yolo_enrichment])
+def compacted_lake() -> MaterializeResult:
+    """Rewrite sealed (past) daily partitions as Parquet for pruned, typed reads"""
+    with metrics.timed("compact") as timer:
+        results = compact_partitions(DATA_DIR)
+        timer.add("rows", sum(r["rows"] for r in results))
+    return MaterializeResult(metadata={
+        "partitions": len(results),
+        "rows": sum(r["rows"] for r in results),
+        "source_bytes": sum(r.get("source_bytes", 0) for r in results),
+        "parquet_bytes": sum(r["bytes"] for r in results),
+        "seconds": round(timer.seconds, 3),
+    })
 
 # --- PRODUCTION HARDENING: SCHEDULING & JOBS ---
 
-# 1. Define a job that materializes all assets in the correct order
+# 1. Partitioned ingestion (scrape -> load + detect) and the warehouse build are
+# separate jobs: a job can only span assets that share a partitioning
+ingestion_job = define_asset_job(
+    name="telegram_ingestion_job",
+    selection=[telegram_data, yolo_enrichment, load_to_postgres],
+    partitions_def=message_partitions,
+)
+
 medical_warehouse_job = define_asset_job(
-    name="medical_warehouse_job", 
-    selection="*"
+    name="medical_warehouse_job",
+    selection=[product_mentions, dbt_transformations],
 )
 
-# 2. Define a schedule (Run daily at midnight)
-# Addressing feedback: Added automation to move away from manual materialization
+lake_compaction_job = define_asset_job(
+    name="lake_compaction_job",
+    selection=[compacted_lake],
+)
+
+# 2. Every midnight, ingest the day that just ended for every channel...
+@schedule(job=ingestion_job, cron_schedule="0 0 * * *")
+def daily_ingestion_schedule(context):
+    day = (context.scheduled_execution_time.date() - timedelta(days=1)).isoformat()
+    for channel in channel_partitions.get_partition_keys():
+        partition_key = MultiPartitionKey({"date": day, "channel": channel})
+        yield RunRequest(run_key=f"{day}|{channel}", partition_key=partition_key)
+
+# ...then rebuild the marts incrementally once the ingestion runs are done
 daily_refresh_schedule = ScheduleDefinition(
     job=medical_warehouse_job,
-    cron_schedule="0 0 * * *",  # Midnight every day
+    cron_schedule="0 2 * * *",
+)
+
+# ...and finally fold the sealed days of the row lake into Parquet
+daily_compaction_schedule = ScheduleDefinition(
+    job=lake_compaction_job,
+    cron_schedule="0 3 * * *",
 )
 
 # Final Definitions
 defs = Definitions(
     assets=[
-        telegram_data, 
-        yolo_enrichment, 
-        load_to_postgres, 
-        dbt_transformations
+        telegram_data,
+        yolo_enrichment,
+        load_to_postgres,
+        product_mentions,
+        dbt_transformations,
+        compacted_lake,
     ],
-    schedules=[daily_refresh_schedule],
-    jobs=[medical_warehouse_job]
-)
\ No newline at end of file
+    schedules=[daily_ingestion_schedule, daily_refresh_schedule, daily_compaction_schedule],
+    jobs=[ingestion_job, medical_warehouse_job, lake_compaction_job]
+)
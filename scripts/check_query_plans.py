@@ -0,0 +1,134 @@
+"""
+EXPLAIN-based check that the API's hot queries hit the mart indexes.
+
+Run after ``dbt run`` against the warehouse:
+
+    python scripts/check_query_plans.py            # can the planner use the index?
+    python scripts/check_query_plans.py --natural  # does it, at today's table sizes?
+
+By default sequential scans are disabled for the EXPLAIN so the check
+answers "is there a usable index" even on a small dev database, where
+Postgres rightly prefers a seq scan. Exits non-zero if any check fails.
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List
+
+from sqlalchemy import text
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from api.search import build_search_query
+from src.loader import connect_db
+
+SCHEMA = "dbt_maireg"
+
+
+def plan_checks(channel: str) -> List[Dict[str, Any]]:
+    today = date.today()
+    search_sql, search_params = build_search_query("paracetamol")
+    filtered_sql, filtered_params = build_search_query(
+        "paracetamol", channel=channel, date_from=today - timedelta(days=30), date_to=today,
+    )
+    return [
+        {
+            "name": "channel activity (fct_channel_daily range scan)",
+            "sql": text(f"""
+                SELECT activity_date, message_count, total_views, total_forwards, media_count
+                FROM {SCHEMA}.fct_channel_daily
+                WHERE channel_name = :name AND activity_date >= :date_from
+                ORDER BY activity_date
+            """),
+            "params": {"name": channel, "date_from": today - timedelta(days=30)},
+            "table": "fct_channel_daily",
+            "columns": ["channel_name"],
+        },
+        {
+            "name": "message search (GIN tsvector / trigram)",
+            "sql": search_sql,
+            "params": search_params,
+            "table": "fct_messages",
+            "columns": ["search_vector", "message_text"],
+        },
+        {
+            "name": "message search by channel (dim_channels lookup)",
+            "sql": filtered_sql,
+            "params": filtered_params,
+            "table": "dim_channels",
+            "columns": ["channel_name", "channel_key"],
+        },
+        {
+            "name": "detections joined to messages (message_key)",
+            "sql": text(f"""
+                SELECT m.message_text, i.image_category
+                FROM {SCHEMA}.fct_image_detections i
+                JOIN {SCHEMA}.fct_messages m ON m.message_key = i.message_key
+                WHERE i.date_key = :date_key
+            """),
+            "params": {"date_key": int(today.strftime("%Y%m%d"))},
+            "table": "fct_messages",
+            "columns": ["message_key"],
+        },
+    ]
+
+
+def iter_plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from iter_plan_nodes(child)
+
+
+def table_indexes(conn, table: str) -> Dict[str, str]:
+    rows = conn.execute(
+        text("SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = :schema AND tablename = :table"),
+        {"schema": SCHEMA, "table": table},
+    ).fetchall()
+    return {name: definition for name, definition in rows}
+
+
+def run_checks(channel: str, natural: bool = False) -> bool:
+    engine = connect_db()
+    ok = True
+    for check in plan_checks(channel):
+        with engine.begin() as conn:
+            if not natural:
+                conn.execute(text("SET LOCAL enable_seqscan = off"))
+            plan = conn.execute(
+                text(f"EXPLAIN (FORMAT JSON) {check['sql'].text}"), check["params"]
+            ).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            indexes = table_indexes(conn, check["table"])
+
+        # dbt names indexes by hash, so match on the index definition instead
+        wanted = {
+            name for name, definition in indexes.items()
+            if any(column in definition for column in check["columns"])
+        }
+        used = {node["Index Name"] for node in iter_plan_nodes(plan[0]["Plan"]) if "Index Name" in node}
+        hit = sorted(used & wanted)
+        if hit:
+            print(f"✅ {check['name']}: {', '.join(hit)}")
+        elif not wanted:
+            ok = False
+            print(f"❌ {check['name']}: no index on {check['table']}({', '.join(check['columns'])}) "
+                  f"- run 'dbt run --full-refresh' to create it")
+        else:
+            ok = False
+            print(f"❌ {check['name']}: plan does not use {', '.join(sorted(wanted))}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--channel", type=str, default="CheMed123")
+    parser.add_argument("--natural", action="store_true",
+                        help="Leave seq scans enabled and check the plan Postgres would actually pick")
+    args = parser.parse_args()
+    sys.exit(0 if run_checks(args.channel, natural=args.natural) else 1)
@@ -0,0 +1,106 @@
+"""
+Concurrency/latency load test for the analytics API.
+
+Start the API against a local Postgres (``uvicorn api.main:app``), then run:
+
+    python scripts/load_test_api.py --concurrency 50 --duration 30
+
+Each worker loops over the endpoints for ``--duration`` seconds; the script
+prints requests/s, error counts and p50/p95/p99 latency per endpoint, and
+writes the same numbers as JSON with ``--json``.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+DEFAULT_ENDPOINTS = [
+    "/api/reports/top-products?limit=10",
+    "/api/reports/visual-content",
+    "/api/channels/CheMed123/activity",
+    "/api/search/messages?query=paracetamol",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+async def worker(client: httpx.AsyncClient, endpoints: List[str], deadline: float,
+                 latencies: Dict[str, List[float]], errors: Dict[str, int]) -> None:
+    i = 0
+    while time.perf_counter() < deadline:
+        endpoint = endpoints[i % len(endpoints)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            response = await client.get(endpoint)
+            if response.status_code >= 400:
+                errors[endpoint] += 1
+        except httpx.HTTPError:
+            errors[endpoint] += 1
+        latencies[endpoint].append((time.perf_counter() - started) * 1000)
+
+
+async def run(base_url: str, endpoints: List[str], concurrency: int, duration: float,
+              transport: Optional[httpx.AsyncBaseTransport] = None) -> Dict:
+    """Hit ``endpoints`` from ``concurrency`` workers; pass an ``httpx.ASGITransport`` to test in-process."""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30, transport=transport) as client:
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, endpoints[n % len(endpoints):] + endpoints[:n % len(endpoints)],
+                   deadline, latencies, errors)
+            for n in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    report = {"concurrency": concurrency, "duration_s": round(elapsed, 2), "endpoints": {}}
+    total = 0
+    for endpoint in endpoints:
+        values = latencies[endpoint]
+        total += len(values)
+        report["endpoints"][endpoint] = {
+            "requests": len(values),
+            "errors": errors[endpoint],
+            "p50_ms": round(percentile(values, 50), 1),
+            "p95_ms": round(percentile(values, 95), 1),
+            "p99_ms": round(percentile(values, 99), 1),
+            "mean_ms": round(statistics.fmean(values), 1) if values else 0.0,
+        }
+    report["requests"] = total
+    report["requests_per_second"] = round(total / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--endpoint", action="append", dest="endpoints",
+                        help="Endpoint path to hit (repeatable); defaults to the four report routes")
+    parser.add_argument("--json", type=str, default=None, help="Write the report to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.endpoints or DEFAULT_ENDPOINTS, args.concurrency, args.duration))
+    print(f"🚦 {result['requests']} requests in {result['duration_s']}s "
+          f"at concurrency {result['concurrency']}: {result['requests_per_second']} req/s")
+    for endpoint, stats in result["endpoints"].items():
+        print(f"   {endpoint}: p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms "
+              f"p99={stats['p99_ms']}ms errors={stats['errors']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
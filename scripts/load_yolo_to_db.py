@@ -1,39 +1,42 @@
-import pandas as pd
-from sqlalchemy import create_engine
+import csv
 import os
+import sys
 from dotenv import load_dotenv
 
 # This points to the .env file in your root folder
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
-# Match the names exactly from your screenshot
-DB_USER = os.getenv('POSTGRES_USER')
-DB_PASSWORD = os.getenv('POSTGRES_PASSWORD')
-DB_HOST = os.getenv('POSTGRES_HOST')
-DB_PORT = os.getenv('POSTGRES_PORT')
-DB_NAME = os.getenv('POSTGRES_DB')
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 
-# Construct the connection string
-DB_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+from src import metrics
+from src.detection_sink import PostgresDetectionSink
 
-engine = create_engine(DB_URL)
+def load_yolo_results(csv_path='data/yolo_results.csv'):
+    """Upsert an exported detections CSV into raw.yolo_results.
 
-def load_yolo_results():
-    csv_path = 'data/yolo_results.csv'
-    
+    Only needed for CSVs produced without ``--to-postgres``; detections
+    normally stream straight into the table from src/yolo_detect.py.
+    """
     if not os.path.exists(csv_path):
         print(f"❌ Error: {csv_path} not found! Run 'python src/yolo_detect.py' first.")
         return
 
-    # Load the CSV
-    df = pd.read_csv(csv_path)
-    
-    # Push to Postgres (into the 'raw' schema)
     try:
-        df.to_sql('yolo_results', engine, schema='raw', if_exists='replace', index=False)
-        print("✅ YOLO results successfully loaded to table: raw.yolo_results")
+        with metrics.timed("load_yolo_csv") as timer, \
+                PostgresDetectionSink() as sink, open(csv_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                # CSVs exported before detections were versioned
+                row.setdefault("model_version", "legacy")
+                row = {k: (v if v != "" else None) for k, v in row.items()}
+                sink.write(row)
+                timer.add("rows")
+        summary = metrics.stage_summary(["load_yolo_csv"])
+        print(f"✅ Upserted {sink.rows} YOLO results into table: {sink.table} "
+              f"({summary.get('load_yolo_csv_rows_per_second', 0)} rows/s)")
     except Exception as e:
         print(f"❌ Error loading to database: {e}")
 
 if __name__ == "__main__":
-    load_yolo_results()
\ No newline at end of file
+    load_yolo_results(*sys.argv[1:2])
@@ -1,7 +1,21 @@
+import glob
 import json
 import os
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_PARTITION_BATCH_SIZE = 200
+COMPACTED_MESSAGES_DIRNAME = "telegram_messages_parquet"
+COMPACTED_FILENAME = "part-0.parquet"
+COMPACTION_SOURCES_KEY = b"compacted_sources"
+PARQUET_ROW_GROUP_SIZE = 50_000
 
 
 def ensure_dir(path: str) -> None:
@@ -16,6 +30,25 @@ def telegram_images_dir(base_path: str) -> str:
     return os.path.join(base_path, "raw", "images")
 
 
+def media_index_path(base_path: str) -> str:
+    return os.path.join(telegram_images_dir(base_path), "_index.json")
+
+
+def phash_index_path(base_path: str) -> str:
+    return os.path.join(telegram_images_dir(base_path), "_phash_index.json")
+
+
+def compacted_messages_dir(base_path: str) -> str:
+    return os.path.join(base_path, "raw", COMPACTED_MESSAGES_DIRNAME)
+
+
+def compacted_partition_path(base_path: str, date_str: str, channel_name: str) -> str:
+    """Hive-style ``date=<day>/channel=<name>/part-0.parquet`` location of a compacted partition."""
+    return os.path.join(
+        compacted_messages_dir(base_path), f"date={date_str}", f"channel={channel_name}", COMPACTED_FILENAME
+    )
+
+
 def channel_messages_json_path(base_path: str, date_str: str, channel_name: str) -> str:
     partition_dir = telegram_messages_partition_dir(base_path, date_str)
     ensure_dir(partition_dir)
@@ -28,15 +61,297 @@ def write_channel_messages_json(
     date_str: str,
     channel_name: str,
     messages: List[Dict[str, Any]],
+    append: bool = False,
 ) -> str:
-    """Write messages for a (date, channel) partition to the raw data lake."""
+    """Write messages for a (date, channel) partition to the raw data lake.
+
+    With ``append=True`` messages already in the partition (e.g. from an
+    earlier incremental run the same day) are kept; rows with the same
+    ``message_id`` are replaced by the new ones.
+    """
 
     out_path = channel_messages_json_path(base_path, date_str, channel_name)
+    if append and os.path.exists(out_path):
+        with open(out_path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+        new_ids = {m["message_id"] for m in messages}
+        messages = [m for m in existing if m["message_id"] not in new_ids] + messages
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(messages, f, ensure_ascii=False, indent=2)
     return out_path
 
 
+def channel_messages_ndjson_path(base_path: str, date_str: str, channel_name: str) -> str:
+    partition_dir = telegram_messages_partition_dir(base_path, date_str)
+    ensure_dir(partition_dir)
+    return os.path.join(partition_dir, f"{channel_name}.ndjson")
+
+
+def _fsync_dir(path: str) -> None:
+    # Directory fsync makes the rename durable; not supported on Windows
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Exclusive lock on ``<path>.lock``, held across processes and threads.
+
+    Parallel partition runs share the media, pHash and image-store indexes
+    and the checkpoints file; their read-modify-write cycles go through it.
+    """
+
+    ensure_dir(os.path.dirname(path) or ".")
+    with open(f"{path}.lock", "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def update_json(path: str, update: Callable[[Dict[str, Any]], Dict[str, Any]], indent: Optional[int] = None) -> Dict[str, Any]:
+    """Atomically rewrite a JSON state file as ``update(current contents)``; returns what was written.
+
+    The read and the write happen under ``file_lock``, so entries another
+    process saved since this one loaded the file are merged, not lost.
+    """
+
+    with file_lock(path):
+        current: Dict[str, Any] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                current = json.load(f)
+        data = update(current)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, path)
+    return data
+
+
+class PartitionWriter:
+    """Stream a (date, channel) partition to NDJSON as messages arrive.
+
+    Records are buffered and appended to ``<channel>.ndjson.tmp`` in batches
+    of ``batch_size``, so memory stays flat regardless of ``limit``. ``seal``
+    fsyncs the temp file and atomically renames it to ``<channel>.ndjson``;
+    readers therefore only ever see complete partitions.
+
+    With ``append=True`` rows already sealed for the day (including a legacy
+    ``<channel>.json`` list) are carried over into the new file, as are rows
+    a killed run left in the temp file after its last ``sync``.
+
+    A repeated ``message_id`` replaces the earlier row (last write wins), so
+    a re-scrape refreshes views, forwards and edits. Superseded lines stay in
+    the temp file until ``seal`` drops them in one streaming pass.
+    """
+
+    def __init__(
+        self,
+        *,
+        base_path: str,
+        date_str: str,
+        channel_name: str,
+        batch_size: int = DEFAULT_PARTITION_BATCH_SIZE,
+        append: bool = True,
+    ) -> None:
+        self.path = channel_messages_ndjson_path(base_path, date_str, channel_name)
+        self.tmp_path = f"{self.path}.tmp"
+        self.legacy_path = channel_messages_json_path(base_path, date_str, channel_name)
+        self.batch_size = max(batch_size, 1)
+        self.rows = 0
+        self.sealed = False
+        self.replaced = 0
+        self._buffer: List[str] = []
+        self._latest: Dict[Any, int] = {}  # message_id -> line number of its newest row
+        self._lines = 0
+        # Rows a killed run had already synced to the temp file are carried over
+        recovered = list(self._recover()) if append and os.path.exists(self.tmp_path) else []
+        self._file = open(self.tmp_path, "w", encoding="utf-8")
+
+        if append:
+            for path in (self.legacy_path, self.path):
+                if os.path.exists(path):
+                    for record in iter_channel_messages(path):
+                        self.write(record)
+            for record in recovered:
+                self.write(record)
+
+    def _recover(self) -> Iterator[Dict[str, Any]]:
+        with open(self.tmp_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return  # torn final line of an interrupted write
+
+    def __enter__(self) -> "PartitionWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if not self.sealed:
+            self.seal()
+
+    def write(self, record: Dict[str, Any]) -> bool:
+        """Buffer one record; returns False if it replaced a row with the same ``message_id``."""
+
+        message_id = record.get("message_id")
+        is_new = message_id not in self._latest
+        self._latest[message_id] = self._lines
+        self._lines += 1
+        self._buffer.append(json.dumps(record, ensure_ascii=False))
+        if is_new:
+            self.rows += 1
+        else:
+            self.replaced += 1
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        return is_new
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+        self._file.flush()
+
+    def sync(self) -> None:
+        """Make every row written so far durable in the temp file (see ``_recover``)."""
+
+        self.flush()
+        os.fsync(self._file.fileno())
+
+    def seal(self) -> Dict[str, Any]:
+        """Make the partition durable and visible; returns its row/byte counts."""
+
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if self.replaced:
+            self._drop_superseded()
+        os.replace(self.tmp_path, self.path)
+        _fsync_dir(os.path.dirname(self.path))
+        if os.path.exists(self.legacy_path):
+            os.remove(self.legacy_path)
+        self.sealed = True
+        return {"path": self.path, "rows": self.rows, "bytes": os.path.getsize(self.path)}
+
+
+    def _drop_superseded(self) -> None:
+        keep = set(self._latest.values())
+        dedup_path = f"{self.tmp_path}.dedup"
+        with open(self.tmp_path, "r", encoding="utf-8") as src, open(dedup_path, "w", encoding="utf-8") as dst:
+            for line_no, line in enumerate(src):
+                if line_no in keep:
+                    dst.write(line)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(dedup_path, self.tmp_path)
+
+
+def iter_channel_messages(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the records of one partition file: NDJSON, legacy JSON list or compacted Parquet."""
+
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches():
+            for record in batch.to_pylist():
+                if record.get("message_date") is not None:
+                    record["message_date"] = record["message_date"].isoformat()
+                yield record
+        return
+
+    if path.endswith(".ndjson"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        yield from data
+
+
+def partition_key(path: str) -> Tuple[str, str]:
+    """``(date_str, channel_name)`` of a row or compacted partition file."""
+
+    if path.endswith(".parquet"):
+        channel_dir = os.path.dirname(path)
+        date_dir = os.path.dirname(channel_dir)
+        return os.path.basename(date_dir).split("=", 1)[1], os.path.basename(channel_dir).split("=", 1)[1]
+    return os.path.basename(os.path.dirname(path)), os.path.splitext(os.path.basename(path))[0]
+
+
+def partition_files(
+    base_path: str,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    channels: Optional[Iterable[str]] = None,
+) -> List[str]:
+    """Sealed message partitions in the lake (temp files and manifests excluded).
+
+    Both row files (``raw/telegram_messages/<date>/<channel>.ndjson``) and
+    compacted Parquet files are listed. ``date_from``/``date_to`` (inclusive
+    ISO dates) and ``channels`` prune by directory name, so nothing outside
+    the requested range is opened.
+    """
+
+    channel_set = set(channels) if channels is not None else None
+
+    def in_range(date_str: str) -> bool:
+        return (date_from is None or date_str >= date_from) and (date_to is None or date_str <= date_to)
+
+    def wanted(date_str: str, channel_name: str) -> bool:
+        return in_range(date_str) and (channel_set is None or channel_name in channel_set)
+
+    messages_dir = os.path.join(base_path, "raw", "telegram_messages")
+    files = []
+    for date_str in (sorted(os.listdir(messages_dir)) if os.path.isdir(messages_dir) else []):
+        if not in_range(date_str):
+            continue
+        for path in glob.glob(os.path.join(messages_dir, date_str, "*.ndjson")) + glob.glob(
+            os.path.join(messages_dir, date_str, "*.json")
+        ):
+            if not os.path.basename(path).startswith("_") and wanted(*partition_key(path)):
+                files.append(path)
+
+    compacted_dir = compacted_messages_dir(base_path)
+    for path in glob.glob(os.path.join(compacted_dir, "date=*", "channel=*", COMPACTED_FILENAME)):
+        if wanted(*partition_key(path)):
+            files.append(path)
+    return sorted(files)
+
+
+def describe_partition(path: str) -> Dict[str, int]:
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return {"rows": pq.ParquetFile(path).metadata.num_rows, "bytes": os.path.getsize(path)}
+    rows = sum(1 for _ in iter_channel_messages(path))
+    return {"rows": rows, "bytes": os.path.getsize(path)}
+
+
 def manifest_path(base_path: str, date_str: str) -> str:
     partition_dir = telegram_messages_partition_dir(base_path, date_str)
     ensure_dir(partition_dir)
@@ -50,13 +365,24 @@ def write_manifest(
     channel_message_counts: Dict[str, int],
     extra: Optional[Dict[str, Any]] = None,
 ) -> str:
-    """Write a simple audit/metadata file for the day's scrape."""
+    """Write a simple audit/metadata file for the day's scrape.
+
+    Row counts and byte sizes of every sealed partition in the day are
+    recorded under ``partitions``.
+    """
 
+    partition_dir = telegram_messages_partition_dir(base_path, date_str)
+    partitions = {
+        os.path.splitext(os.path.basename(path))[0]: describe_partition(path)
+        for path in partition_files(base_path)
+        if os.path.dirname(path) == partition_dir
+    }
     payload: Dict[str, Any] = {
         "date": date_str,
         "run_utc": datetime.now(timezone.utc).isoformat(),
         "channels": channel_message_counts,
         "total_messages": sum(channel_message_counts.values()),
+        "partitions": partitions,
     }
     if extra:
         payload.update(extra)
@@ -64,4 +390,237 @@ def write_manifest(
     out_path = manifest_path(base_path, date_str)
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(payload, f, ensure_ascii=False, indent=2)
-    return out_path
\ No newline at end of file
+    return out_path
+
+
+def checkpoints_path(base_path: str) -> str:
+    messages_dir = os.path.join(base_path, "raw", "telegram_messages")
+    ensure_dir(messages_dir)
+    return os.path.join(messages_dir, "_checkpoints.json")
+
+
+def read_checkpoints(base_path: str) -> Dict[str, Dict[str, Any]]:
+    """Return the per-channel high-water marks, keyed by channel name."""
+
+    path = checkpoints_path(base_path)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def update_checkpoint(
+    *,
+    base_path: str,
+    channel_name: str,
+    message_id: int,
+    message_date: str,
+    resume: Optional[Dict[str, Any]] = None,
+    keep_resume: bool = False,
+) -> Dict[str, Any]:
+    """Advance a channel's high-water mark; never moves it backwards.
+
+    ``resume`` records where an unfinished newest-first scrape stopped
+    (``offset_id`` and the ``remaining`` limit) so the next run can continue
+    it; passing ``None`` clears it. Runs that don't own the cursor pass
+    ``keep_resume`` so one left by another run survives.
+    """
+
+    def advance(checkpoints: Dict[str, Any]) -> Dict[str, Any]:
+        current = checkpoints.get(channel_name)
+        kept = current.get("resume") if current and keep_resume else resume
+        if current and current["message_id"] >= message_id:
+            if current.get("resume") == kept:
+                return checkpoints
+            entry = dict(current)
+        else:
+            entry = {"message_id": message_id, "message_date": message_date}
+        entry["updated_utc"] = datetime.now(timezone.utc).isoformat()
+        if kept:
+            entry["resume"] = kept
+        else:
+            entry.pop("resume", None)
+        checkpoints[channel_name] = entry
+        return checkpoints
+
+    # Other channels' entries may be written concurrently by parallel runs
+    return update_json(checkpoints_path(base_path), advance, indent=2)[channel_name]
+
+
+# --- Columnar compaction ------------------------------------------------------
+# pyarrow is imported lazily: the scraper and loader never need it for row files.
+
+
+def message_arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("message_id", pa.int64()),
+        ("channel_name", pa.string()),
+        ("channel_title", pa.string()),
+        ("message_date", pa.timestamp("us", tz="UTC")),
+        ("message_text", pa.string()),
+        ("has_media", pa.bool_()),
+        ("image_path", pa.string()),
+        ("views", pa.int64()),
+        ("forwards", pa.int64()),
+    ])
+
+
+def _typed_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    typed = dict(record)
+    if isinstance(typed.get("message_date"), str):
+        typed["message_date"] = datetime.fromisoformat(typed["message_date"])
+    return typed
+
+
+def merge_partition_records(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """Records of one (date, channel) spread over several files, newest file winning.
+
+    Parquet holds what was compacted earlier, so it is read first and any
+    row file written since replaces its rows by ``message_id``.
+    """
+
+    records: Dict[Any, Dict[str, Any]] = {}
+    for path in sorted(paths, key=lambda p: not p.endswith(".parquet")):
+        for record in iter_channel_messages(path):
+            records[record.get("message_id")] = record
+    return sorted(records.values(), key=lambda r: r.get("message_id") or 0)
+
+
+def records_to_table(records: List[Dict[str, Any]]):
+    import pyarrow as pa
+
+    return pa.Table.from_pylist([_typed_record(r) for r in records], schema=message_arrow_schema())
+
+
+def compacted_sources(path: str) -> List[Dict[str, Any]]:
+    """The row files (lake-relative key, bytes, mtime) a Parquet partition was built from."""
+
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_schema(path).metadata or {}
+    raw = metadata.get(COMPACTION_SOURCES_KEY)
+    return json.loads(raw) if raw else []
+
+
+def compact_partition(base_path: str, date_str: str, channel_name: str, keep_source: bool = False) -> Dict[str, Any]:
+    """Rewrite one (date, channel) partition as a typed, sorted Parquet file.
+
+    Rows already compacted are merged with any row files written since. The
+    file is zstd-compressed with per-row-group min/max statistics and
+    replaced atomically; the row files are removed unless ``keep_source``.
+    A partition whose row files all match its recorded sources is left as is.
+    """
+
+    import pyarrow.parquet as pq
+
+    target = compacted_partition_path(base_path, date_str, channel_name)
+    paths = partition_files(base_path, date_str, date_str, [channel_name])
+    sources = {s["key"]: s for s in compacted_sources(target)} if os.path.exists(target) else {}
+
+    # Row files kept by ``keep_source`` are skipped until they change again
+    row_paths = []
+    for path in paths:
+        if path.endswith(".parquet"):
+            continue
+        stat = os.stat(path)
+        entry = {"key": os.path.relpath(path, base_path).replace(os.sep, "/"),
+                 "bytes": stat.st_size, "mtime": stat.st_mtime}
+        if sources.get(entry["key"]) != entry:
+            sources[entry["key"]] = entry
+            row_paths.append(path)
+    if not row_paths:
+        return {"path": target, "rows": 0, "bytes": 0, "sources": 0}
+
+    source_bytes = sum(os.path.getsize(p) for p in row_paths)
+
+    table = records_to_table(merge_partition_records(paths))
+    table = table.replace_schema_metadata({COMPACTION_SOURCES_KEY: json.dumps(list(sources.values()))})
+    ensure_dir(os.path.dirname(target))
+    tmp_path = f"{target}.tmp"
+    pq.write_table(
+        table, tmp_path, compression="zstd", row_group_size=PARQUET_ROW_GROUP_SIZE, write_statistics=True
+    )
+    os.replace(tmp_path, target)
+    _fsync_dir(os.path.dirname(target))
+    if not keep_source:
+        for path in row_paths:
+            os.remove(path)
+    return {"path": target, "rows": table.num_rows, "bytes": os.path.getsize(target),
+            "source_bytes": source_bytes, "sources": len(row_paths)}
+
+
+def compact_partitions(base_path: str, before: Optional[str] = None, keep_source: bool = False) -> List[Dict[str, Any]]:
+    """Compact every sealed day: row partitions dated before ``before`` (default: today, UTC).
+
+    Today's partitions are still being appended to and are left alone.
+    """
+
+    before = before or datetime.now(timezone.utc).date().isoformat()
+    pending = sorted({
+        partition_key(path)
+        for path in partition_files(base_path)
+        if not path.endswith(".parquet") and partition_key(path)[0] < before
+    })
+    results = [compact_partition(base_path, date_str, channel, keep_source) for date_str, channel in pending]
+    return [r for r in results if r["sources"]]
+
+
+def read_messages(
+    base_path: str,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    channels: Optional[Iterable[str]] = None,
+    columns: Optional[List[str]] = None,
+    filter: Optional[Any] = None,
+):
+    """Read lake messages as one Arrow table, opening only the partitions asked for.
+
+    Dates and channels prune whole files by path; ``filter`` (a
+    ``pyarrow.dataset`` expression, e.g. ``ds.field("views") > 1000``) is
+    pushed down to the Parquet row-group statistics. Days not compacted yet
+    are read from their row files, merged with any Parquet by ``message_id``.
+    """
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    schema = message_arrow_schema()
+    by_partition: Dict[Tuple[str, str], List[str]] = {}
+    for path in partition_files(base_path, date_from, date_to, channels):
+        by_partition.setdefault(partition_key(path), []).append(path)
+
+    parquet_files = [paths[0] for paths in by_partition.values() if len(paths) == 1 and paths[0].endswith(".parquet")]
+    mixed = [paths for paths in by_partition.values() if not (len(paths) == 1 and paths[0].endswith(".parquet"))]
+
+    tables = []
+    if parquet_files:
+        dataset = ds.dataset(parquet_files, schema=schema, format="parquet")
+        tables.append(dataset.to_table(columns=columns, filter=filter))
+    if mixed:
+        table = records_to_table([record for paths in mixed for record in merge_partition_records(paths)])
+        if filter is not None:
+            table = table.filter(filter)
+        tables.append(table.select(columns) if columns else table)
+    if not tables:
+        empty = schema.empty_table()
+        return empty.select(columns) if columns else empty
+    return pa.concat_tables(tables)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compact sealed lake partitions into Parquet")
+    parser.add_argument("--path", type=str, default="data")
+    parser.add_argument("--before", type=str, default=None,
+                        help="Compact days before this date (YYYY-MM-DD; default: today UTC)")
+    parser.add_argument("--keep-source", action="store_true", help="Leave the NDJSON/JSON files in place")
+    args = parser.parse_args()
+
+    results = compact_partitions(args.path, before=args.before, keep_source=args.keep_source)
+    rows = sum(r["rows"] for r in results)
+    before_bytes = sum(r.get("source_bytes", 0) for r in results)
+    after_bytes = sum(r["bytes"] for r in results)
+    print(f"🗜️ Compacted {len(results)} partitions ({rows} rows): {before_bytes} -> {after_bytes} bytes")
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_CACHE_PATH = 'data/yolo_cache.sqlite'
+RESULT_COLUMNS = ["message_id", "channel_name", "detected_class", "confidence_score", "image_category"]
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_version(model: Any, imgsz: int) -> str:
+    """Identify the weights and settings that produced a detection.
+
+    Models (or model factories) may expose an explicit ``version``; otherwise
+    the checkpoint file is hashed, so swapping ``yolov8n.pt`` for a retrained
+    file invalidates the cache even if the name stays the same. A weights path
+    can be passed instead of a model to version it without loading it.
+    """
+    if isinstance(model, str):
+        version, weights = None, model
+    else:
+        version, weights = getattr(model, "version", None), getattr(model, "ckpt_path", None)
+    if not version:
+        if weights and os.path.exists(weights):
+            version = f"{os.path.basename(weights)}@{file_sha256(weights)[:16]}"
+        else:
+            version = os.path.basename(weights) if weights else type(model).__name__
+    return f"{version}|imgsz={imgsz}"
+
+
+def fingerprint(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class DetectionCache:
+    """SQLite store of detections keyed by image path, size/mtime and model version."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS detections (
+                image_path TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                channel_name TEXT NOT NULL,
+                detected_class TEXT,
+                confidence_score REAL,
+                image_category TEXT,
+                PRIMARY KEY (image_path, model_version)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def __enter__(self) -> "DetectionCache":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def lookup(self, image_path: str, version: str) -> Optional[Dict[str, Any]]:
+        """Return the cached detection if the file is unchanged since it was inferred."""
+        row = self.conn.execute(
+            f"SELECT size, mtime_ns, {', '.join(RESULT_COLUMNS)} FROM detections "
+            "WHERE image_path = ? AND model_version = ?",
+            (image_path, version),
+        ).fetchone()
+        if row is None or tuple(row[:2]) != fingerprint(image_path):
+            return None
+        return dict(zip(RESULT_COLUMNS, row[2:]))
+
+    def store(self, items: Iterable[Tuple[str, Dict[str, Any]]], version: str) -> int:
+        rows: List[tuple] = []
+        for image_path, record in items:
+            size, mtime_ns = fingerprint(image_path)
+            rows.append((image_path, version, size, mtime_ns, *(record[c] for c in RESULT_COLUMNS)))
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO detections "
+            f"(image_path, model_version, size, mtime_ns, {', '.join(RESULT_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * (4 + len(RESULT_COLUMNS)))})",
+            rows,
+        )
+        self.conn.commit()
+        return len(rows)
+
+    def prune(self, version: str) -> int:
+        """Drop detections made by any other model version."""
+        cursor = self.conn.execute("DELETE FROM detections WHERE model_version != ?", (version,))
+        self.conn.commit()
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self.conn.close()
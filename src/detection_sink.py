@@ -0,0 +1,133 @@
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from src import metrics
+from src.loader import connect_db, copy_upsert
+
+YOLO_TABLE = "raw.yolo_results"
+YOLO_COLUMNS = [
+    "channel_name",
+    "message_id",
+    "model_version",
+    "detected_class",
+    "confidence_score",
+    "image_category",
+]
+YOLO_KEY = ["channel_name", "message_id", "model_version"]
+DEFAULT_SINK_BATCH_SIZE = 500
+
+SETUP_SQL = [
+    "CREATE SCHEMA IF NOT EXISTS raw",
+    """
+    CREATE TABLE IF NOT EXISTS raw.yolo_results (
+        channel_name text NOT NULL,
+        message_id bigint NOT NULL,
+        model_version text NOT NULL,
+        detected_class text,
+        confidence_score double precision,
+        image_category text,
+        detected_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (channel_name, message_id, model_version)
+    )
+    """,
+    # Tables written by the old CSV -> to_sql(if_exists='replace') step
+    "ALTER TABLE raw.yolo_results ADD COLUMN IF NOT EXISTS model_version text NOT NULL DEFAULT 'legacy'",
+    "ALTER TABLE raw.yolo_results ADD COLUMN IF NOT EXISTS detected_at timestamptz NOT NULL DEFAULT now()",
+    """
+    DELETE FROM raw.yolo_results a
+    USING raw.yolo_results b
+    WHERE a.ctid < b.ctid
+      AND a.channel_name = b.channel_name
+      AND a.message_id = b.message_id
+      AND a.model_version = b.model_version
+      AND to_regclass('raw.yolo_results_key_uidx') IS NULL
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS yolo_results_key_uidx
+        ON raw.yolo_results (channel_name, message_id, model_version)
+    """,
+]
+
+
+def ensure_yolo_table(engine) -> None:
+    with engine.begin() as conn:
+        for statement in SETUP_SQL:
+            conn.execute(text(statement))
+
+
+class PostgresDetectionSink:
+    """Write detections straight into ``raw.yolo_results`` as inference runs.
+
+    Records are buffered and flushed every ``batch_size`` rows through
+    ``copy_upsert`` (COPY into a staging table, then upsert on
+    ``(channel_name, message_id, model_version)``), each batch in its own
+    transaction, so an interrupted run keeps everything flushed so far and a
+    rerun is idempotent. Records must carry their ``model_version``.
+    """
+
+    table = YOLO_TABLE
+
+    def __init__(self, engine=None, batch_size: int = DEFAULT_SINK_BATCH_SIZE) -> None:
+        self.engine = engine or connect_db()
+        self.batch_size = max(batch_size, 1)
+        self.rows = 0
+        self._buffer: List[List[Any]] = []
+        ensure_yolo_table(self.engine)
+
+    def __enter__(self) -> "PostgresDetectionSink":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._buffer.append([record.get(column) for column in YOLO_COLUMNS])
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        raw_conn = self.engine.raw_connection()
+        try:
+            with metrics.timed("load_detections") as timer:
+                cursor = raw_conn.cursor()
+                written = copy_upsert(
+                    cursor, YOLO_TABLE, YOLO_COLUMNS, self._buffer, YOLO_KEY,
+                    touch_column="detected_at",
+                )
+                raw_conn.commit()
+                timer.add("rows", written)
+            self.rows += written
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+        self._buffer = []
+
+    def prune(self, version: str) -> int:
+        """Delete rows from older model versions for messages that have a ``version`` row.
+
+        Messages the current model has not seen yet keep their old detections.
+        """
+        self.flush()
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                text(
+                    """
+                    DELETE FROM raw.yolo_results old
+                    USING raw.yolo_results cur
+                    WHERE cur.channel_name = old.channel_name
+                      AND cur.message_id = old.message_id
+                      AND cur.model_version = :version
+                      AND old.model_version <> :version
+                    """
+                ),
+                {"version": version},
+            )
+        return result.rowcount
+
+    def close(self) -> None:
+        self.flush()
@@ -0,0 +1,245 @@
+"""
+Content-addressed image store with detector-sized derivatives.
+
+Each unique image is stored once under its sha256::
+
+    raw/images/_store/objects/ab/cd/abcd....jpg        original
+    raw/images/_store/derived/640/ab/cd/abcd....jpg    longest side <= 640
+    raw/images/_store/index.json                       channel/message_id -> sha256
+
+The legacy ``raw/images/<channel>/<message_id>.jpg`` paths stay valid as
+hard links to the object, so ``image_path`` in the lake and the warehouse
+keeps working. The detector reads the small derivative instead of decoding
+and resizing the full-resolution original on every pass.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from PIL import Image
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.datalake import ensure_dir, telegram_images_dir, update_json
+
+STORE_DIRNAME = "_store"
+DEFAULT_DERIVATIVE_SIZE = 640  # matches the detector's default imgsz
+DERIVATIVE_QUALITY = 90
+INDEX_SAVE_EVERY = 50
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def image_store_dir(base_path: str) -> str:
+    return os.path.join(telegram_images_dir(base_path), STORE_DIRNAME)
+
+
+def sha256_file(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_derivative(source: str, target: str, size: int, quality: int = DERIVATIVE_QUALITY) -> None:
+    """Write a JPEG whose longest side is at most ``size``; the aspect ratio is kept."""
+    ensure_dir(os.path.dirname(target))
+    tmp_path = f"{target}.{threading.get_ident()}.tmp"
+    with Image.open(source) as img:
+        img.draft("RGB", (size, size))  # JPEG: decode at a reduced scale directly
+        img = img.convert("RGB")
+        img.thumbnail((size, size), Image.BILINEAR)
+        img.save(tmp_path, format="JPEG", quality=quality)
+    os.replace(tmp_path, target)
+
+
+class ImageStore:
+    """Deduplicating ``(channel, message_id) -> sha256`` store.
+
+    ``ingest`` is safe to call from several threads (the download pool runs
+    it off the event loop); the index is guarded by a lock and saved
+    atomically every ``INDEX_SAVE_EVERY`` changes and on ``save``.
+    """
+
+    def __init__(self, root: str, derivative_sizes: Iterable[int] = (DEFAULT_DERIVATIVE_SIZE,)) -> None:
+        self.root = root
+        self.derivative_sizes = tuple(derivative_sizes)
+        self.index_path = os.path.join(root, "index.json")
+        self.images: Dict[str, str] = {}
+        self.objects: Dict[str, Dict[str, Any]] = {}
+        self.deduplicated_bytes = 0
+        self._lock = threading.Lock()
+        self._dirty = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.images, self.objects = data.get("images", {}), data.get("objects", {})
+
+    @classmethod
+    def for_lake(cls, base_path: str, derivative_sizes: Iterable[int] = (DEFAULT_DERIVATIVE_SIZE,)) -> "ImageStore":
+        return cls(image_store_dir(base_path), derivative_sizes)
+
+    @classmethod
+    def open_existing(cls, images_dir: str) -> Optional["ImageStore"]:
+        """The store under an images directory, or None if nothing was ingested yet."""
+        root = os.path.join(images_dir, STORE_DIRNAME)
+        return cls(root, ()) if os.path.exists(os.path.join(root, "index.json")) else None
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    @staticmethod
+    def key(channel_name: str, message_id: int) -> str:
+        return f"{channel_name}/{message_id}"
+
+    def object_path(self, sha: str, ext: str = ".jpg") -> str:
+        return os.path.join(self.root, "objects", sha[:2], sha[2:4], sha + ext)
+
+    def derivative_path(self, sha: str, size: int) -> str:
+        return os.path.join(self.root, "derived", str(size), sha[:2], sha[2:4], sha + ".jpg")
+
+    def sha_for(self, channel_name: str, message_id: int) -> Optional[str]:
+        return self.images.get(self.key(channel_name, message_id))
+
+    def derivative_for(self, channel_name: str, message_id: int, size: int) -> Optional[str]:
+        """Path of the ``size`` derivative for a message's image, if it has been built."""
+        sha = self.sha_for(channel_name, message_id)
+        if sha and size in self.objects.get(sha, {}).get("derivatives", []):
+            path = self.derivative_path(sha, size)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def ingest(self, channel_name: str, message_id: int, path: str) -> str:
+        """Add a downloaded file to the store; ``path`` stays as a hard link to the object.
+
+        Returns the sha256. A file whose content is already stored is replaced
+        by a link to the existing object, so reposts cost no extra disk.
+        """
+        sha = sha256_file(path)
+        ext = os.path.splitext(path)[1].lower() or ".jpg"
+        target = self.object_path(sha, ext)
+        ensure_dir(os.path.dirname(target))
+
+        with self._lock:
+            existing = sha in self.objects
+            if not existing:
+                self.objects[sha] = {"bytes": os.path.getsize(path), "ext": ext, "derivatives": []}
+        if existing and os.path.exists(target):
+            if not os.path.samefile(target, path):
+                size = os.path.getsize(path)
+                if self._link(target, path):
+                    self.deduplicated_bytes += size
+        else:
+            self._link(path, target)
+
+        for size in self.derivative_sizes:
+            self.ensure_derivative(sha, size)
+
+        with self._lock:
+            self.images[self.key(channel_name, message_id)] = sha
+            self._dirty += 1
+            should_save = self._dirty >= INDEX_SAVE_EVERY
+        if should_save:
+            self.save()
+        return sha
+
+    def ensure_derivative(self, sha: str, size: int) -> str:
+        target = self.derivative_path(sha, size)
+        entry = self.objects[sha]
+        if size not in entry["derivatives"] or not os.path.exists(target):
+            make_derivative(self.object_path(sha, entry["ext"]), target, size)
+            with self._lock:
+                if size not in entry["derivatives"]:
+                    entry["derivatives"].append(size)
+                self._dirty += 1
+        return target
+
+    @staticmethod
+    def _link(source: str, target: str) -> bool:
+        # Atomically point ``target`` at ``source``'s inode; where hard links are
+        # unavailable keep (or make) a plain copy so both paths stay readable
+        tmp_path = f"{target}.{threading.get_ident()}.link"
+        try:
+            os.link(source, tmp_path)
+            os.replace(tmp_path, target)
+            return True
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if not os.path.exists(target):
+                shutil.copy2(source, target)
+            return False
+
+    def save(self) -> None:
+        with self._lock:
+            images = dict(self.images)
+            objects = {sha: dict(entry, derivatives=list(entry["derivatives"])) for sha, entry in self.objects.items()}
+            self._dirty = 0
+
+        # Merged with what other processes saved meanwhile (parallel partition runs)
+        def merge(on_disk: Dict[str, Any]) -> Dict[str, Any]:
+            merged_images = {**on_disk.get("images", {}), **images}
+            merged_objects = on_disk.get("objects", {})
+            for sha, entry in objects.items():
+                if sha in merged_objects:
+                    sizes = set(merged_objects[sha]["derivatives"]) | set(entry["derivatives"])
+                    entry["derivatives"] = sorted(sizes)
+                merged_objects[sha] = entry
+            return {"images": merged_images, "objects": merged_objects}
+
+        merged = update_json(self.index_path, merge)
+        with self._lock:
+            for key, sha in merged["images"].items():
+                self.images.setdefault(key, sha)
+            for sha, entry in merged["objects"].items():
+                self.objects.setdefault(sha, entry)
+
+
+def backfill(base_path: str, sizes: Iterable[int] = (DEFAULT_DERIVATIVE_SIZE,)) -> ImageStore:
+    """Ingest legacy ``<channel>/<message_id>.jpg`` files and build missing derivatives."""
+
+    store = ImageStore.for_lake(base_path, sizes)
+    images_dir = telegram_images_dir(base_path)
+    if not os.path.isdir(images_dir):
+        return store
+    for channel_name in sorted(os.listdir(images_dir)):
+        channel_dir = os.path.join(images_dir, channel_name)
+        if channel_name.startswith("_") or not os.path.isdir(channel_dir):
+            continue
+        for filename in sorted(os.listdir(channel_dir)):
+            stem, ext = os.path.splitext(filename)
+            path = os.path.join(channel_dir, filename)
+            if ext.lower() not in IMAGE_EXTENSIONS or not stem.isdigit() or os.path.getsize(path) == 0:
+                continue
+            try:
+                sha = store.sha_for(channel_name, int(stem))
+                if sha is None:
+                    store.ingest(channel_name, int(stem), path)
+                else:
+                    for size in store.derivative_sizes:
+                        store.ensure_derivative(sha, size)
+            except Exception as e:
+                print(f"⚠️ Could not store {path}: {e}")
+    store.save()
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move existing lake images into the content-addressed store")
+    parser.add_argument("--path", type=str, default="data")
+    parser.add_argument("--size", type=int, action="append", dest="sizes",
+                        help=f"Derivative size to build (repeatable; default {DEFAULT_DERIVATIVE_SIZE})")
+    args = parser.parse_args()
+    result = backfill(args.path, args.sizes or [DEFAULT_DERIVATIVE_SIZE])
+    print(f"✅ {len(result.images)} images stored as {len(result)} unique objects "
+          f"({result.deduplicated_bytes} duplicate bytes replaced by hard links)")
@@ -1,10 +1,19 @@
 import os
-import json
-import glob
-import pandas as pd
+import io
+import sys
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import metrics
+from src.datalake import compacted_sources, describe_partition, iter_channel_messages, partition_files
+
 # 1. Load Environment Variables (but use hardcoded defaults as backup)
 load_dotenv()
 
@@ -15,68 +24,341 @@ DB_NAME = os.getenv("POSTGRES_DB", "medical_warehouse")
 DB_USER = os.getenv("POSTGRES_USER", "postgres")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "10academy_password")
 
+COPY_CHUNK_SIZE = 5000
+
+MESSAGE_COLUMNS = [
+    "message_id",
+    "channel_name",
+    "channel_title",
+    "message_date",
+    "message_text",
+    "has_media",
+    "image_path",
+    "views",
+    "forwards",
+]
+MESSAGE_KEY = ["channel_name", "message_id"]
+
+SETUP_SQL = [
+    "CREATE SCHEMA IF NOT EXISTS raw",
+    """
+    CREATE TABLE IF NOT EXISTS raw.telegram_messages (
+        message_id bigint NOT NULL,
+        channel_name text NOT NULL,
+        channel_title text,
+        message_date timestamptz,
+        message_text text,
+        has_media boolean,
+        image_path text,
+        views bigint,
+        forwards bigint,
+        loaded_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (channel_name, message_id)
+    )
+    """,
+    # Tables created by the old to_sql(if_exists='replace') loader have no key
+    "ALTER TABLE raw.telegram_messages ADD COLUMN IF NOT EXISTS loaded_at timestamptz NOT NULL DEFAULT now()",
+    # ...and store message_date as TEXT, which to_char() and date filters can't use
+    """
+    DO $$
+    BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_schema = 'raw' AND table_name = 'telegram_messages'
+              AND column_name = 'message_date') <> 'timestamp with time zone' THEN
+            ALTER TABLE raw.telegram_messages
+                ALTER COLUMN message_date TYPE timestamptz
+                USING nullif(message_date::text, '')::timestamptz;
+        END IF;
+    END
+    $$
+    """,
+    """
+    DELETE FROM raw.telegram_messages a
+    USING raw.telegram_messages b
+    WHERE a.ctid < b.ctid
+      AND a.channel_name = b.channel_name
+      AND a.message_id = b.message_id
+      AND to_regclass('raw.telegram_messages_channel_message_uidx') IS NULL
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS telegram_messages_channel_message_uidx
+        ON raw.telegram_messages (channel_name, message_id)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS raw.load_ledger (
+        partition_path text PRIMARY KEY,
+        rows bigint NOT NULL,
+        bytes bigint NOT NULL,
+        mtime double precision NOT NULL,
+        loaded_at timestamptz NOT NULL DEFAULT now()
+    )
+    """,
+]
+
 def connect_db():
     """Create a database connection engine."""
     # Print credentials to verify what Python is seeing
     print(f"🔌 Connecting to: {DB_USER}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
-    
+
     url = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     return create_engine(url)
 
-def load_raw_data(base_path="data"):
-    """Read JSON files and load them into PostgreSQL."""
-    
-    # 2. Find JSON files
-    json_pattern = os.path.join(base_path, "raw", "telegram_messages", "*", "*.json")
-    files = glob.glob(json_pattern)
-    
-    if not files:
-        print("⚠️ No JSON files found! Check your 'data/raw' folder.")
-        return
+def ensure_raw_tables(engine):
+    """Create (or migrate) raw.telegram_messages and the load ledger."""
+    with engine.begin() as conn:
+        for statement in SETUP_SQL:
+            conn.execute(text(statement))
 
-    print(f"📦 Found {len(files)} JSON files. Processing...")
+def _copy_field(value: Any) -> str:
+    # Quoted values are never read as NULL, so only None maps to \N
+    if value is None:
+        return r"\N"
+    return '"' + str(value).replace('"', '""') + '"'
 
-    all_messages = []
-    for file_path in files:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    all_messages.extend(data)
-        except Exception as e:
-            print(f"❌ Error reading {file_path}: {e}")
-
-    if not all_messages:
-        print("⚠️ Files found, but they were empty.")
-        return
+def _chunks(rows: Iterable[Sequence[Any]], size: int) -> Iterator[List[Sequence[Any]]]:
+    chunk: List[Sequence[Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def copy_upsert(
+    cursor,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    key_columns: Sequence[str],
+    chunk_size: int = COPY_CHUNK_SIZE,
+    touch_column: Optional[str] = None,
+) -> int:
+    """Bulk-upsert ``rows`` into ``table`` through COPY and a temp staging table.
+
+    Rows are streamed in chunks of ``chunk_size``: each chunk is COPYed into
+    a session temp table, then merged with ``INSERT ... ON CONFLICT`` on
+    ``key_columns`` so reloading the same rows is idempotent. When a chunk
+    holds a key twice the last row wins, as in the partition files.
+    ``touch_column`` is set to ``now()`` on updated rows. The caller owns
+    the transaction.
+    """
+    staging = "_stage_" + table.replace(".", "_")
+    column_list = ", ".join(columns)
+    key_list = ", ".join(key_columns)
+    updates = [c for c in columns if c not in key_columns]
+    set_clause = ", ".join(f"{c} = EXCLUDED.{c}" for c in updates)
+    if touch_column:
+        set_clause += f", {touch_column} = now()"
+
+    # _seq numbers the rows in COPY order, so duplicates can be ranked by arrival
+    cursor.execute(
+        f"CREATE TEMP TABLE IF NOT EXISTS {staging} "
+        f"(LIKE {table} INCLUDING DEFAULTS, _seq bigserial) ON COMMIT DROP"
+    )
+    total = 0
+    for chunk in _chunks(rows, chunk_size):
+        buffer = io.StringIO()
+        for row in chunk:
+            buffer.write(",".join(_copy_field(v) for v in row))
+            buffer.write("\n")
+        buffer.seek(0)
+        cursor.execute(f"TRUNCATE {staging}")
+        cursor.copy_expert(
+            f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+        # DISTINCT ON keeps the latest row per key; ON CONFLICT can't touch a row twice
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}) "
+            f"SELECT DISTINCT ON ({key_list}) {column_list} FROM {staging} "
+            f"ORDER BY {key_list}, _seq DESC "
+            f"ON CONFLICT ({key_list}) DO "
+            + (f"UPDATE SET {set_clause}" if set_clause else "NOTHING")
+        )
+        total += len(chunk)
+    return total
+
+def pending_partitions(
+    cursor,
+    base_path: str,
+    reload: bool = False,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    channels: Optional[Sequence[str]] = None,
+) -> List[Dict[str, Any]]:
+    """Sealed partitions that are new or changed since they were last loaded.
+
+    A compacted Parquet file whose source row files are all in the ledger
+    unchanged holds nothing new: it is recorded as loaded instead of being
+    upserted again.
+    """
+    cursor.execute("SELECT partition_path, bytes, mtime FROM raw.load_ledger")
+    ledger = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    pending = []
+    for path in partition_files(base_path, date_from, date_to, channels):
+        key = os.path.relpath(path, base_path).replace(os.sep, "/")
+        stat = os.stat(path)
+        if not reload and ledger.get(key) == (stat.st_size, stat.st_mtime):
+            continue
+        partition = {"path": path, "key": key, "bytes": stat.st_size, "mtime": stat.st_mtime}
+        if not reload and path.endswith(".parquet") and _already_loaded(path, ledger):
+            record_ledger(cursor, partition, describe_partition(path)["rows"])
+            continue
+        pending.append(partition)
+    return pending
 
-    # 3. Convert to DataFrame
-    df = pd.DataFrame(all_messages)
-    print(f"📊 Ready to load {len(df)} rows into Database...")
+def _already_loaded(path: str, ledger: Dict[str, Any]) -> bool:
+    sources = compacted_sources(path)
+    return bool(sources) and all(ledger.get(s["key"]) == (s["bytes"], s["mtime"]) for s in sources)
+
+def record_ledger(cursor, partition: Dict[str, Any], rows: int) -> None:
+    cursor.execute(
+        """
+        INSERT INTO raw.load_ledger (partition_path, rows, bytes, mtime, loaded_at)
+        VALUES (%s, %s, %s, %s, now())
+        ON CONFLICT (partition_path) DO UPDATE
+        SET rows = EXCLUDED.rows, bytes = EXCLUDED.bytes,
+            mtime = EXCLUDED.mtime, loaded_at = EXCLUDED.loaded_at
+        """,
+        (partition["key"], rows, partition["bytes"], partition["mtime"]),
+    )
+
+def load_partition(cursor, partition: Dict[str, Any], chunk_size: int = COPY_CHUNK_SIZE) -> int:
+    """Upsert one partition and record it in the ledger; the caller commits."""
+    rows = (
+        [record.get(column) for column in MESSAGE_COLUMNS]
+        for record in iter_channel_messages(partition["path"])
+    )
+    loaded = copy_upsert(
+        cursor, "raw.telegram_messages", MESSAGE_COLUMNS, rows, MESSAGE_KEY,
+        chunk_size, touch_column="loaded_at",
+    )
+    record_ledger(cursor, partition, loaded)
+    return loaded
+
+def load_partition_file(path: str, base_path: str = "data", engine=None, chunk_size: int = COPY_CHUNK_SIZE) -> int:
+    """Load a single partition file in its own transaction and return the rows upserted.
+
+    Unlike ``load_raw_data`` errors propagate, so orchestrators see the failure.
+    """
+    engine = engine or connect_db()
+    ensure_raw_tables(engine)
+    stat = os.stat(path)
+    partition = {
+        "path": path,
+        "key": os.path.relpath(path, base_path).replace(os.sep, "/"),
+        "bytes": stat.st_size,
+        "mtime": stat.st_mtime,
+    }
+    raw_conn = engine.raw_connection()
+    try:
+        with metrics.timed("load") as timer:
+            loaded = load_partition(raw_conn.cursor(), partition, chunk_size)
+            raw_conn.commit()
+            timer.add("rows", loaded)
+            timer.add("bytes", partition["bytes"])
+        return loaded
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+
+def load_raw_data(base_path="data", reload=False, chunk_size=COPY_CHUNK_SIZE,
+                  date_from=None, date_to=None, channels=None):
+    """Stream new or changed lake partitions into raw.telegram_messages.
+
+    Partitions already recorded in ``raw.load_ledger`` with the same size and
+    mtime are skipped, so a daily run only loads the day's delta. Each
+    partition is COPYed in ``chunk_size`` row chunks and upserted on
+    (channel_name, message_id), then recorded in the ledger in the same
+    transaction. ``reload=True`` ignores the ledger. ``date_from``/``date_to``
+    and ``channels`` restrict the run to those partitions (e.g. a targeted
+    reload) without listing or reading the rest of the lake.
+    """
+
+    if not partition_files(base_path, date_from, date_to, channels):
+        print("⚠️ No partition files found! Check your 'data/raw' folder.")
+        return
 
-    # 4. Connect and Load
     try:
         engine = connect_db()
-        
-        # Create schema 'raw' if not exists
-        with engine.connect() as conn:
-            conn.execute(text("CREATE SCHEMA IF NOT EXISTS raw;"))
-            conn.commit()
-
-        # Load data to table
-        df.to_sql(
-            name='telegram_messages',
-            con=engine,
-            schema='raw',
-            if_exists='replace', 
-            index=False
-        )
-        print("✅ SUCCESS! Data loaded into 'raw.telegram_messages'.")
-        
+        ensure_raw_tables(engine)
+
+        raw_conn = engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            partitions = pending_partitions(
+                cursor, base_path, reload=reload, date_from=date_from, date_to=date_to, channels=channels,
+            )
+            raw_conn.commit()
+            if not partitions:
+                print("✅ Nothing to load: every partition is already in 'raw.telegram_messages'.")
+                return
+
+            print(f"📦 {len(partitions)} new or changed partitions. Loading...")
+            total_rows = 0
+            for partition in partitions:
+                try:
+                    with metrics.timed("load") as timer:
+                        loaded = load_partition(cursor, partition, chunk_size)
+                        raw_conn.commit()
+                        timer.add("rows", loaded)
+                        timer.add("bytes", partition["bytes"])
+                    total_rows += loaded
+                    print(f"   ↳ {partition['key']}: {loaded} rows")
+                except Exception as e:
+                    raw_conn.rollback()
+                    print(f"❌ Error loading {partition['key']}: {e}")
+        finally:
+            raw_conn.close()
+
+        print(f"✅ SUCCESS! Upserted {total_rows} rows into 'raw.telegram_messages'.")
+
     except Exception as e:
         print("\n❌ CONNECTION ERROR:")
         print(e)
         print("\n💡 TIP: Ensure Docker is running via 'docker compose up -d'")
 
+def bump_data_version(engine=None):
+    """Advance the warehouse data version after a successful transformation run.
+
+    The API keys its response cache and ETags on this stamp, so bumping it
+    invalidates every cached report at once.
+    """
+    engine = engine or connect_db()
+    with engine.begin() as conn:
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS raw"))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS raw.data_version (
+                id integer PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+                version bigint NOT NULL,
+                updated_at timestamptz NOT NULL DEFAULT now()
+            )
+        """))
+        version = conn.execute(text("""
+            INSERT INTO raw.data_version (id, version, updated_at) VALUES (1, 1, now())
+            ON CONFLICT (id) DO UPDATE
+            SET version = raw.data_version.version + 1, updated_at = now()
+            RETURNING version
+        """)).scalar_one()
+    print(f"🔖 Warehouse data version is now {version}")
+    return version
+
 if __name__ == "__main__":
-    load_raw_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", type=str, default="data")
+    parser.add_argument("--reload", action="store_true",
+                        help="Ignore the load ledger and re-upsert every partition")
+    parser.add_argument("--chunk-size", type=int, default=COPY_CHUNK_SIZE)
+    parser.add_argument("--from", dest="date_from", type=str, default=None, help="First partition date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=str, default=None, help="Last partition date (YYYY-MM-DD)")
+    parser.add_argument("--channel", dest="channels", action="append", default=None,
+                        help="Only load this channel (repeatable)")
+    args = parser.parse_args()
+    load_raw_data(
+        args.path, reload=args.reload, chunk_size=args.chunk_size,
+        date_from=args.date_from, date_to=args.date_to, channels=args.channels,
+    )
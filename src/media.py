@@ -0,0 +1,320 @@
+"""
+Asynchronous media download pool for the Telegram scraper.
+
+Message iteration only enqueues download jobs; a fixed pool of workers drains
+the bounded queue, so text scraping is never blocked behind image transfers.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telethon.errors import FloodWaitError
+
+from src import metrics
+from src.datalake import ensure_dir, media_index_path, telegram_images_dir, update_json
+from src.image_store import ImageStore
+from src.phash import PHashIndex, dhash, image_key
+from src.ratelimit import TokenBucket
+
+logger = logging.getLogger("telegram_scraper")
+
+DEFAULT_DOWNLOAD_WORKERS = 4
+DEFAULT_DOWNLOAD_QUEUE_SIZE = 100
+DEFAULT_DOWNLOAD_RETRIES = 3
+DEFAULT_DOWNLOAD_TIMEOUT = 60.0
+
+CALLBACK_ERRORS = metrics.REGISTRY.counter(
+    "media_download_callback_errors_total", "on_complete callbacks that raised", ["channel"]
+)
+INDEX_SAVE_EVERY = 50
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+@dataclass
+class DownloadJob:
+    channel_name: str
+    message_id: int
+    media: Any
+    path: str
+
+
+@dataclass
+class ChannelDownloadStats:
+    files: int = 0
+    bytes: int = 0
+    failures: int = 0
+    retries: int = 0
+    duplicates: int = 0
+    callback_errors: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    latencies: List[float] = field(default_factory=list, repr=False)
+
+    def record(self, size: int, seconds: float) -> None:
+        self.files += 1
+        self.bytes += size
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.latencies.append(seconds)
+
+    def as_dict(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        p95 = ordered[int(0.95 * (len(ordered) - 1))] if ordered else 0.0
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "duplicates": self.duplicates,
+            "callback_errors": self.callback_errors,
+            "avg_seconds": round(self.seconds / self.files, 3) if self.files else 0.0,
+            "p95_seconds": round(p95, 3),
+            "max_seconds": round(self.max_seconds, 3),
+            "bytes_per_second": round(self.bytes / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+
+class MediaIndex:
+    """Persistent record of downloaded media, keyed by ``channel/message_id``.
+
+    The index is stored as ``raw/images/_index.json``. When it does not exist
+    yet it is bootstrapped from the images already on disk so existing lakes
+    are not downloaded again.
+    """
+
+    def __init__(self, base_path: str) -> None:
+        self.path = media_index_path(base_path)
+        self.images_dir = telegram_images_dir(base_path)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = 0
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        else:
+            self._bootstrap()
+
+    @staticmethod
+    def key(channel_name: str, message_id: int) -> str:
+        return f"{channel_name}/{message_id}"
+
+    def _bootstrap(self) -> None:
+        if not os.path.isdir(self.images_dir):
+            return
+        for channel_name in os.listdir(self.images_dir):
+            channel_dir = os.path.join(self.images_dir, channel_name)
+            if channel_name.startswith("_") or not os.path.isdir(channel_dir):
+                continue
+            for filename in os.listdir(channel_dir):
+                stem, ext = os.path.splitext(filename)
+                path = os.path.join(channel_dir, filename)
+                if ext.lower() in IMAGE_EXTENSIONS and stem.isdigit() and os.path.getsize(path) > 0:
+                    self.add(channel_name, int(stem), path, os.path.getsize(path))
+        self.save()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, channel_name: str, message_id: int) -> Optional[Dict[str, Any]]:
+        return self._entries.get(self.key(channel_name, message_id))
+
+    def contains(self, channel_name: str, message_id: int) -> bool:
+        return self.key(channel_name, message_id) in self._entries
+
+    def add(self, channel_name: str, message_id: int, path: str, size: int) -> None:
+        self._entries[self.key(channel_name, message_id)] = {
+            "path": path,
+            "bytes": size,
+            "downloaded_utc": datetime.now(timezone.utc).isoformat(),
+        }
+        self._dirty += 1
+        if self._dirty >= INDEX_SAVE_EVERY:
+            self.save()
+
+    def save(self) -> None:
+        # Merged with entries other processes saved meanwhile (parallel partition runs)
+        def merge(on_disk: Dict[str, Any]) -> Dict[str, Any]:
+            on_disk.update(self._entries)
+            return on_disk
+
+        self._entries = update_json(self.path, merge)
+        self._dirty = 0
+
+
+class MediaDownloadPool:
+    """Bounded producer/consumer pool for ``client.download_media``.
+
+    ``submit`` blocks only when the queue is full, which keeps memory bounded
+    while letting message iteration run ahead of the downloads.
+
+    With a ``store``, each download is added to the content-addressed image
+    store (and its detector-sized derivative built) before ``on_complete``.
+
+    ``on_complete`` is awaited with each successfully downloaded job, from
+    the worker that fetched it, so a slow consumer applies backpressure all
+    the way back to ``submit``.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        index: MediaIndex,
+        *,
+        workers: int = DEFAULT_DOWNLOAD_WORKERS,
+        queue_size: int = DEFAULT_DOWNLOAD_QUEUE_SIZE,
+        retries: int = DEFAULT_DOWNLOAD_RETRIES,
+        timeout: float = DEFAULT_DOWNLOAD_TIMEOUT,
+        limiter: Optional[TokenBucket] = None,
+        phash: Optional[PHashIndex] = None,
+        store: Optional[ImageStore] = None,
+        on_complete: Optional[Callable[[DownloadJob], Awaitable[None]]] = None,
+    ) -> None:
+        self.client = client
+        self.index = index
+        self.workers = max(workers, 1)
+        self.retries = retries
+        self.timeout = timeout
+        self.limiter = limiter
+        self.phash = phash
+        self.store = store
+        self.on_complete = on_complete
+        self.queue: "asyncio.Queue[Optional[DownloadJob]]" = asyncio.Queue(maxsize=max(queue_size, 1))
+        self.stats: Dict[str, ChannelDownloadStats] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._pending: set = set()
+
+    async def __aenter__(self) -> "MediaDownloadPool":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def channel_stats(self, channel_name: str) -> ChannelDownloadStats:
+        return self.stats.setdefault(channel_name, ChannelDownloadStats())
+
+    async def submit(self, job: DownloadJob) -> bool:
+        """Queue a download; returns False if the media is already indexed."""
+
+        key = MediaIndex.key(job.channel_name, job.message_id)
+        if self.index.contains(job.channel_name, job.message_id) or key in self._pending:
+            return False
+        self._pending.add(key)
+        await self.queue.put(job)
+        metrics.set_queue_depth("media_downloads", self.queue.qsize())
+        return True
+
+    async def join(self) -> None:
+        """Wait until every queued download has finished or failed."""
+
+        await self.queue.join()
+
+    async def close(self) -> None:
+        await self.queue.join()
+        for _ in self._tasks:
+            await self.queue.put(None)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.index.save()
+        if self.phash is not None:
+            self.phash.save()
+        if self.store is not None:
+            self.store.save()
+
+    def stats_as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {channel: stats.as_dict() for channel, stats in self.stats.items()}
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            try:
+                if job is None:
+                    return
+                await self._download(job)
+            except Exception as e:
+                # A dead worker would leave the bounded queue undrained and hang join()
+                logger.error(f"Unexpected error handling {job.path}: {e}")
+                self.channel_stats(job.channel_name).failures += 1
+            finally:
+                metrics.set_queue_depth("media_downloads", self.queue.qsize())
+                if job is not None:
+                    self._pending.discard(MediaIndex.key(job.channel_name, job.message_id))
+                self.queue.task_done()
+
+    async def _register_phash(self, job: DownloadJob, stats: ChannelDownloadStats) -> None:
+        # Decoding runs off the event loop; the index itself is only touched here
+        try:
+            value = await asyncio.to_thread(dhash, job.path)
+        except Exception as e:
+            logger.warning(f"Could not hash {job.path}: {e}")
+            return
+        canonical = self.phash.add(job.channel_name, job.message_id, job.path, value)
+        if canonical != image_key(job.channel_name, job.message_id):
+            stats.duplicates += 1
+
+    async def _store_image(self, job: DownloadJob) -> None:
+        # Hashing and the derivative resize are CPU/disk work: keep them off the loop
+        try:
+            await asyncio.to_thread(self.store.ingest, job.channel_name, job.message_id, job.path)
+        except Exception as e:
+            logger.warning(f"Could not add {job.path} to the image store: {e}")
+
+    async def _download(self, job: DownloadJob) -> None:
+        stats = self.channel_stats(job.channel_name)
+        ensure_dir(os.path.dirname(job.path))
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                stats.retries += 1
+            try:
+                if self.limiter:
+                    await self.limiter.acquire()
+                started = time.perf_counter()
+                await asyncio.wait_for(self.client.download_media(job.media, job.path), self.timeout)
+                size = os.path.getsize(job.path) if os.path.exists(job.path) else 0
+                if size == 0:
+                    raise IOError("empty file after download")
+                stats.record(size, time.perf_counter() - started)
+                metrics.record_stage("download", time.perf_counter() - started, images=1, bytes=size)
+                self.index.add(job.channel_name, job.message_id, job.path, size)
+                if self.store is not None:
+                    await self._store_image(job)
+                if self.phash is not None:
+                    await self._register_phash(job, stats)
+                break
+            except FloodWaitError as e:
+                wait_seconds = max(int(getattr(e, "seconds", 0) or 0), 1)
+                logger.warning(f"FloodWaitError downloading {job.path}: waiting {wait_seconds}s")
+                metrics.record_flood_wait("media", wait_seconds)
+                if self.limiter:
+                    self.limiter.penalize(wait_seconds)
+                else:
+                    await asyncio.sleep(wait_seconds)
+            except Exception as e:
+                logger.warning(f"Download attempt {attempt + 1} failed for {job.path}: {e}")
+                if attempt < self.retries:
+                    await asyncio.sleep(2 ** attempt)
+        else:
+            stats.failures += 1
+            if os.path.exists(job.path) and os.path.getsize(job.path) == 0:
+                os.remove(job.path)
+            logger.error(f"Giving up on {job.path} after {self.retries + 1} attempts")
+            return
+
+        # Outside the retry loop: a failing consumer must not trigger a re-download
+        if self.on_complete:
+            try:
+                await self.on_complete(job)
+            except Exception as e:
+                stats.callback_errors += 1
+                CALLBACK_ERRORS.inc(channel=job.channel_name)
+                logger.error(f"on_complete failed for {job.path}: {e}")
@@ -0,0 +1,282 @@
+"""
+Dictionary-driven product mention extraction.
+
+Every spelling variant in the product lexicon
+(``medical_warehouse/seeds/product_lexicon.csv``, also loaded by
+``dbt seed``) is normalized and compiled into one Aho-Corasick automaton,
+so a message is scanned once regardless of lexicon size. Matches must sit
+on word boundaries; overlapping matches resolve to the leftmost-longest
+("vitamin c serum" is one serum, not vitamin c + serum).
+
+``extract_mentions`` runs incrementally after loading: it reads the
+messages (re-)loaded into ``raw.telegram_messages`` since its watermark
+(minus ``WATERMARK_LOOKBACK``) through a server-side cursor and replaces their rows in
+``raw.product_mentions``, which ``fct_product_mentions`` rolls up. A
+lexicon change is detected by its hash and triggers a full re-extraction.
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import metrics
+
+LEXICON_PATH = PROJECT_ROOT / "medical_warehouse" / "seeds" / "product_lexicon.csv"
+SCAN_CHUNK_SIZE = 5000
+# loaded_at is the load transaction's start time: re-scan this far behind the
+# watermark so loads that committed after the last run are not skipped
+WATERMARK_LOOKBACK = os.getenv("MENTIONS_WATERMARK_LOOKBACK", "3 hours")
+
+MENTION_COLUMNS = [
+    "channel_name",
+    "message_id",
+    "product",
+    "mention_count",
+    "message_date",
+    "mention_date",
+    "views",
+    "lexicon_version",
+]
+MENTION_KEY = ["channel_name", "message_id", "product"]
+
+SETUP_SQL = [
+    "CREATE SCHEMA IF NOT EXISTS raw",
+    """
+    CREATE TABLE IF NOT EXISTS raw.product_mentions (
+        channel_name text NOT NULL,
+        message_id bigint NOT NULL,
+        product text NOT NULL,
+        mention_count integer NOT NULL,
+        message_date timestamptz,
+        mention_date date,
+        views bigint,
+        lexicon_version text NOT NULL,
+        extracted_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (channel_name, message_id, product)
+    )
+    """,
+    # fct_product_mentions recomputes (channel, day) pairs and reads new rows by extracted_at
+    "CREATE INDEX IF NOT EXISTS product_mentions_channel_date_idx ON raw.product_mentions (channel_name, mention_date)",
+    "CREATE INDEX IF NOT EXISTS product_mentions_extracted_at_idx ON raw.product_mentions (extracted_at)",
+    """
+    CREATE TABLE IF NOT EXISTS raw.product_mention_state (
+        id integer PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+        lexicon_version text NOT NULL,
+        watermark timestamptz,
+        updated_at timestamptz NOT NULL DEFAULT now()
+    )
+    """,
+]
+
+_SEPARATORS = re.compile(r"[^\w]+|_")
+# "500mg" / "vitc1000" -> split letters from digits so dosages don't hide names
+_LETTER_DIGIT = re.compile(r"(?<=[^\W\d_])(?=\d)|(?<=\d)(?=[^\W\d_])")
+
+
+def normalize(text: str) -> str:
+    """Case-fold, unify Unicode forms and reduce punctuation to single spaces."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = _LETTER_DIGIT.sub(" ", text)
+    return " ".join(_SEPARATORS.sub(" ", text).split())
+
+
+def load_lexicon(path: Path = LEXICON_PATH) -> Dict[str, Dict[str, Any]]:
+    """``{product: {"category": ..., "variants": [...]}}`` from the lexicon CSV."""
+    lexicon: Dict[str, Dict[str, Any]] = {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            product = row["product"].strip()
+            variants = [v for v in (row.get("variants") or "").split("|") if v.strip()]
+            lexicon[product] = {"category": row.get("category", "").strip(), "variants": [product] + variants}
+    return lexicon
+
+
+def lexicon_version(path: Path = LEXICON_PATH) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+class MentionMatcher:
+    """Aho-Corasick automaton mapping normalized variants to their product."""
+
+    def __init__(self, lexicon: Dict[str, Dict[str, Any]]) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]  # (pattern length, product) ending here
+        for product, entry in lexicon.items():
+            for variant in entry["variants"]:
+                pattern = normalize(variant)
+                if pattern:
+                    self._add(pattern, product)
+        self._link()
+
+    @classmethod
+    def from_file(cls, path: Path = LEXICON_PATH) -> "MentionMatcher":
+        return cls(load_lexicon(path))
+
+    def _add(self, pattern: str, product: str) -> None:
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        if (len(pattern), product) not in self._out[state]:
+            self._out[state].append((len(pattern), product))
+
+    def _link(self) -> None:
+        # Breadth-first, so every failure target is final before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                if state:
+                    fallback = self._fail[state]
+                    while fallback and ch not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, normalized: str) -> Iterator[Tuple[int, int, str]]:
+        """Every whole-word ``(start, end, product)`` match in already normalized text."""
+        state = 0
+        for i, ch in enumerate(normalized):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, product in self._out[state]:
+                start, end = i - length + 1, i + 1
+                if (start == 0 or normalized[start - 1] == " ") and (end == len(normalized) or normalized[end] == " "):
+                    yield start, end, product
+
+    def count(self, text: str) -> Dict[str, int]:
+        """Mentions per product in ``text``, overlapping matches resolved leftmost-longest."""
+        matches = sorted(self.find(normalize(text)), key=lambda m: (m[0], -m[1]))
+        counts: Counter = Counter()
+        taken_until = 0
+        for start, end, product in matches:
+            if start >= taken_until:
+                counts[product] += 1
+                taken_until = end
+        return dict(counts)
+
+
+def mention_rows(
+    matcher: MentionMatcher, messages: Iterable[Sequence[Any]], version: str
+) -> Iterator[List[Any]]:
+    """``raw.product_mentions`` rows for ``(channel_name, message_id, text, message_date, views)`` tuples."""
+    for channel_name, message_id, message_text, message_date, views in messages:
+        for product, mentions in matcher.count(message_text or "").items():
+            mention_date = message_date.date() if hasattr(message_date, "date") else None
+            yield [channel_name, message_id, product, mentions, message_date, mention_date, views, version]
+
+
+def extract_mentions(engine=None, lexicon_path: Path = LEXICON_PATH, full: bool = False,
+                     chunk_size: int = SCAN_CHUNK_SIZE) -> int:
+    """Extract mentions from messages loaded since the last run; returns the rows written.
+
+    Runs in one transaction: the scan, the replaced mention rows and the new
+    watermark commit together, so a failed run leaves the previous state.
+    """
+    from src.loader import connect_db, copy_upsert
+
+    matcher = MentionMatcher.from_file(lexicon_path)
+    version = lexicon_version(lexicon_path)
+    engine = engine or connect_db()
+    raw_conn = engine.raw_connection()
+    try:
+        cursor = raw_conn.cursor()
+        for statement in SETUP_SQL:
+            cursor.execute(statement)
+        cursor.execute("SELECT lexicon_version, watermark FROM raw.product_mention_state WHERE id = 1")
+        state = cursor.fetchone()
+        watermark = None
+        if full or state is None or state[0] != version:
+            # New lexicon: every message may match differently
+            cursor.execute("TRUNCATE raw.product_mentions")
+            print(f"🔤 Full mention extraction with lexicon {version}")
+        else:
+            watermark = state[1]
+
+        # Named cursor = server-side: only chunk_size messages are in memory at once
+        scan = raw_conn.cursor(name="product_mention_scan")
+        scan.itersize = chunk_size
+        scan.execute(
+            "SELECT channel_name, message_id, message_text, message_date::timestamptz, views, loaded_at "
+            "FROM raw.telegram_messages "
+            "WHERE %s::timestamptz IS NULL OR loaded_at > %s::timestamptz - %s::interval",
+            (watermark, watermark, WATERMARK_LOOKBACK),
+        )
+        written = 0
+        scanned = 0
+        with metrics.timed("mentions") as timer:
+            while True:
+                batch = scan.fetchmany(chunk_size)
+                if not batch:
+                    break
+                scanned += len(batch)
+                newest = max((row[5] for row in batch if row[5] is not None), default=None)
+                if newest is not None and (watermark is None or newest > watermark):
+                    watermark = newest
+                # Re-loaded messages may have been edited: replace, don't merge
+                cursor.execute(
+                    "DELETE FROM raw.product_mentions p "
+                    "USING unnest(%s::text[], %s::bigint[]) AS m(channel_name, message_id) "
+                    "WHERE p.channel_name = m.channel_name AND p.message_id = m.message_id",
+                    ([row[0] for row in batch], [row[1] for row in batch]),
+                )
+                rows = list(mention_rows(matcher, (row[:5] for row in batch), version))
+                written += copy_upsert(cursor, "raw.product_mentions", MENTION_COLUMNS, rows, MENTION_KEY,
+                                       touch_column="extracted_at")
+            timer.add("messages", scanned)
+            timer.add("rows", written)
+        scan.close()
+
+        cursor.execute(
+            """
+            INSERT INTO raw.product_mention_state (id, lexicon_version, watermark, updated_at)
+            VALUES (1, %s, %s, now())
+            ON CONFLICT (id) DO UPDATE
+            SET lexicon_version = EXCLUDED.lexicon_version, watermark = EXCLUDED.watermark, updated_at = now()
+            """,
+            (version, watermark),
+        )
+        raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+
+    print(f"💊 Scanned {scanned} messages, wrote {written} product mentions into 'raw.product_mentions'")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract product mentions from newly loaded messages")
+    parser.add_argument("--lexicon", type=Path, default=LEXICON_PATH)
+    parser.add_argument("--full", action="store_true", help="Ignore the watermark and re-extract everything")
+    parser.add_argument("--chunk-size", type=int, default=SCAN_CHUNK_SIZE)
+    parser.add_argument("--text", type=str, default=None, help="Just print the mentions found in this text")
+    args = parser.parse_args()
+
+    if args.text is not None:
+        print(MentionMatcher.from_file(args.lexicon).count(args.text))
+    else:
+        extract_mentions(lexicon_path=args.lexicon, full=args.full, chunk_size=args.chunk_size)
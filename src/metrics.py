@@ -0,0 +1,248 @@
+"""
+Process-wide performance instrumentation (stdlib only).
+
+Counters, gauges and histograms live in one ``REGISTRY`` and render in the
+Prometheus text exposition format for the API's ``/metrics`` route. Batch
+stages wrap their work in ``timed(stage)``, which records the duration and
+item counts; ``stage_summary()`` turns those into per-stage seconds and
+throughput (messages/s, bytes/s, images/s, rows/s) for Dagster metadata.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self.values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.series: Dict[LabelValues, List[float]] = {}  # bucket counts..., sum, count
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self.series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self.series.get(self._key(labels))
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, series in sorted(self.series.items()):
+            for bound, cumulative in zip(self.buckets, series):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help_text: str, labelnames: Sequence[str], **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+
+
+REGISTRY = Registry()
+
+# --- Pipeline metrics -------------------------------------------------------
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds", "Wall time of one run of a pipeline stage", ["stage"], STAGE_BUCKETS
+)
+STAGE_ITEMS = REGISTRY.counter(
+    "pipeline_stage_items_total", "Items processed per stage (messages, bytes, images, rows)", ["stage", "unit"]
+)
+QUEUE_DEPTH = REGISTRY.gauge("pipeline_queue_depth", "Current depth of an in-process work queue", ["queue"])
+FLOOD_WAITS = REGISTRY.counter(
+    "telegram_flood_waits_total", "FloodWaitErrors returned by Telegram", ["source"]
+)
+FLOOD_WAIT_SECONDS = REGISTRY.counter(
+    "telegram_flood_wait_seconds_total", "Seconds Telegram asked us to back off", ["source"]
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "API request latency", ["method", "route", "status"]
+)
+
+_stage_totals: Dict[str, Dict[str, float]] = {}
+_stage_lock = threading.Lock()
+
+
+class StageTimer:
+    """Handle yielded by ``timed``; ``add`` counts the items the stage handled."""
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+        self.items: Dict[str, float] = {}
+        self.seconds = 0.0
+
+    def add(self, unit: str, amount: float = 1) -> None:
+        self.items[unit] = self.items.get(unit, 0) + amount
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[StageTimer]:
+    timer = StageTimer(stage)
+    started = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        timer.seconds = time.perf_counter() - started
+        record_stage(stage, timer.seconds, **timer.items)
+
+
+def record_stage(stage: str, seconds: float, **items: float) -> None:
+    """Record a stage run measured elsewhere (e.g. accumulated across async tasks)."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    with _stage_lock:
+        totals = _stage_totals.setdefault(stage, {"seconds": 0.0})
+        totals["seconds"] += seconds
+        for unit, amount in items.items():
+            STAGE_ITEMS.inc(amount, stage=stage, unit=unit)
+            totals[unit] = totals.get(unit, 0) + amount
+
+
+def set_queue_depth(queue: str, depth: int) -> None:
+    QUEUE_DEPTH.set(depth, queue=queue)
+
+
+def record_flood_wait(source: str, seconds: float) -> None:
+    FLOOD_WAITS.inc(source=source)
+    FLOOD_WAIT_SECONDS.inc(seconds, source=source)
+
+
+def stage_summary(stages: Optional[Sequence[str]] = None) -> Dict[str, float]:
+    """Flat ``{stage}_seconds`` / ``{stage}_{unit}`` / ``{stage}_{unit}_per_second`` numbers.
+
+    Shaped for Dagster ``MaterializeResult`` metadata, which wants scalars.
+    """
+    out: Dict[str, float] = {}
+    with _stage_lock:
+        for stage, totals in sorted(_stage_totals.items()):
+            if stages is not None and stage not in stages:
+                continue
+            seconds = totals["seconds"]
+            out[f"{stage}_seconds"] = round(seconds, 3)
+            for unit, amount in totals.items():
+                if unit == "seconds":
+                    continue
+                out[f"{stage}_{unit}"] = amount
+                out[f"{stage}_{unit}_per_second"] = round(amount / seconds, 2) if seconds else 0.0
+    for source in ("history", "media"):
+        waits = FLOOD_WAITS.get(source=source)
+        if waits:
+            out[f"flood_waits_{source}"] = waits
+            out[f"flood_wait_seconds_{source}"] = FLOOD_WAIT_SECONDS.get(source=source)
+    return out
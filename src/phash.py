@@ -0,0 +1,212 @@
+"""
+Perceptual-hash (dHash) index used to deduplicate reposted product photos.
+
+Every downloaded image is hashed and mapped to a canonical representative:
+the first image seen within ``max_distance`` bits of it. The detector then
+runs once per canonical image and fans the result out to every
+(channel_name, message_id) in the group.
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.datalake import phash_index_path, telegram_images_dir, update_json
+
+HASH_SIZE = 8  # 64-bit hash
+BANDS = 4  # 4 x 16-bit bands: any hash within 3 bits shares at least one band
+MAX_DISTANCE = BANDS - 1  # beyond this, banding can miss near-duplicates
+DEFAULT_MAX_DISTANCE = 3
+INDEX_SAVE_EVERY = 50
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def dhash(path: str, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: compare horizontally adjacent pixels of a tiny grayscale copy."""
+
+    with Image.open(path) as img:
+        img.draft("L", (hash_size * 8, hash_size * 8))  # let JPEG decode at reduced scale
+        small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def distance_arg(value: str) -> int:
+    """argparse type for a max distance the banded lookup can guarantee."""
+    distance = int(value)
+    if not 0 <= distance <= MAX_DISTANCE:
+        raise argparse.ArgumentTypeError(f"must be between 0 and {MAX_DISTANCE}, got {distance}")
+    return distance
+
+
+def image_key(channel_name: str, message_id: int) -> str:
+    return f"{channel_name}/{message_id}"
+
+
+def parse_key(key: str) -> Tuple[str, int]:
+    channel_name, message_id = key.rsplit("/", 1)
+    return channel_name, int(message_id)
+
+
+class PHashIndex:
+    """Persistent ``channel/message_id -> (hash, canonical key)`` mapping.
+
+    Near-duplicate lookup uses banding: the 64-bit hash is split into
+    ``BANDS`` chunks and only canonicals sharing a chunk are compared, so an
+    insert costs a handful of comparisons instead of a scan of every image.
+    Two hashes differing in fewer than ``BANDS`` bits always share a chunk,
+    so ``max_distance`` is capped at ``MAX_DISTANCE``.
+    Perceptual matches only share the canonical (and so its detections);
+    files are never touched, since distance 0 does not mean equal bytes.
+    Byte-identical copies are deduplicated by ``src.image_store`` instead.
+    """
+
+    def __init__(self, path: str, max_distance: int = DEFAULT_MAX_DISTANCE) -> None:
+        if not 0 <= max_distance <= MAX_DISTANCE:
+            raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE} with {BANDS} hash bands")
+        self.path = path
+        self.max_distance = max_distance
+        self.images: Dict[str, Dict[str, Any]] = {}
+        # Built on the first lookup: readers that only resolve canonicals never pay for it
+        self._bands: Optional[Dict[Tuple[int, int], List[str]]] = None
+        self._dirty = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.images = json.load(f)
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def _band_keys(self, value: int) -> List[Tuple[int, int]]:
+        width = (HASH_SIZE * HASH_SIZE) // BANDS
+        mask = (1 << width) - 1
+        return [(band, (value >> (band * width)) & mask) for band in range(BANDS)]
+
+    def _index_canonical(self, key: str, value: int) -> None:
+        if self._bands is None:
+            return
+        for band_key in self._band_keys(value):
+            self._bands.setdefault(band_key, []).append(key)
+
+    def _build_bands(self) -> Dict[Tuple[int, int], List[str]]:
+        if self._bands is None:
+            self._bands = {}
+            for key, entry in self.images.items():
+                if entry["canonical"] == key:
+                    self._index_canonical(key, int(entry["hash"], 16))
+        return self._bands
+
+    def find_canonical(self, value: int) -> Tuple[Optional[str], int]:
+        bands = self._build_bands()
+        best, best_distance = None, self.max_distance + 1
+        seen = set()
+        for band_key in self._band_keys(value):
+            for candidate in bands.get(band_key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = hamming(value, int(self.images[candidate]["hash"], 16))
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        return best, best_distance
+
+    def add(self, channel_name: str, message_id: int, path: str, value: int) -> str:
+        """Register an image and return the key of its canonical representative."""
+
+        key = image_key(channel_name, message_id)
+        existing = self.images.get(key)
+        if existing:
+            return existing["canonical"]
+
+        canonical, _ = self.find_canonical(value)
+        if canonical is None:
+            canonical = key
+            self._index_canonical(key, value)
+
+        self.images[key] = {"hash": f"{value:016x}", "canonical": canonical, "path": path}
+        self._dirty += 1
+        if self._dirty >= INDEX_SAVE_EVERY:
+            self.save()
+        return canonical
+
+    def canonical(self, channel_name: str, message_id: int) -> Optional[Tuple[str, int]]:
+        entry = self.images.get(image_key(channel_name, message_id))
+        return parse_key(entry["canonical"]) if entry else None
+
+    def image_path(self, channel_name: str, message_id: int) -> Optional[str]:
+        entry = self.images.get(image_key(channel_name, message_id))
+        return entry.get("path") if entry else None
+
+    def groups(self) -> Dict[str, List[str]]:
+        """Canonical key -> every key (itself included) that maps to it."""
+
+        out: Dict[str, List[str]] = {}
+        for key, entry in self.images.items():
+            out.setdefault(entry["canonical"], []).append(key)
+        return out
+
+    def save(self) -> None:
+        # Merged with images other processes saved meanwhile; theirs become lookup candidates too
+        merged = update_json(self.path, lambda on_disk: {**on_disk, **self.images})
+        for key, entry in merged.items():
+            if key not in self.images:
+                self.images[key] = entry
+                if entry["canonical"] == key:
+                    self._index_canonical(key, int(entry["hash"], 16))
+        self._dirty = 0
+
+
+def backfill(base_path: str, max_distance: int = DEFAULT_MAX_DISTANCE) -> PHashIndex:
+    """Hash images already in the lake that the index has not seen yet."""
+
+    index = PHashIndex(phash_index_path(base_path), max_distance=max_distance)
+    images_dir = telegram_images_dir(base_path)
+    if not os.path.isdir(images_dir):
+        return index
+    for channel_name in sorted(os.listdir(images_dir)):
+        channel_dir = os.path.join(images_dir, channel_name)
+        if not os.path.isdir(channel_dir):
+            continue
+        for filename in sorted(os.listdir(channel_dir)):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in IMAGE_EXTENSIONS or not stem.isdigit():
+                continue
+            if image_key(channel_name, int(stem)) in index.images:
+                continue
+            path = os.path.join(channel_dir, filename)
+            try:
+                index.add(channel_name, int(stem), path, dhash(path))
+            except Exception as e:
+                print(f"⚠️ Could not hash {path}: {e}")
+    index.save()
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the perceptual-hash index for existing images")
+    parser.add_argument("--path", type=str, default="data")
+    parser.add_argument("--max-distance", type=distance_arg, default=DEFAULT_MAX_DISTANCE,
+                        help=f"Max dHash bit distance for two images to count as the same (0-{MAX_DISTANCE})")
+    args = parser.parse_args()
+    idx = backfill(args.path, args.max_distance)
+    groups = idx.groups()
+    print(f"✅ {len(idx)} images hashed into {len(groups)} distinct images")
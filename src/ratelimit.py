@@ -0,0 +1,86 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """Adaptive token-bucket limiter shared by every scraping coroutine.
+
+    Tokens refill continuously at ``rate`` per second up to ``burst``. A
+    FloodWait reported through :meth:`penalize` blocks all callers until the
+    wait has elapsed and cuts the rate in half; each successful acquire then
+    nudges the rate back towards ``max_rate`` (AIMD). A wait longer than
+    ``ceiling_wait`` seconds means the sustained rate itself is too high, so
+    it also lowers ``max_rate`` by ``ceiling_backoff``: recovery then levels
+    off below the rate that triggered it instead of flooding again.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = 1.0,
+        *,
+        min_rate: float = 0.05,
+        max_rate: Optional[float] = None,
+        recovery: float = 0.05,
+        ceiling_wait: float = 10.0,
+        ceiling_backoff: float = 0.75,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.min_rate = min(float(min_rate), self.rate)
+        self.max_rate = float(max_rate) if max_rate is not None else self.rate
+        self.recovery = recovery
+        self.ceiling_wait = ceiling_wait
+        self.ceiling_backoff = ceiling_backoff
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        self.acquired = 0
+        self.waited_seconds = 0.0
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(now - self._updated, 0.0)
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Wait until ``tokens`` are available and consume them."""
+
+        async with self._lock:
+            started = self._clock()
+            while True:
+                now = self._clock()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    break
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+            self.acquired += 1
+            self.waited_seconds += self._clock() - started
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.recovery)
+
+    def penalize(self, wait_seconds: float) -> None:
+        """Record a FloodWait: pause every caller and back the rate off."""
+
+        now = self._clock()
+        self._blocked_until = max(self._blocked_until, now + max(wait_seconds, 0.0))
+        self._tokens = 0.0
+        self._updated = self._blocked_until
+        self.rate = max(self.min_rate, self.rate / 2)
+        if wait_seconds > self.ceiling_wait:
+            self.max_rate = max(self.min_rate, self.max_rate * self.ceiling_backoff)
+        self.flood_waits += 1
+        self.flood_wait_seconds += max(wait_seconds, 0.0)
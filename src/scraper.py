@@ -9,12 +9,14 @@ import asyncio
 import argparse
 import logging
 import sys
+import time
 from pathlib import Path
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
 from dotenv import load_dotenv
 from telethon import TelegramClient
 from telethon.errors import FloodWaitError
+from telethon.sessions import StringSession
 from telethon.tl.types import MessageMediaPhoto
 
 # Add the project root to sys.path so we can import src.datalake
@@ -24,7 +26,26 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 # Import the datalake functions
-from src.datalake import write_channel_messages_json, write_manifest
+from src.datalake import (
+    PartitionWriter,
+    phash_index_path,
+    read_checkpoints,
+    update_checkpoint,
+    write_manifest,
+)
+from src.media import (
+    DEFAULT_DOWNLOAD_QUEUE_SIZE,
+    DEFAULT_DOWNLOAD_RETRIES,
+    DEFAULT_DOWNLOAD_TIMEOUT,
+    DEFAULT_DOWNLOAD_WORKERS,
+    DownloadJob,
+    MediaDownloadPool,
+    MediaIndex,
+)
+from src import metrics
+from src.image_store import DEFAULT_DERIVATIVE_SIZE, ImageStore
+from src.phash import DEFAULT_MAX_DISTANCE, MAX_DISTANCE, PHashIndex, distance_arg
+from src.ratelimit import TokenBucket
 
 # =============================================================================
 # CONFIGURATION
@@ -36,15 +57,25 @@ load_dotenv()
 api_id_str = os.getenv("TG_API_ID") or os.getenv("Tg_API_ID")
 api_hash = os.getenv("TG_API_HASH") or os.getenv("Tg_API_HASH")
 
-if not api_id_str or not api_hash:
-    print("ERROR: Missing TG_API_ID or TG_API_HASH in .env file")
-    sys.exit(1)
+SESSION_NAME = "telegram_scraper_session"
 
-api_id = int(api_id_str)
+# CHANNELS TO SCRAPE
+TARGET_CHANNELS = [
+    '@CheMed123',
+    '@lobelia4cosmetics',
+    '@tikvahpharma',
+    '@tenamereja',
+    '@DoctorsET' 
+]
 
 TODAY = datetime.today().strftime("%Y-%m-%d")
 DEFAULT_CHANNEL_DELAY = 3.0
 DEFAULT_MESSAGE_DELAY = 1.0
+DEFAULT_CONCURRENCY = 1
+DEFAULT_RATE = 1.0  # Telegram API requests per second across all channels
+DEFAULT_BURST = 5
+HISTORY_PAGE_SIZE = 100  # messages returned per GetHistory request by iter_messages
+PROGRESS_EVERY = HISTORY_PAGE_SIZE  # messages between durable progress checkpoints
 
 # =============================================================================
 # LOGGING SETUP
@@ -71,125 +102,403 @@ logger.addHandler(console_handler)
 # SCRAPING FUNCTIONS
 # =============================================================================
 
+def get_client(session: Optional[Any] = None) -> TelegramClient:
+    """Build a client from the .env credentials.
+
+    A ``TG_SESSION`` string session takes precedence over the on-disk
+    session file; use it when several processes scrape at once (e.g.
+    parallel Dagster partitions), as the SQLite session file is single-writer.
+    """
+    if not api_id_str or not api_hash:
+        raise RuntimeError("Missing TG_API_ID or TG_API_HASH in .env file")
+    if session is None and os.getenv("TG_SESSION"):
+        session = StringSession(os.getenv("TG_SESSION"))
+    return TelegramClient(session or SESSION_NAME, int(api_id_str), api_hash)
+
+
+def history_iter_kwargs(
+    limit: int,
+    checkpoint: Optional[Dict[str, Any]] = None,
+    since: Optional[datetime] = None,
+    full: bool = False,
+) -> Dict[str, Any]:
+    """Build the ``iter_messages`` arguments for a full, backfill or incremental run."""
+    if full:
+        return {"limit": limit}
+    if since is not None:
+        return {"limit": limit, "offset_date": since, "reverse": True}
+    if checkpoint and checkpoint.get("resume"):
+        # Finish the newest-first scrape a previous process didn't complete
+        resume = checkpoint["resume"]
+        return {"limit": resume.get("remaining"), "offset_id": int(resume["offset_id"])}
+    if checkpoint:
+        return {"limit": limit, "min_id": int(checkpoint["message_id"]), "reverse": True}
+    return {"limit": limit}
+
+
+def resume_iter_kwargs(iter_kwargs: Dict[str, Any], last_id: Optional[int], consumed: int) -> Dict[str, Any]:
+    """``iter_kwargs`` continued after message ``last_id``, with ``consumed`` messages already taken.
+
+    ``offset_id`` is exclusive in both directions (older than it by default,
+    newer than it with ``reverse``), so nothing is fetched twice.
+    """
+    if last_id is None:
+        return dict(iter_kwargs)
+    resumed = {key: value for key, value in iter_kwargs.items() if key != "offset_date"}
+    resumed["offset_id"] = last_id
+    if resumed.get("limit") is not None:
+        resumed["limit"] = max(resumed["limit"] - consumed, 0)
+    return resumed
+
+
+def describe_iter_kwargs(iter_kwargs: Dict[str, Any]) -> str:
+    parts = [f"{key}={value}" for key, value in iter_kwargs.items() if key != "reverse"]
+    return ", ".join(parts)
+
+
 async def scrape_channel(
     client: TelegramClient,
     channel: str,
-    writer: csv.writer,
+    writer: Optional[csv.writer],
     base_path: str,
     date_str: str,
-    limit: int = 100,
+    limit: Optional[int] = 100,
     message_delay: float = DEFAULT_MESSAGE_DELAY,
     channel_delay: float = DEFAULT_CHANNEL_DELAY,
     max_retries: int = 3,
+    limiter: Optional[TokenBucket] = None,
+    checkpoint: Optional[Dict[str, Any]] = None,
+    since: Optional[datetime] = None,
+    full: bool = False,
+    downloads: Optional[MediaDownloadPool] = None,
+    until: Optional[datetime] = None,
+    on_sealed: Optional[Callable[[str], None]] = None,
 ) -> int:
+    """Scrape one channel.
+
+    When a shared ``limiter`` is given, every Telegram request (entity lookup,
+    history page, media download) takes a token from it and the fixed
+    ``message_delay`` / ``channel_delay`` sleeps are skipped.
+
+    With a ``checkpoint`` only messages newer than its ``message_id`` are
+    fetched, oldest first, so a ``limit`` smaller than the backlog never
+    leaves a gap. ``since`` backfills from a date and ``full`` ignores the
+    checkpoint and fetches the newest ``limit`` messages. With ``since``,
+    ``until`` stops before the first message dated at or after it.
+
+    A FloodWait pauses and then resumes after the last message processed,
+    keeping everything fetched so far. Without a shared ``limiter`` the
+    first FloodWait switches the channel to a private adaptive one, since
+    the fixed delays evidently outpaced Telegram. Every ``PROGRESS_EVERY``
+    messages the partition is synced and the checkpoint advanced (with a
+    ``resume`` cursor for newest-first runs), so a killed process continues
+    where it stopped. Oldest-first runs leave another run's cursor alone,
+    and runs bounded by ``until`` never touch the checkpoint.
+
+    Photos are handed to the ``downloads`` pool instead of being fetched
+    inline; without one a private pool is used and drained before returning.
+    ``on_sealed`` is called with the partition path once it has been sealed.
+    """
     channel_name = channel.strip('@')
-    retries = 0
-    while True:
-        try:
-            entity = await client.get_entity(channel)
-            channel_title = entity.title
-            messages = []
-
-            # Image directory: data/raw/images/{channel_name}/
-            channel_image_dir = os.path.join(base_path, "raw", "images", channel_name)
-            os.makedirs(channel_image_dir, exist_ok=True)
-
-            logger.info(f"Starting scrape of {channel} (limit={limit})")
-
-            async for message in client.iter_messages(entity, limit=limit):
-                image_path: Optional[str] = None
-                has_media = message.media is not None
-
-                if has_media and isinstance(message.media, MessageMediaPhoto):
-                    filename = f"{message.id}.jpg"
-                    image_path = os.path.join(channel_image_dir, filename)
-                    # Only download if it doesn't exist already to save bandwidth
-                    if not os.path.exists(image_path):
-                        try:
-                            await client.download_media(message.media, image_path)
-                        except Exception as e:
-                            logger.warning(f"Failed to download image: {e}")
-                            image_path = None
-
-                message_dict = {
-                    "message_id": message.id,
-                    "channel_name": channel_name,
-                    "channel_title": channel_title,
-                    "message_date": message.date.isoformat(),
-                    "message_text": message.message or "",
-                    "has_media": has_media,
-                    "image_path": image_path,
-                    "views": message.views or 0,
-                    "forwards": message.forwards or 0,
-                }
-
-                writer.writerow([
-                    message_dict["message_id"],
-                    message_dict["channel_name"],
-                    message_dict["channel_title"],
-                    message_dict["message_date"],
-                    message_dict["message_text"],
-                    message_dict["has_media"],
-                    message_dict["image_path"],
-                    message_dict["views"],
-                    message_dict["forwards"],
-                ])
-
-                messages.append(message_dict)
-
-                if message_delay:
-                    await asyncio.sleep(message_delay)
+    iter_kwargs = history_iter_kwargs(limit, checkpoint=checkpoint, since=since, full=full)
+    if downloads is None:
+        own_pool = MediaDownloadPool(
+            client, MediaIndex(base_path), limiter=limiter,
+            phash=PHashIndex(phash_index_path(base_path)),
+            store=ImageStore.for_lake(base_path),
+        )
+        async with own_pool as own_downloads:
+            return await scrape_channel(
+                client, channel, writer, base_path, date_str, limit,
+                message_delay, channel_delay, max_retries, limiter=limiter,
+                checkpoint=checkpoint, since=since, full=full, downloads=own_downloads,
+                until=until, on_sealed=on_sealed,
+            )
 
-            write_channel_messages_json(
+    partition = PartitionWriter(
+        base_path=base_path,
+        date_str=date_str,
+        channel_name=channel_name,
+        append=not full,
+    )
+    saved = 0
+    consumed = 0  # messages taken from Telegram across FloodWait resumes
+    last_id: Optional[int] = None
+    newest: Optional[Dict[str, Any]] = None
+    entity = None
+    completed = False
+    retries = 0
+    progress_at_last_wait = -1
+    descending = not iter_kwargs.get("reverse", False)
+    initial_resume = (
+        {"offset_id": iter_kwargs["offset_id"], "remaining": iter_kwargs.get("limit")}
+        if "offset_id" in iter_kwargs else None
+    )
+    channel_image_dir = os.path.join(base_path, "raw", "images", channel_name)
+    started = time.perf_counter()
+
+    def resume_state() -> Optional[Dict[str, Any]]:
+        # Oldest-first runs resume from the high-water mark itself; only
+        # newest-first ones need to remember how far down they got
+        if completed or not descending:
+            return None
+        if last_id is None:
+            return initial_resume
+        remaining = iter_kwargs["limit"] - consumed if iter_kwargs.get("limit") is not None else None
+        return None if remaining == 0 else {"offset_id": last_id, "remaining": remaining}
+
+    def save_checkpoint() -> None:
+        # A bounded window (scrape_day) leaves gaps on both sides of it:
+        # moving the high-water mark past them would make min_id runs skip them
+        if until is not None:
+            return
+        mark = newest or (checkpoint if initial_resume else None)
+        if mark is not None:
+            update_checkpoint(
                 base_path=base_path,
-                date_str=date_str,
                 channel_name=channel_name,
-                messages=messages,
+                message_id=mark["message_id"],
+                message_date=mark["message_date"],
+                resume=resume_state(),
+                # Only newest-first runs own the resume cursor
+                keep_resume=not descending,
             )
 
-            logger.info(f"Finished scraping {channel}: {len(messages)} messages saved")
-            
-            if channel_delay:
-                await asyncio.sleep(channel_delay)
-            return len(messages)
-
-        except FloodWaitError as e:
-            wait_seconds = int(getattr(e, "seconds", 0) or 0)
-            wait_seconds = max(wait_seconds, 1)
-            logger.warning(f"FloodWaitError for {channel}: sleeping {wait_seconds}s")
-            await asyncio.sleep(wait_seconds)
-            retries += 1
-            if retries > max_retries:
-                logger.error(f"Too many retries for {channel}. Skipping.")
-                return 0
-        except Exception as e:
-            logger.error(f"Error scraping {channel}: {e}")
-            return 0
-
-async def scrape_all_channels(client, channels, base_path, limit, message_delay, channel_delay):
+    try:
+        while True:
+            try:
+                if entity is None:
+                    if limiter:
+                        await limiter.acquire()
+                    entity = await client.get_entity(channel)
+                    channel_title = entity.title
+                    # Image directory: data/raw/images/{channel_name}/
+                    os.makedirs(channel_image_dir, exist_ok=True)
+
+                kwargs = resume_iter_kwargs(iter_kwargs, last_id, consumed)
+                logger.info(f"{'Resuming' if last_id else 'Starting'} scrape of {channel} ({describe_iter_kwargs(kwargs)})")
+                fetched = 0
+
+                async for message in client.iter_messages(entity, **kwargs):
+                    if until is not None and message.date >= until:
+                        break
+                    if limiter and fetched % HISTORY_PAGE_SIZE == 0:
+                        await limiter.acquire()
+                    fetched += 1
+
+                    image_path: Optional[str] = None
+                    has_media = message.media is not None
+
+                    if has_media and isinstance(message.media, MessageMediaPhoto):
+                        filename = f"{message.id}.jpg"
+                        image_path = os.path.join(channel_image_dir, filename)
+                        # Downloads run in the pool; the index skips media we already have
+                        await downloads.submit(DownloadJob(channel_name, message.id, message.media, image_path))
+
+                    message_dict = {
+                        "message_id": message.id,
+                        "channel_name": channel_name,
+                        "channel_title": channel_title,
+                        "message_date": message.date.isoformat(),
+                        "message_text": message.message or "",
+                        "has_media": has_media,
+                        "image_path": image_path,
+                        "views": message.views or 0,
+                        "forwards": message.forwards or 0,
+                    }
+
+                    if partition.write(message_dict):
+                        saved += 1
+                        # Only rows new to the partition, so a resumed scrape never repeats one
+                        if writer is not None:
+                            writer.writerow([
+                                message_dict["message_id"],
+                                message_dict["channel_name"],
+                                message_dict["channel_title"],
+                                message_dict["message_date"],
+                                message_dict["message_text"],
+                                message_dict["has_media"],
+                                message_dict["image_path"],
+                                message_dict["views"],
+                                message_dict["forwards"],
+                            ])
+                    if newest is None or message_dict["message_id"] > newest["message_id"]:
+                        newest = message_dict
+                    last_id = message.id
+                    consumed += 1
+                    if consumed % PROGRESS_EVERY == 0:
+                        partition.sync()
+                        save_checkpoint()
+
+                    if message_delay and not limiter:
+                        await asyncio.sleep(message_delay)
+
+                completed = True
+                logger.info(f"Finished scraping {channel}: {saved} messages saved")
+
+                if channel_delay and not limiter:
+                    await asyncio.sleep(channel_delay)
+                return saved
+
+            except FloodWaitError as e:
+                wait_seconds = int(getattr(e, "seconds", 0) or 0)
+                wait_seconds = max(wait_seconds, 1)
+                logger.warning(
+                    f"FloodWaitError for {channel} after {consumed} messages: "
+                    f"sleeping {wait_seconds}s, then resuming after message {last_id}"
+                )
+                metrics.record_flood_wait("history", wait_seconds)
+                # Keep what we have durable while we wait
+                partition.sync()
+                save_checkpoint()
+                if limiter is None:
+                    limiter = TokenBucket(DEFAULT_RATE, DEFAULT_BURST)
+                # With a shared limiter this pauses every channel, not just this one
+                limiter.penalize(wait_seconds)
+                await limiter.acquire()
+                # Only consecutive waits without progress count towards giving up
+                retries = retries + 1 if consumed == progress_at_last_wait else 1
+                progress_at_last_wait = consumed
+                if retries > max_retries:
+                    logger.error(f"Too many retries for {channel} without progress. Skipping.")
+                    return saved
+            except Exception as e:
+                logger.error(f"Error scraping {channel}: {e}")
+                return saved
+    finally:
+        # Whatever was fetched before a failure is kept: seal it and advance the checkpoint
+        sealed = partition.seal()
+        metrics.record_stage("scrape", time.perf_counter() - started, messages=saved, bytes=sealed["bytes"])
+        save_checkpoint()
+        if on_sealed is not None:
+            on_sealed(sealed["path"])
+
+async def scrape_day(
+    client: TelegramClient,
+    channel: str,
+    day: date,
+    base_path: str = "data",
+    limiter: Optional[TokenBucket] = None,
+) -> int:
+    """Fetch every message ``channel`` posted on ``day`` (UTC) into that day's partition.
+
+    Backs the date x channel partitioned Dagster assets. The partition is
+    appended to and deduplicated on message_id, so re-running a day adds
+    what is missing and refreshes the rows already there. The channel's
+    checkpoint (and any pending resume cursor) is left to the incremental
+    CLI runs that own it. The private ``TokenBucket`` only paces this run:
+    concurrent runs must be limited by the caller (the pipeline's
+    ``telegram`` pool).
+    """
+    since = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    return await scrape_channel(
+        client, channel, None, base_path, day.isoformat(), limit=None,
+        limiter=limiter or TokenBucket(DEFAULT_RATE, DEFAULT_BURST),
+        since=since, until=since + timedelta(days=1),
+    )
+
+async def scrape_all_channels(
+    client,
+    channels,
+    base_path,
+    limit,
+    message_delay,
+    channel_delay,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    limiter: Optional[TokenBucket] = None,
+    since: Optional[datetime] = None,
+    full: bool = False,
+    downloads: Optional[MediaDownloadPool] = None,
+    write_csv: bool = False,
+    on_sealed: Optional[Callable[[str], None]] = None,
+):
+    """Scrape every channel and write the day's manifest.
+
+    Each channel resumes from its stored checkpoint unless ``full`` or
+    ``since`` asks for a backfill. ``write_csv`` also writes the flat
+    ``raw/csv/<date>/telegram_data.csv`` export. ``on_sealed`` is passed
+    on to every ``scrape_channel``.
+
+    With ``concurrency > 1`` channels are scraped in parallel under a
+    semaphore. Concurrent runs always pace themselves through one shared
+    ``TokenBucket`` (created with ``DEFAULT_RATE`` if none is passed) so the
+    total request rate stays within Telegram's limit.
+    """
     await client.start()
     logger.info(f"Client authenticated. Scraping {len(channels)} channels...")
+
+    if concurrency > 1 and limiter is None:
+        limiter = TokenBucket(DEFAULT_RATE, DEFAULT_BURST)
+    if downloads is None:
+        downloads = MediaDownloadPool(
+            client, MediaIndex(base_path), limiter=limiter,
+            phash=PHashIndex(phash_index_path(base_path)),
+            store=ImageStore.for_lake(base_path),
+        )
+    downloads.start()
     
-    csv_dir = os.path.join(base_path, "raw", "csv", TODAY)
-    os.makedirs(csv_dir, exist_ok=True)
-    
-    csv_file_path = os.path.join(csv_dir, "telegram_data.csv")
     stats = {}
-    
-    with open(csv_file_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['message_id', 'channel_name', 'channel_title', 'message_date', 
+    csv_file = None
+    writer = None
+    if write_csv:
+        # Legacy flat export of the day's rows; the lake partitions are the source of truth
+        csv_dir = os.path.join(base_path, "raw", "csv", TODAY)
+        os.makedirs(csv_dir, exist_ok=True)
+        csv_file = open(os.path.join(csv_dir, "telegram_data.csv"), 'w', newline='', encoding='utf-8')
+        writer = csv.writer(csv_file)
+        writer.writerow(['message_id', 'channel_name', 'channel_title', 'message_date',
                          'message_text', 'has_media', 'image_path', 'views', 'forwards'])
-        
+
+    try:
+        checkpoints = {} if full or since else read_checkpoints(base_path)
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def run_one(channel):
+            async with semaphore:
+                logger.info(f"Scraping {channel}...")
+                return await scrape_channel(
+                    client, channel, writer, base_path, TODAY, limit,
+                    message_delay, channel_delay, limiter=limiter,
+                    checkpoint=checkpoints.get(channel.strip("@")),
+                    since=since, full=full, downloads=downloads, on_sealed=on_sealed,
+                )
+
+        tasks = [asyncio.ensure_future(run_one(channel)) for channel in channels]
+        try:
+            counts = await asyncio.gather(*tasks)
+        finally:
+            # If a channel failed, stop the others (they seal what they have),
+            # then still drain the queued downloads and save the indexes
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await downloads.close()
+
         channel_counts = {}
-        for channel in channels:
-            logger.info(f"Scraping {channel}...")
-            count = await scrape_channel(client, channel, writer, base_path, TODAY, limit, message_delay, channel_delay)
+        for channel, count in zip(channels, counts):
             stats[channel] = count
             channel_counts[channel.strip("@")] = count
 
-        write_manifest(base_path=base_path, date_str=TODAY, channel_message_counts=channel_counts)
-    
+        extra: Dict[str, Any] = {
+            "checkpoints": read_checkpoints(base_path),
+            "media_downloads": downloads.stats_as_dict(),
+        }
+        if limiter:
+            extra.update({
+                "rate_limiter": {
+                    "requests": limiter.acquired,
+                    "waited_seconds": round(limiter.waited_seconds, 3),
+                    "flood_waits": limiter.flood_waits,
+                    "flood_wait_seconds": round(limiter.flood_wait_seconds, 1),
+                    "final_rate": round(limiter.rate, 3),
+                    "rate_ceiling": round(limiter.max_rate, 3),
+                }
+            })
+        write_manifest(base_path=base_path, date_str=TODAY, channel_message_counts=channel_counts, extra=extra)
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+
     return stats
 
 # =============================================================================
@@ -202,22 +511,70 @@ if __name__ == "__main__":
     parser.add_argument("--limit", type=int, default=100) # Default 100 messages
     parser.add_argument("--message-delay", type=float, default=DEFAULT_MESSAGE_DELAY)
     parser.add_argument("--channel-delay", type=float, default=DEFAULT_CHANNEL_DELAY)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Channels scraped in parallel (>1 enables the shared rate limiter)")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Global Telegram requests/second; replaces the fixed delays")
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST)
+    parser.add_argument("--download-workers", type=int, default=DEFAULT_DOWNLOAD_WORKERS)
+    parser.add_argument("--download-queue", type=int, default=DEFAULT_DOWNLOAD_QUEUE_SIZE)
+    parser.add_argument("--download-retries", type=int, default=DEFAULT_DOWNLOAD_RETRIES)
+    parser.add_argument("--download-timeout", type=float, default=DEFAULT_DOWNLOAD_TIMEOUT)
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Skip perceptual hashing of downloaded images")
+    parser.add_argument("--dedup-distance", type=distance_arg, default=DEFAULT_MAX_DISTANCE,
+                        help=f"Max dHash bit distance for two images to count as the same (0-{MAX_DISTANCE})")
+    parser.add_argument("--csv", action="store_true",
+                        help="Also write the flat raw/csv/<date>/telegram_data.csv export")
+    parser.add_argument("--no-image-store", action="store_true",
+                        help="Keep plain per-message files; skip the content-addressed store")
+    parser.add_argument("--derivative-size", type=int, default=DEFAULT_DERIVATIVE_SIZE,
+                        help="Longest side of the derivative built for the detector (its --imgsz)")
+    backfill = parser.add_mutually_exclusive_group()
+    backfill.add_argument("--full", action="store_true",
+                          help="Ignore checkpoints and fetch the newest --limit messages")
+    backfill.add_argument("--since", type=str, default=None,
+                          help="Backfill messages from this date (YYYY-MM-DD), ignoring checkpoints")
     args = parser.parse_args()
     
     # Initialize Client
-    client = TelegramClient("telegram_scraper_session", api_id, api_hash)
-    
-    # CHANNELS TO SCRAPE
-    target_channels = [
-        '@CheMed123',
-        '@lobelia4cosmetics',
-        '@tikvahpharma',
-        '@tenamereja',
-        '@DoctorsET' 
-    ]
-    
+    try:
+        client = get_client()
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    rate_limiter = None
+    if args.rate is not None or args.concurrency > 1:
+        rate_limiter = TokenBucket(args.rate or DEFAULT_RATE, args.burst)
+
+    since_date = None
+    if args.since:
+        since_date = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
     async def main():
         async with client:
-            await scrape_all_channels(client, target_channels, args.path, args.limit, args.message_delay, args.channel_delay)
+            download_pool = MediaDownloadPool(
+                client,
+                MediaIndex(args.path),
+                workers=args.download_workers,
+                queue_size=args.download_queue,
+                retries=args.download_retries,
+                timeout=args.download_timeout,
+                limiter=rate_limiter,
+                phash=None if args.no_dedup else PHashIndex(
+                    phash_index_path(args.path), max_distance=args.dedup_distance
+                ),
+                store=None if args.no_image_store else ImageStore.for_lake(
+                    args.path, [args.derivative_size]
+                ),
+            )
+            await scrape_all_channels(
+                client, TARGET_CHANNELS, args.path, args.limit,
+                args.message_delay, args.channel_delay,
+                concurrency=args.concurrency, limiter=rate_limiter,
+                since=since_date, full=args.full, downloads=download_pool,
+                write_csv=args.csv,
+            )
 
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,383 @@
+"""
+Overlapped scrape -> detect -> load pipeline.
+
+Instead of scraping everything, then running YOLO over the lake, then
+loading, each downloaded image is handed to the detector as soon as the
+download pool finishes it, and detections are upserted into
+``raw.yolo_results`` in micro-batches while scraping continues. Each
+channel's messages are loaded into ``raw.telegram_messages`` as soon as its
+partition is sealed, while the other channels are still being scraped.
+End-to-end time approaches the slowest stage rather than the sum of all
+stages.
+
+Every hand-off is a bounded queue: a slow detector fills its queue, which
+blocks the download workers, which fills the download queue, which blocks
+message iteration. Memory stays bounded whatever the relative speeds.
+
+    python src/streaming.py --limit 500 --concurrency 3
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import metrics
+from src.datalake import phash_index_path
+from src.image_store import ImageStore
+from src.detection_cache import DEFAULT_CACHE_PATH, DetectionCache, model_version
+from src.media import DownloadJob, MediaDownloadPool, MediaIndex
+from src.phash import PHashIndex, image_key
+from src.yolo_detect import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_DECODE_THREADS,
+    DEFAULT_IMGSZ,
+    DEFAULT_WEIGHTS,
+    DetectionEngine,
+    ImageJob,
+    load_model,
+)
+
+DEFAULT_DETECT_QUEUE_SIZE = 64
+DEFAULT_MAX_BATCH_WAIT = 0.5  # seconds a partial batch waits for more images
+
+
+@dataclass
+class StreamStats:
+    images: int = 0
+    inferred: int = 0
+    cached: int = 0
+    duplicates: int = 0
+    rows_written: int = 0
+    batches: int = 0
+    queue_high_water: int = 0
+    first_detection_at: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "images": self.images,
+            "inferred": self.inferred,
+            "cached": self.cached,
+            "duplicates": self.duplicates,
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+            "queue_high_water": self.queue_high_water,
+        }
+
+
+class StreamingDetector:
+    """Consume downloaded images from a bounded queue and detect them in micro-batches.
+
+    Use ``submit`` as the download pool's ``on_complete`` hook. A batch is
+    inferred once ``batch_size`` images are queued or ``max_batch_wait``
+    seconds pass, and its rows go straight to ``sink``, which is flushed
+    whenever the queue drains so rows never sit in memory while the
+    detector is idle.
+
+    All blocking work (model, SQLite cache, sink) runs on one dedicated
+    thread: the event loop keeps scraping, and the SQLite connection is
+    only ever used from the thread that opened it. Perceptual duplicates
+    of an image already detected in this run reuse its result, and images
+    in the ``store`` are read from their ``imgsz`` derivative.
+    """
+
+    def __init__(
+        self,
+        *,
+        sink: Optional[Any] = None,
+        model_factory: Callable[[], Any] = load_model,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        decode_threads: int = DEFAULT_DECODE_THREADS,
+        imgsz: int = DEFAULT_IMGSZ,
+        queue_size: int = DEFAULT_DETECT_QUEUE_SIZE,
+        max_batch_wait: float = DEFAULT_MAX_BATCH_WAIT,
+        cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+        phash: Optional[PHashIndex] = None,
+        store: Optional[ImageStore] = None,
+    ) -> None:
+        self.sink = sink
+        self.model_factory = model_factory
+        self.batch_size = max(batch_size, 1)
+        self.decode_threads = decode_threads
+        self.imgsz = imgsz
+        self.max_batch_wait = max_batch_wait
+        self.cache_path = cache_path
+        self.phash = phash
+        self.store = store
+        self.queue: "asyncio.Queue[Optional[DownloadJob]]" = asyncio.Queue(maxsize=max(queue_size, 1))
+        self.stats = StreamStats()
+        self.engine: Optional[DetectionEngine] = None
+        self.version: Optional[str] = None
+        self._cache: Optional[DetectionCache] = None
+        self._detected: Dict[str, Dict[str, Any]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detector")
+        self._task: Optional[asyncio.Task] = None
+        self.error: Optional[BaseException] = None
+        self._started = time.perf_counter()
+
+    async def __aenter__(self) -> "StreamingDetector":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _call(self, fn: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _setup(self) -> None:
+        model = self.model_factory()
+        self.version = model_version(model, self.imgsz)
+        self.engine = DetectionEngine(
+            model, batch_size=self.batch_size, decode_threads=self.decode_threads, imgsz=self.imgsz,
+        )
+        if self.cache_path:
+            self._cache = DetectionCache(self.cache_path)
+
+    async def start(self) -> None:
+        if self._task is None:
+            # Load the model up front so the first batch doesn't stall the queue
+            await self._call(self._setup)
+            self._started = time.perf_counter()
+            self._task = asyncio.create_task(self._consume())
+
+    async def submit(self, job: DownloadJob) -> None:
+        await self.queue.put(job)
+        self.stats.queue_high_water = max(self.stats.queue_high_water, self.queue.qsize())
+        metrics.set_queue_depth("detections", self.queue.qsize())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            await self.queue.put(None)
+            await self._task
+            self._task = None
+        await self._call(self._shutdown)
+        self._executor.shutdown(wait=True)
+        if self.error:
+            raise self.error
+
+    def _shutdown(self) -> None:
+        if self.engine is not None:
+            metrics.record_stage("detect", self.engine.seconds, images=self.engine.images)
+        if self.sink:
+            self.sink.flush()
+        if self._cache:
+            self._cache.close()
+            self._cache = None
+
+    async def _next_batch(self) -> Tuple[List[DownloadJob], bool]:
+        """Wait for one job, then gather more until the batch is full or the wait expires."""
+        first = await self.queue.get()
+        if first is None:
+            return [], True
+        batch, done = [first], False
+        deadline = time.perf_counter() + self.max_batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                job = self.queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(self.queue.get(), remaining)
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            if job is None:
+                done = True
+                break
+            batch.append(job)
+        return batch, done
+
+    async def _consume(self) -> None:
+        done = False
+        while not done:
+            batch, done = await self._next_batch()
+            metrics.set_queue_depth("detections", self.queue.qsize())
+            if not batch:
+                continue
+            try:
+                await self._call(self._process, batch, self.queue.empty() or done)
+            except Exception as e:
+                # Keep draining: a dead consumer would block the download workers forever
+                self.error = self.error or e
+                print(f"⚠️ Detection batch of {len(batch)} images failed: {e}")
+
+    def _process(self, batch: List[DownloadJob], idle: bool) -> None:
+        self.stats.batches += 1
+        self.stats.images += len(batch)
+        records: List[Dict[str, Any]] = []
+        to_infer: List[ImageJob] = []
+        for job in batch:
+            path = job.path
+            if self.store is not None:
+                path = self.store.derivative_for(job.channel_name, job.message_id, self.imgsz) or path
+            canonical = None
+            if self.phash is not None:
+                canonical = self.phash.canonical(job.channel_name, job.message_id)
+            reused = self._detected.get(image_key(*canonical)) if canonical else None
+            if reused is not None:
+                self.stats.duplicates += 1
+            elif self._cache:
+                reused = self._cache.lookup(path, self.version)
+                if reused is not None:
+                    self.stats.cached += 1
+            if reused is not None:
+                records.append({**reused, "channel_name": job.channel_name, "message_id": job.message_id})
+            else:
+                to_infer.append(ImageJob(job.channel_name, job.message_id, path))
+
+        paths = {(job.channel_name, job.message_id): job.path for job in to_infer}
+        inferred = list(self.engine.run(to_infer))
+        self.stats.inferred += len(inferred)
+        for record in inferred:
+            self._detected[image_key(record["channel_name"], record["message_id"])] = record
+        if self._cache and inferred:
+            self._cache.store(
+                [(paths[(r["channel_name"], r["message_id"])], r) for r in inferred], self.version
+            )
+        records.extend(inferred)
+
+        if self.sink:
+            for record in records:
+                self.sink.write({**record, "model_version": self.version})
+            if idle:
+                # Nothing else is waiting: push the partial micro-batch to Postgres now
+                self.sink.flush()
+            self.stats.rows_written = self.sink.rows
+        if records and self.stats.first_detection_at is None:
+            self.stats.first_detection_at = time.perf_counter() - self._started
+
+
+async def run_streaming(
+    client: Any,
+    channels: List[str],
+    base_path: str = "data",
+    limit: int = 100,
+    *,
+    concurrency: int = 1,
+    limiter: Optional[Any] = None,
+    detector: StreamingDetector,
+    download_workers: int = 4,
+    download_queue: int = 100,
+    dedup: bool = True,
+) -> Dict[str, Any]:
+    """Scrape ``channels`` with detection (and its Postgres upserts) running alongside.
+
+    Each partition is loaded into ``raw.telegram_messages`` in a worker
+    thread as soon as its channel's scrape seals it, recording the same load
+    ledger as the batch pipeline. A final ``load_raw_data`` pass picks up any
+    partition whose early load failed.
+    """
+    from src.loader import connect_db, load_partition_file, load_raw_data
+    from src.scraper import DEFAULT_CHANNEL_DELAY, DEFAULT_MESSAGE_DELAY, scrape_all_channels
+
+    started = time.perf_counter()
+    engine = connect_db()
+    loads: List[asyncio.Task] = []
+    loaded_rows = 0
+
+    async def load_sealed(path: str) -> None:
+        nonlocal loaded_rows
+        try:
+            loaded_rows += await asyncio.to_thread(load_partition_file, path, base_path, engine)
+        except Exception as e:
+            print(f"⚠️ Could not load {path} yet: {e}")
+
+    def on_sealed(path: str) -> None:
+        loads.append(asyncio.get_running_loop().create_task(load_sealed(path)))
+
+    phash = PHashIndex(phash_index_path(base_path)) if dedup else None
+    detector.phash = phash
+    store = ImageStore.for_lake(base_path, [detector.imgsz])
+    detector.store = store
+    await detector.start()
+    try:
+        downloads = MediaDownloadPool(
+            client,
+            MediaIndex(base_path),
+            workers=download_workers,
+            queue_size=download_queue,
+            limiter=limiter,
+            phash=phash,
+            store=store,
+            on_complete=detector.submit,
+        )
+        counts = await scrape_all_channels(
+            client, channels, base_path, limit, DEFAULT_MESSAGE_DELAY, DEFAULT_CHANNEL_DELAY,
+            concurrency=concurrency, limiter=limiter, downloads=downloads, on_sealed=on_sealed,
+        )
+        scraped_at = time.perf_counter() - started
+    finally:
+        # Even if scraping failed: detect what was queued, flush the sink and
+        # cache, and let the partition loads already started finish
+        try:
+            await detector.close()
+        finally:
+            await asyncio.gather(*loads)
+    detected_at = time.perf_counter() - started
+
+    await asyncio.to_thread(load_raw_data, base_path)
+    return {
+        "messages": counts,
+        "loaded_rows": loaded_rows,
+        "detections": detector.stats.as_dict(),
+        "scrape_seconds": round(scraped_at, 2),
+        "detect_done_seconds": round(detected_at, 2),
+        "first_detection_seconds": round(detector.stats.first_detection_at or 0.0, 2),
+        "total_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+if __name__ == "__main__":
+    from src.detection_sink import PostgresDetectionSink
+    from src.ratelimit import TokenBucket
+    from src.scraper import DEFAULT_BURST, DEFAULT_RATE, TARGET_CHANNELS, get_client
+
+    parser = argparse.ArgumentParser(description="Scrape, detect and load with the stages overlapped")
+    parser.add_argument("--path", type=str, default="data")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE)
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ)
+    parser.add_argument("--weights", type=str, default=DEFAULT_WEIGHTS)
+    parser.add_argument("--detect-queue", type=int, default=DEFAULT_DETECT_QUEUE_SIZE,
+                        help="Downloaded images waiting for the detector before downloads block")
+    parser.add_argument("--max-batch-wait", type=float, default=DEFAULT_MAX_BATCH_WAIT)
+    parser.add_argument("--sink-batch-size", type=int, default=200,
+                        help="Detections per Postgres micro-batch")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--no-dedup", action="store_true")
+    args = parser.parse_args()
+
+    async def main():
+        with PostgresDetectionSink(batch_size=args.sink_batch_size) as sink:
+            detector = StreamingDetector(
+                sink=sink,
+                model_factory=lambda: load_model(args.weights),
+                batch_size=args.batch_size,
+                imgsz=args.imgsz,
+                queue_size=args.detect_queue,
+                max_batch_wait=args.max_batch_wait,
+                cache_path=None if args.no_cache else DEFAULT_CACHE_PATH,
+            )
+            async with get_client() as client:
+                return await run_streaming(
+                    client, TARGET_CHANNELS, args.path, args.limit,
+                    concurrency=args.concurrency,
+                    limiter=TokenBucket(args.rate, args.burst),
+                    detector=detector,
+                    dedup=not args.no_dedup,
+                )
+
+    summary = asyncio.run(main())
+    d = summary["detections"]
+    print(f"🌊 Scrape finished at {summary['scrape_seconds']}s, detection at "
+          f"{summary['detect_done_seconds']}s (first rows after {summary['first_detection_seconds']}s)")
+    print(f"✅ {d['images']} images: {d['inferred']} inferred, {d['cached']} cached, "
+          f"{d['duplicates']} duplicates; {d['rows_written']} rows upserted in {summary['total_seconds']}s")
@@ -1,19 +1,58 @@
 import os
-import pandas as pd
-from ultralytics import YOLO
+import sys
+import time
+import argparse
+import functools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
 import cv2
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
 
-# Load the model
-model = YOLO('yolov8n.pt')
+from src import metrics
+from src.detection_cache import DEFAULT_CACHE_PATH, DetectionCache, model_version
+from src.image_store import ImageStore
+from src.phash import PHashIndex
 
-def get_category(results):
-    if not results or len(results[0].boxes) == 0:
+IMAGE_BASE_DIR = 'data/raw/images'
+PHASH_INDEX_FILENAME = '_phash_index.json'
+RESULTS_CSV = 'data/yolo_results.csv'
+DEFAULT_WEIGHTS = 'yolov8n.pt'
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_DECODE_THREADS = 4
+DEFAULT_IMGSZ = 640
+DEFAULT_WORKERS = 1
+SHARDS_PER_WORKER = 4
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+PRODUCT_CLASSES = ['bottle', 'cup', 'bowl', 'vase', 'toothbrush']
+LETTERBOX_COLOR = (114, 114, 114)
+
+_model = None
+
+def load_model(weights: str = DEFAULT_WEIGHTS):
+    """Load the YOLO model once per process, on first use."""
+    global _model
+    if _model is None:
+        from ultralytics import YOLO
+        _model = YOLO(weights)
+    return _model
+
+def get_category(labels: List[str]) -> str:
+    if not labels:
         return "other"
-    
-    labels = [model.names[int(c)] for c in results[0].boxes.cls]
+
     has_person = 'person' in labels
-    has_product = any(x in ['bottle', 'cup', 'bowl', 'vase', 'toothbrush'] for x in labels)
-    
+    has_product = any(x in PRODUCT_CLASSES for x in labels)
+
     if has_person and has_product:
         return "promotional"
     elif has_product:
@@ -22,56 +61,518 @@ def get_category(results):
         return "lifestyle"
     return "other"
 
-def run_detection():
-    image_base_dir = 'data/raw/images'
-    results_list = []
+@dataclass
+class ImageJob:
+    channel_name: str
+    message_id: int
+    path: str
+
+def discover_images(image_base_dir: str = IMAGE_BASE_DIR) -> List[ImageJob]:
+    """List every non-empty image under <image_base_dir>/<channel>/<message_id>.jpg."""
+    jobs = []
+    for channel in sorted(os.listdir(image_base_dir)):
+        channel_path = os.path.join(image_base_dir, channel)
+        if channel.startswith('_') or not os.path.isdir(channel_path):
+            continue
+
+        for img_file in sorted(os.listdir(channel_path)):
+            if not img_file.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            img_path = os.path.join(channel_path, img_file)
+
+            # --- FIX: Check if file is empty or missing ---
+            if not os.path.isfile(img_path) or os.path.getsize(img_path) == 0:
+                print(f"⚠️ Skipping empty or missing file: {img_path}")
+                continue
+
+            try:
+                message_id = int(os.path.splitext(img_file)[0])
+            except ValueError:
+                continue
+            jobs.append(ImageJob(channel, message_id, img_path))
+    return jobs
+
+def record_jobs(records: Iterable[Dict[str, Any]]) -> List[ImageJob]:
+    """Jobs for the downloaded images of lake message records, e.g. one partition's."""
+    jobs = []
+    for record in records:
+        img_path = record.get("image_path")
+        if not img_path:
+            continue
+        if not os.path.isfile(img_path) or os.path.getsize(img_path) == 0:
+            print(f"⚠️ Skipping empty or missing file: {img_path}")
+            continue
+        jobs.append(ImageJob(record["channel_name"], int(record["message_id"]), img_path))
+    return jobs
+
+def use_derivatives(jobs: List[ImageJob], image_base_dir: str, imgsz: int) -> List[ImageJob]:
+    """Point jobs at the image store's ``imgsz`` derivative wherever one was built.
+
+    The derivative is already at the model input size, so decoding it is a
+    fraction of the work and letterboxing only pads. Its path is content
+    addressed, which also lets reposted images share one cache entry.
+    """
+    store = ImageStore.open_existing(image_base_dir)
+    if store is None:
+        return jobs
+    swapped = []
+    for job in jobs:
+        derivative = store.derivative_for(job.channel_name, job.message_id, imgsz)
+        swapped.append(ImageJob(job.channel_name, job.message_id, derivative) if derivative else job)
+    hits = sum(1 for new, old in zip(swapped, jobs) if new is not old)
+    if hits:
+        print(f"🗜️ Reading {hits}/{len(jobs)} images from {imgsz}px derivatives")
+    return swapped
+
+def canonical_job(
+    index: PHashIndex, canonical: Tuple[str, int], image_base_dir: str
+) -> Optional[ImageJob]:
+    """Job for a canonical image outside the run, if its file is still on disk."""
+    channel_name, message_id = canonical
+    indexed = index.image_path(channel_name, message_id)
+    candidates = [indexed] if indexed else []
+    if indexed and image_base_dir:
+        # The index may hold a path relative to another working directory
+        candidates.append(os.path.join(image_base_dir, channel_name, os.path.basename(indexed)))
+    for img_path in candidates:
+        if os.path.isfile(img_path) and os.path.getsize(img_path) > 0:
+            return ImageJob(channel_name, message_id, img_path)
+    return None
+
+def group_duplicates(
+    jobs: List[ImageJob], index: Optional[PHashIndex], image_base_dir: str = IMAGE_BASE_DIR
+) -> Tuple[List[ImageJob], Dict[Tuple[str, int], List[ImageJob]]]:
+    """Collapse perceptual duplicates to one representative job per group.
+
+    Returns the representatives and, for each representative's
+    (channel_name, message_id), every job whose result it stands for.
+    A canonical outside ``jobs`` (a repost of another channel's or day's
+    image) still represents its group, so its cached detections are reused
+    or it is inferred once; it is not a member itself. Images the index
+    hasn't seen, or whose canonical file is gone, form their own group.
+    """
+    if index is None:
+        return jobs, {(job.channel_name, job.message_id): [job] for job in jobs}
+
+    by_key = {(job.channel_name, job.message_id): job for job in jobs}
+    groups: Dict[Tuple[str, int], List[ImageJob]] = {}
+    for job in jobs:
+        key = (job.channel_name, job.message_id)
+        canonical = index.canonical(*key)
+        if canonical is not None and canonical not in by_key:
+            outside = canonical_job(index, canonical, image_base_dir)
+            if outside is not None:
+                by_key[canonical] = outside
+            else:
+                canonical = None
+        groups.setdefault(canonical or key, []).append(job)
+    representatives = [by_key[key] for key in groups]
+    return representatives, groups
+
+def fan_out(record: Dict[str, Any], members: List[ImageJob]) -> List[Dict[str, Any]]:
+    return [
+        {**record, "channel_name": job.channel_name, "message_id": job.message_id}
+        for job in members
+    ]
+
+def letterbox(img: np.ndarray, size: int) -> np.ndarray:
+    """Resize keeping the aspect ratio and pad to a size x size square."""
+    height, width = img.shape[:2]
+    scale = size / max(height, width)
+    new_w, new_h = max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)
+    if (new_w, new_h) != (width, height):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    top = (size - new_h) // 2
+    left = (size - new_w) // 2
+    return cv2.copyMakeBorder(
+        img, top, size - new_h - top, left, size - new_w - left,
+        cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR,
+    )
+
+def decode_image(path: str, imgsz: int) -> np.ndarray:
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("could not decode image")
+    return letterbox(img, imgsz)
+
+def detection_record(job: ImageJob, result: Any, names: Dict[int, str]) -> Dict[str, Any]:
+    detected_items = [names[int(c)] for c in result.boxes.cls]
+    conf = result.boxes.conf.tolist()[0] if len(result.boxes.conf) > 0 else 0
+    return {
+        "message_id": job.message_id,
+        "channel_name": job.channel_name,
+        "detected_class": ", ".join(detected_items),
+        "confidence_score": conf,
+        "image_category": get_category(detected_items),
+    }
+
+class DetectionEngine:
+    """Batched YOLO inference fed by a thread pool of image decoders.
+
+    Images are decoded and letterboxed to ``imgsz`` on ``decode_threads``
+    threads (OpenCV releases the GIL) while the model runs on the previous
+    batch. At most a few batches are decoded ahead, so memory stays bounded
+    no matter how many images are queued. Results are yielded per batch.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        decode_threads: int = DEFAULT_DECODE_THREADS,
+        imgsz: int = DEFAULT_IMGSZ,
+        prefetch_batches: int = 2,
+    ) -> None:
+        self.model = model
+        self.batch_size = max(batch_size, 1)
+        self.decode_threads = max(decode_threads, 1)
+        self.imgsz = imgsz
+        self.prefetch = self.batch_size * max(prefetch_batches, 1)
+        self.images = 0
+        self.failures = 0
+        self.seconds = 0.0
+
+    @property
+    def images_per_second(self) -> float:
+        return self.images / self.seconds if self.seconds else 0.0
 
+    def run(self, jobs: Iterable[ImageJob]) -> Iterator[Dict[str, Any]]:
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.decode_threads) as pool:
+                pending: deque = deque()
+                batch: List[tuple] = []
+                job_iter = iter(jobs)
+
+                def fill() -> None:
+                    while len(pending) < self.prefetch:
+                        job = next(job_iter, None)
+                        if job is None:
+                            return
+                        pending.append((job, pool.submit(decode_image, job.path, self.imgsz)))
+
+                fill()
+                while pending:
+                    job, future = pending.popleft()
+                    fill()
+                    try:
+                        batch.append((job, future.result()))
+                    except Exception as e:
+                        self.failures += 1
+                        print(f"⚠️ Error processing {job.path}: {e}")
+                        continue
+                    if len(batch) >= self.batch_size:
+                        yield from self._infer(batch)
+                        batch = []
+                if batch:
+                    yield from self._infer(batch)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+    def _infer(self, batch: List[tuple]) -> Iterator[Dict[str, Any]]:
+        try:
+            results = self.model([img for _, img in batch], imgsz=self.imgsz, verbose=False)
+            pairs = list(zip((job for job, _ in batch), results))
+        except Exception as e:
+            # Isolate the bad image instead of losing the whole batch
+            print(f"⚠️ Batch inference failed ({e}); retrying images one by one")
+            pairs = []
+            for job, img in batch:
+                try:
+                    pairs.append((job, self.model(img, imgsz=self.imgsz, verbose=False)[0]))
+                except Exception as e:
+                    self.failures += 1
+                    print(f"⚠️ Error processing {job.path}: {e}")
+
+        for job, result in pairs:
+            self.images += 1
+            yield detection_record(job, result, self.model.names)
+
+# --- Multi-process sharding -------------------------------------------------
+
+_worker_factory: Optional[Callable[[], Any]] = None
+_worker_model = None
+_worker_engine_kwargs: Dict[str, Any] = {}
+
+def _pin_threads(threads: int) -> None:
+    """Cap BLAS/OpenMP/torch threads so N workers don't oversubscribe the CPU."""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+def _init_worker(model_factory: Callable[[], Any], threads: int, engine_kwargs: Dict[str, Any]) -> None:
+    global _worker_factory, _worker_engine_kwargs
+    _pin_threads(threads)
+    _worker_factory = model_factory
+    _worker_engine_kwargs = engine_kwargs
+
+def _detect_shard(shard: List[ImageJob]) -> Tuple[List[Dict[str, Any]], int, int]:
+    global _worker_model
+    if _worker_model is None:
+        # Loaded on the worker's first task, then reused for every later shard
+        _worker_model = _worker_factory()
+    engine = DetectionEngine(_worker_model, **_worker_engine_kwargs)
+    records = list(engine.run(shard))
+    return records, engine.images, engine.failures
+
+def shard_jobs(jobs: List[ImageJob], shards: int) -> List[List[ImageJob]]:
+    """Split jobs into contiguous, evenly sized shards (order preserved)."""
+    shards = max(min(shards, len(jobs)), 1)
+    size, extra = divmod(len(jobs), shards)
+    out, start = [], 0
+    for i in range(shards):
+        end = start + size + (1 if i < extra else 0)
+        out.append(jobs[start:end])
+        start = end
+    return [shard for shard in out if shard]
+
+class ShardedDetector:
+    """Run ``DetectionEngine`` in a process pool, one model per worker.
+
+    The job list is cut into ``workers * SHARDS_PER_WORKER`` contiguous shards
+    so slow shards don't leave cores idle. Each worker pins its math libraries
+    to ``cpu_count // workers`` threads. Shard results are yielded in
+    submission order, so the merged output is deterministic.
+    """
+
+    def __init__(
+        self,
+        model_factory: Callable[[], Any],
+        workers: int,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        decode_threads: int = DEFAULT_DECODE_THREADS,
+        imgsz: int = DEFAULT_IMGSZ,
+    ) -> None:
+        self.model_factory = model_factory
+        self.workers = max(workers, 1)
+        self.threads = max((os.cpu_count() or 1) // self.workers, 1)
+        self.batch_size = max(batch_size, 1)
+        self.decode_threads = max(min(decode_threads, self.threads), 1)
+        self.imgsz = imgsz
+        self.images = 0
+        self.failures = 0
+        self.seconds = 0.0
+
+    @property
+    def images_per_second(self) -> float:
+        return self.images / self.seconds if self.seconds else 0.0
+
+    def run(self, jobs: Iterable[ImageJob]) -> Iterator[Dict[str, Any]]:
+        jobs = list(jobs)
+        if not jobs:
+            return
+        engine_kwargs = {
+            "batch_size": self.batch_size,
+            "decode_threads": self.decode_threads,
+            "imgsz": self.imgsz,
+        }
+        started = time.perf_counter()
+        try:
+            # spawn: forking a parent that already holds torch/OpenMP threads is unsafe
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_factory, self.threads, engine_kwargs),
+            ) as pool:
+                shards = shard_jobs(jobs, self.workers * SHARDS_PER_WORKER)
+                for records, images, failures in pool.map(_detect_shard, shards):
+                    self.images += images
+                    self.failures += failures
+                    yield from records
+        finally:
+            self.seconds += time.perf_counter() - started
+
+def run_detection(
+    image_base_dir: str = IMAGE_BASE_DIR,
+    output_csv: Optional[str] = RESULTS_CSV,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    decode_threads: int = DEFAULT_DECODE_THREADS,
+    imgsz: int = DEFAULT_IMGSZ,
+    model: Optional[Any] = None,
+    cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+    workers: int = DEFAULT_WORKERS,
+    weights: str = DEFAULT_WEIGHTS,
+    model_factory: Optional[Callable[[], Any]] = None,
+    dedup: bool = True,
+    sink: Optional[Any] = None,
+    sink_cached: bool = True,
+    jobs: Optional[List[ImageJob]] = None,
+    derivatives: bool = True,
+):
+    """Detect objects in every lake image, inferring only new or changed files.
+
+    Detections are cached per (image path, size/mtime, model version), so a
+    daily run only pays for images downloaded since the last one. Changing
+    the weights or ``imgsz`` changes the version and invalidates the cache.
+    ``cache_path=None`` disables the cache.
+
+    With ``workers > 1`` the images are sharded over a process pool. Workers
+    build their own model from ``model_factory`` (a picklable callable;
+    defaults to loading ``weights``), so the parent never loads it.
+
+    ``jobs`` restricts the run to those images (e.g. one date x channel
+    partition's, from ``record_jobs``) instead of listing every image under
+    ``image_base_dir``. With ``derivatives`` (the default),
+    images in the content-addressed store are read from their ``imgsz``
+    derivative instead of the full-resolution original.
+
+    With a ``sink``, cache hits are written too (unless ``sink_cached`` is
+    False), so every image in the run has a current-version row. Rows from
+    older model versions are then pruned for those messages, as the cache is.
+    """
     if not os.path.exists(image_base_dir):
         print(f"❌ Error: Image directory {image_base_dir} not found!")
         return
 
     print("🚀 Starting YOLO detection...")
 
-    for channel in os.listdir(image_base_dir):
-        channel_path = os.path.join(image_base_dir, channel)
-        if not os.path.isdir(channel_path):
-            continue
+    default_factory = model_factory is None
+    if default_factory:
+        model_factory = functools.partial(load_model, weights)
+    if workers > 1:
+        # Versioned from the weights file (or the factory) without loading a model here
+        version = model_version(weights if default_factory else model_factory, imgsz)
+    else:
+        model = model if model is not None else model_factory()
+        version = model_version(model, imgsz)
+    if jobs is None:
+        jobs = discover_images(image_base_dir)
 
-        for img_file in os.listdir(channel_path):
-            if img_file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                img_path = os.path.join(channel_path, img_file)
-                
-                # --- FIX: Check if file is empty or missing ---
-                if not os.path.isfile(img_path) or os.path.getsize(img_path) == 0:
-                    print(f"⚠️ Skipping empty or missing file: {img_path}")
-                    continue
+    phash_path = os.path.join(image_base_dir, PHASH_INDEX_FILENAME)
+    phash_index = PHashIndex(phash_path) if dedup and os.path.exists(phash_path) else None
+    representatives, groups = group_duplicates(jobs, phash_index, image_base_dir)
+    if len(representatives) < len(jobs):
+        print(f"🧬 {len(jobs)} images collapse to {len(representatives)} distinct images")
+    if derivatives:
+        representatives = use_derivatives(representatives, image_base_dir, imgsz)
 
-                try:
-                    message_id = int(os.path.splitext(img_file)[0])
-                    
-                    # Run inference with a try-except block to catch OpenCV errors
-                    results = model(img_path, verbose=False)
-                    
-                    category = get_category(results)
-                    conf = results[0].boxes.conf.tolist()[0] if len(results[0].boxes.conf) > 0 else 0
-                    detected_items = [model.names[int(c)] for c in results[0].boxes.cls]
-
-                    results_list.append({
-                        "message_id": message_id,
-                        "channel_name": channel,
-                        "detected_class": ", ".join(detected_items),
-                        "confidence_score": conf,
-                        "image_category": category
-                    })
-                except Exception as e:
-                    print(f"⚠️ Error processing {img_path}: {e}")
-                    continue
+    cache = DetectionCache(cache_path) if cache_path else None
+    try:
+        results_list = []
+        misses = []
+        for job in representatives:
+            cached = cache.lookup(job.path, version) if cache else None
+            if cached is None:
+                misses.append(job)
+            else:
+                records = fan_out(cached, groups[(job.channel_name, job.message_id)])
+                results_list.extend(records)
+                if sink and sink_cached:
+                    for member in records:
+                        sink.write({**member, "model_version": version})
+        print(f"🗂️ {len(representatives)} images: {len(representatives) - len(misses)} cached, "
+              f"{len(misses)} to infer ({version})")
+
+        if workers > 1:
+            engine = ShardedDetector(
+                model_factory,
+                workers,
+                batch_size=batch_size,
+                decode_threads=decode_threads,
+                imgsz=imgsz,
+            )
+        else:
+            engine = DetectionEngine(
+                model,
+                batch_size=batch_size,
+                decode_threads=decode_threads,
+                imgsz=imgsz,
+            )
+        paths = {(job.channel_name, job.message_id): job.path for job in misses}
+        batch = []
+        for record in engine.run(misses):
+            key = (record["channel_name"], record["message_id"])
+            records = fan_out(record, groups[key])
+            results_list.extend(records)
+            if sink:
+                for member in records:
+                    sink.write({**member, "model_version": version})
+            batch.append((paths[key], record))
+            if cache and len(batch) >= engine.batch_size:
+                cache.store(batch, version)
+                batch = []
+        if cache:
+            cache.store(batch, version)
+            pruned = cache.prune(version)
+            if pruned:
+                print(f"🧹 Dropped {pruned} cached detections from older model versions")
+        if sink:
+            sink.flush()
+            if sink_cached:
+                superseded = sink.prune(version)
+                if superseded:
+                    print(f"🧹 Deleted {superseded} detections from older model versions in {sink.table}")
+    finally:
+        if cache:
+            cache.close()
+
+    metrics.record_stage("detect", engine.seconds, images=engine.images)
+    print(
+        f"⚡ {engine.images} images in {engine.seconds:.1f}s "
+        f"({engine.images_per_second:.1f} img/s, batch={engine.batch_size}, "
+        f"decode_threads={engine.decode_threads}, imgsz={engine.imgsz}, workers={workers})"
+    )
 
-    # Save to CSV
-    os.makedirs('data', exist_ok=True)
+    results_list.sort(key=lambda r: (r["channel_name"], r["message_id"]))
     df = pd.DataFrame(results_list)
-    df.to_csv('data/yolo_results.csv', index=False)
-    print(f"✅ Detection complete! Saved {len(df)} results to data/yolo_results.csv")
+    df["model_version"] = version
+    if sink:
+        print(f"🐘 Streamed {sink.rows} detections to {sink.table}")
+
+    # Optional CSV export
+    if output_csv:
+        os.makedirs(os.path.dirname(output_csv) or '.', exist_ok=True)
+        df.to_csv(output_csv, index=False)
+        print(f"✅ Detection complete! Saved {len(df)} results to {output_csv}")
+    return df
 
 if __name__ == "__main__":
-    run_detection()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=str, default=IMAGE_BASE_DIR)
+    parser.add_argument("--output", type=str, default=RESULTS_CSV)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--decode-threads", type=int, default=DEFAULT_DECODE_THREADS)
+    parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Processes to shard inference across (one model each)")
+    parser.add_argument("--weights", type=str, default=DEFAULT_WEIGHTS)
+    parser.add_argument("--cache", type=str, default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--no-cache", action="store_true", help="Re-run inference on every image")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Infer every image even if it is a perceptual duplicate")
+    parser.add_argument("--to-postgres", action="store_true",
+                        help="Stream detections into raw.yolo_results as they are produced")
+    parser.add_argument("--sink-cached", action=argparse.BooleanOptionalAction, default=True,
+                        help="With --to-postgres, also upsert detections served from the cache (default)")
+    parser.add_argument("--no-csv", action="store_true", help="Skip the CSV export")
+    parser.add_argument("--originals", action="store_true",
+                        help="Decode full-resolution originals even where a derivative exists")
+    args = parser.parse_args()
+
+    detection_sink = None
+    if args.to_postgres:
+        from src.detection_sink import PostgresDetectionSink
+        detection_sink = PostgresDetectionSink()
+
+    run_detection(
+        image_base_dir=args.images,
+        output_csv=None if args.no_csv else args.output,
+        batch_size=args.batch_size,
+        decode_threads=args.decode_threads,
+        imgsz=args.imgsz,
+        cache_path=None if args.no_cache else args.cache,
+        workers=args.workers,
+        weights=args.weights,
+        dedup=not args.no_dedup,
+        sink=detection_sink,
+        sink_cached=args.sink_cached,
+        derivatives=not args.originals,
+    )
+    if detection_sink is not None:
+        detection_sink.close()
@@ -0,0 +1,64 @@
+import asyncio
+import json
+from typing import List
+
+import pytest
+from fastapi.exceptions import ResponseValidationError
+from starlette.requests import Request
+
+from api import schemas
+from api.cache import ResponseCache, etag_matches
+
+
+class NoVersionTable:
+    """AsyncSession stand-in whose raw.data_version does not exist yet."""
+
+    async def execute(self, *args, **kwargs):
+        raise RuntimeError("relation raw.data_version does not exist")
+
+    async def rollback(self):
+        return None
+
+
+def request(path="/api/reports/visual-content", headers=()):
+    return Request({
+        "type": "http", "method": "GET", "path": path, "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+    })
+
+
+def test_etag_matching_is_exact_over_the_list():
+    etag = '"0123456789abcdef0123"'
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"0123456789abcdef0123456"', etag)
+    assert not etag_matches('"x0123456789abcdef0123"', etag)
+    assert not etag_matches("", etag)
+
+
+def test_bodies_are_validated_and_filtered_through_the_response_model():
+    cache = ResponseCache()
+
+    async def produce():
+        return [{"image_category": "promotional", "count": 3, "internal": "dropped"}]
+
+    response = asyncio.run(cache.respond(request(), NoVersionTable(), produce, List[schemas.VisualStat]))
+    assert json.loads(response.body) == [{"image_category": "promotional", "count": 3}]
+
+    etag = response.headers["etag"]
+    revalidated = asyncio.run(cache.respond(
+        request(headers=[("If-None-Match", f"W/{etag}")]), NoVersionTable(), produce, List[schemas.VisualStat]
+    ))
+    assert revalidated.status_code == 304
+
+
+def test_invalid_bodies_are_never_cached():
+    cache = ResponseCache()
+
+    async def produce():
+        return [{"image_category": None, "count": "many"}]
+
+    with pytest.raises(ResponseValidationError):
+        asyncio.run(cache.respond(request(), NoVersionTable(), produce, List[schemas.VisualStat]))
+    assert len(cache.backend) == 0
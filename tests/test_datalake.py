@@ -0,0 +1,42 @@
+import json
+
+from src.datalake import PartitionWriter, iter_channel_messages
+
+
+def writer(tmp_path, **kwargs):
+    return PartitionWriter(base_path=str(tmp_path), date_str="2024-05-01", channel_name="chan", **kwargs)
+
+
+def test_recovers_rows_synced_before_a_crash(tmp_path):
+    killed = writer(tmp_path, batch_size=1)
+    killed.write({"message_id": 1, "views": 10})
+    killed.write({"message_id": 2, "views": 20})
+    killed.sync()
+    # The process dies mid-write: the temp file ends in a torn line and is never sealed
+    killed._file.write('{"message_id": 3, "vi')
+    killed._file.close()
+
+    resumed = writer(tmp_path)
+    assert resumed.rows == 2
+    resumed.write({"message_id": 3, "views": 30})
+    sealed = resumed.seal()
+
+    rows = list(iter_channel_messages(sealed["path"]))
+    assert [r["message_id"] for r in rows] == [1, 2, 3]
+    assert sealed["rows"] == 3
+
+
+def test_repeated_message_id_replaces_the_row(tmp_path):
+    with writer(tmp_path) as first:
+        first.write({"message_id": 1, "views": 10})
+        first.write({"message_id": 2, "views": 20})
+
+    second = writer(tmp_path)
+    assert second.write({"message_id": 2, "views": 25}) is False
+    assert second.write({"message_id": 3, "views": 30}) is True
+    sealed = second.seal()
+
+    rows = {r["message_id"]: r["views"] for r in iter_channel_messages(sealed["path"])}
+    assert rows == {1: 10, 2: 25, 3: 30}
+    with open(sealed["path"], encoding="utf-8") as f:
+        assert len([json.loads(line) for line in f if line.strip()]) == 3
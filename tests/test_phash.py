@@ -0,0 +1,43 @@
+import pytest
+
+from src.phash import MAX_DISTANCE, PHashIndex
+
+
+def test_near_duplicates_share_the_first_canonical(tmp_path):
+    index = PHashIndex(str(tmp_path / "_phash_index.json"), max_distance=3)
+    base = 0x0F0F_0F0F_0F0F_0F0F
+
+    assert index.add("chan", 1, "a.jpg", base) == "chan/1"
+    assert index.add("chan", 2, "b.jpg", base ^ 0b101) == "chan/1"  # 2 bits away
+    assert index.add("other", 7, "c.jpg", base ^ 0xFFFF) == "other/7"  # too far: its own canonical
+    assert index.canonical("chan", 2) == ("chan", 1)
+    assert index.groups() == {"chan/1": ["chan/1", "chan/2"], "other/7": ["other/7"]}
+
+
+def test_re_adding_keeps_the_assignment_and_reloads(tmp_path):
+    path = str(tmp_path / "_phash_index.json")
+    index = PHashIndex(path)
+    index.add("chan", 1, "a.jpg", 1234)
+    index.add("chan", 2, "b.jpg", 1234)
+    assert index.add("chan", 2, "b.jpg", 99999) == "chan/1"
+    index.save()
+
+    reloaded = PHashIndex(path)
+    assert reloaded.canonical("chan", 2) == ("chan", 1)
+    assert reloaded.add("chan", 3, "c.jpg", 1235) == "chan/1"
+
+
+def test_identical_hashes_never_touch_the_files(tmp_path):
+    first, second = tmp_path / "1.jpg", tmp_path / "2.jpg"
+    first.write_bytes(b"flyer, price 100 birr")
+    second.write_bytes(b"flyer, price 120 birr")
+    index = PHashIndex(str(tmp_path / "_phash_index.json"))
+
+    index.add("chan", 1, str(first), 42)
+    assert index.add("chan", 2, str(second), 42) == "chan/1"
+    assert second.read_bytes() == b"flyer, price 120 birr"
+
+
+def test_distances_the_bands_cannot_guarantee_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        PHashIndex(str(tmp_path / "_phash_index.json"), max_distance=MAX_DISTANCE + 1)
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from src.ratelimit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_acquires_are_paced_at_the_rate_after_the_burst():
+    bucket = TokenBucket(rate=50, burst=2)
+
+    async def take(n):
+        for _ in range(n):
+            await bucket.acquire()
+
+    started = time.perf_counter()
+    asyncio.run(take(7))
+    elapsed = time.perf_counter() - started
+
+    # 2 tokens up front, then 5 more at 50/s
+    assert elapsed >= 5 / 50 * 0.9
+    assert bucket.acquired == 7
+
+
+def test_penalize_halves_the_rate_and_acquires_recover_it():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=8, burst=1, recovery=1.0, clock=clock)
+
+    bucket.penalize(3)
+    assert bucket.rate == 4
+    assert bucket.max_rate == 8
+    assert bucket.flood_waits == 1
+
+    async def take(n):
+        for _ in range(n):
+            clock.now += 10  # past the FloodWait and with a full bucket: no sleeping
+            await bucket.acquire()
+
+    asyncio.run(take(3))
+    assert bucket.rate == 7
+    asyncio.run(take(5))
+    assert bucket.rate == 8  # never above max_rate
+
+
+def test_long_flood_wait_lowers_the_ceiling():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=8, burst=1, recovery=1.0, ceiling_wait=10, ceiling_backoff=0.75, clock=clock)
+
+    bucket.penalize(30)
+    assert bucket.rate == 4
+    assert bucket.max_rate == 6
+
+    async def take(n):
+        for _ in range(n):
+            clock.now += 60
+            await bucket.acquire()
+
+    asyncio.run(take(10))
+    assert bucket.rate == 6
+    assert bucket.flood_wait_seconds == 30
+
+
+def test_penalize_blocks_callers_until_the_wait_is_over():
+    bucket = TokenBucket(rate=1000, burst=5)
+    bucket.penalize(0.1)
+
+    started = time.perf_counter()
+    asyncio.run(bucket.acquire())
+
+    assert time.perf_counter() - started >= 0.09
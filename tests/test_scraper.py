@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from telethon.errors import FloodWaitError
+
+from benchmarks.fakes import FakeTelegramClient
+from src.datalake import channel_messages_ndjson_path, media_index_path, iter_channel_messages, read_checkpoints, update_checkpoint
+from src.ratelimit import TokenBucket
+from src.scraper import TODAY, scrape_all_channels, scrape_channel, scrape_day
+
+DAY = "2024-05-01"
+
+
+class FloodingClient(FakeTelegramClient):
+    """Raises one FloodWait (1s) when history iteration reaches each id in ``flood_at``."""
+
+    def __init__(self, flood_at=(), **kwargs):
+        super().__init__(photo_ratio=0.0, **kwargs)
+        self.flood_at = set(flood_at)
+        self.history_calls = []
+
+    async def iter_messages(self, entity, **kwargs):
+        self.history_calls.append({k: v for k, v in kwargs.items() if k in ("limit", "offset_id", "min_id")})
+        async for message in super().iter_messages(entity, **kwargs):
+            if message.id in self.flood_at:
+                self.flood_at.discard(message.id)
+                raise FloodWaitError(None, capture=1)
+            yield message
+
+
+def scrape(client, base_path, **kwargs):
+    return asyncio.run(scrape_channel(
+        client, "@chan", None, str(base_path), DAY,
+        message_delay=0, channel_delay=0, limiter=TokenBucket(1000, 1000), **kwargs,
+    ))
+
+
+def partition_ids(base_path):
+    path = channel_messages_ndjson_path(str(base_path), DAY, "chan")
+    return [row["message_id"] for row in iter_channel_messages(path)]
+
+
+def test_flood_wait_resumes_after_the_last_message(tmp_path):
+    client = FloodingClient(flood_at=[150, 60], messages_per_channel=300)
+
+    saved = scrape(client, tmp_path, limit=250, full=True)
+
+    ids = partition_ids(tmp_path)
+    assert saved == 250
+    assert len(ids) == len(set(ids)) == 250
+    assert set(ids) == set(range(51, 301))
+    # Each resume continues below the last processed id with the remaining limit
+    assert client.history_calls[1] == {"limit": 100, "offset_id": 151}
+    assert client.history_calls[2] == {"limit": 10, "offset_id": 61}
+    checkpoint = read_checkpoints(str(tmp_path))["chan"]
+    assert checkpoint["message_id"] == 300
+    assert "resume" not in checkpoint
+
+
+def test_killed_run_continues_from_its_resume_cursor(tmp_path):
+    scrape(FloodingClient(messages_per_channel=300), tmp_path, limit=100, full=True)
+    assert set(partition_ids(tmp_path)) == set(range(201, 301))
+    # As if the next (incremental) run had been killed 50 messages in
+    update_checkpoint(base_path=str(tmp_path), channel_name="chan", message_id=300,
+                      message_date="2024-05-01T00:00:00+00:00", resume={"offset_id": 201, "remaining": 50})
+
+    client = FloodingClient(messages_per_channel=300)
+    saved = scrape(client, tmp_path, limit=100, checkpoint=read_checkpoints(str(tmp_path))["chan"])
+
+    ids = partition_ids(tmp_path)
+    assert saved == 50
+    assert client.history_calls[0]["offset_id"] == 201
+    assert len(ids) == len(set(ids)) == 150
+    assert "resume" not in read_checkpoints(str(tmp_path))["chan"]
+
+
+class TrackingClient(FakeTelegramClient):
+    """Records how many channels are iterating their history at once."""
+
+    def __init__(self, **kwargs):
+        super().__init__(photo_ratio=0.2, request_latency=0.005, **kwargs)
+        self.active = 0
+        self.max_active = 0
+
+    async def iter_messages(self, entity, **kwargs):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            async for message in super().iter_messages(entity, **kwargs):
+                yield message
+        finally:
+            self.active -= 1
+
+
+def test_channels_share_one_limiter_within_the_concurrency_bound(tmp_path):
+    channels = [f"@chan{i}" for i in range(5)]
+    client = TrackingClient(messages_per_channel=40)
+    limiter = TokenBucket(1000, 1000)
+
+    stats = asyncio.run(scrape_all_channels(
+        client, channels, str(tmp_path), limit=40, message_delay=0, channel_delay=0,
+        concurrency=2, limiter=limiter,
+    ))
+
+    assert stats == {channel: 40 for channel in channels}
+    assert client.max_active == 2
+    # Each channel's entity lookup and history page, and every download, took from the one bucket
+    assert client.downloads > 0
+    assert limiter.acquired == 2 * len(channels) + client.downloads
+    checkpoints = read_checkpoints(str(tmp_path))
+    for channel in channels:
+        name = channel.strip("@")
+        assert checkpoints[name]["message_id"] == 40
+        path = channel_messages_ndjson_path(str(tmp_path), TODAY, name)
+        assert sorted(row["message_id"] for row in iter_channel_messages(path)) == list(range(1, 41))
+
+
+def test_a_failing_channel_still_drains_the_queued_downloads(tmp_path):
+    client = FakeTelegramClient(messages_per_channel=60, photo_ratio=0.5, download_latency=0.01)
+
+    def on_sealed(path):
+        if path.endswith("bad.ndjson"):
+            raise RuntimeError("loader down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scrape_all_channels(
+            client, ["@good", "@bad"], str(tmp_path), limit=60, message_delay=0, channel_delay=0,
+            concurrency=2, limiter=TokenBucket(1000, 1000), on_sealed=on_sealed,
+        ))
+
+    with open(media_index_path(str(tmp_path)), encoding="utf-8") as f:
+        indexed = json.load(f)
+    for channel in ("good", "bad"):
+        path = channel_messages_ndjson_path(str(tmp_path), TODAY, channel)
+        queued = [row for row in iter_channel_messages(path) if row["image_path"]]
+        assert queued
+        for row in queued:
+            assert os.path.getsize(row["image_path"]) > 0
+            assert f"{channel}/{row['message_id']}" in indexed
+
+
+def test_day_scrape_leaves_the_checkpoint_and_resume_cursor_alone(tmp_path):
+    client = FakeTelegramClient(messages_per_channel=300, photo_ratio=0.0)
+    pending = {"message_id": 100, "message_date": "2024-05-01T00:00:00+00:00",
+               "resume": {"offset_id": 61, "remaining": 40}}
+    update_checkpoint(base_path=str(tmp_path), channel_name="chan", **pending)
+    day = client._messages("chan")[250].date.date()
+
+    saved = asyncio.run(scrape_day(client, "@chan", day, base_path=str(tmp_path),
+                                   limiter=TokenBucket(1000, 1000)))
+
+    assert saved > 0
+    checkpoint = read_checkpoints(str(tmp_path))["chan"]
+    assert checkpoint["message_id"] == 100
+    assert checkpoint["resume"] == pending["resume"]
+
+
+def test_oldest_first_update_keeps_another_runs_resume_cursor(tmp_path):
+    resume = {"offset_id": 61, "remaining": 40}
+    update_checkpoint(base_path=str(tmp_path), channel_name="chan", message_id=100,
+                      message_date="2024-05-01T00:00:00+00:00", resume=resume)
+
+    update_checkpoint(base_path=str(tmp_path), channel_name="chan", message_id=120,
+                      message_date="2024-05-02T00:00:00+00:00", keep_resume=True)
+    checkpoint = read_checkpoints(str(tmp_path))["chan"]
+    assert checkpoint["message_id"] == 120
+    assert checkpoint["resume"] == resume
+
+    update_checkpoint(base_path=str(tmp_path), channel_name="chan", message_id=120,
+                      message_date="2024-05-02T00:00:00+00:00")
+    assert "resume" not in read_checkpoints(str(tmp_path))["chan"]
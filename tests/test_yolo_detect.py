@@ -0,0 +1,127 @@
+import os
+
+from benchmarks.fakes import StubModelFactory, StubYoloModel, synthetic_jpeg
+from src.phash import PHashIndex
+from src.yolo_detect import DetectionEngine, ImageJob, record_jobs, run_detection, shard_jobs
+
+
+class RecordingModel(StubYoloModel):
+    def __init__(self) -> None:
+        super().__init__(cost_ms=0)
+        self.batches = []
+
+    def __call__(self, imgs, imgsz=640, verbose=False):
+        self.batches.append(len(imgs) if isinstance(imgs, list) else 1)
+        return super().__call__(imgs, imgsz=imgsz, verbose=verbose)
+
+
+def write_images(root, channel, count, seed=0):
+    channel_dir = os.path.join(root, channel)
+    os.makedirs(channel_dir, exist_ok=True)
+    paths = []
+    for message_id in range(1, count + 1):
+        path = os.path.join(channel_dir, f"{message_id}.jpg")
+        with open(path, "wb") as f:
+            f.write(synthetic_jpeg(seed + message_id, size=64))
+        paths.append(path)
+    return paths
+
+
+def test_engine_infers_in_batches(tmp_path):
+    paths = write_images(str(tmp_path), "chan", 7)
+    model = RecordingModel()
+    engine = DetectionEngine(model, batch_size=3, decode_threads=2, imgsz=64)
+
+    jobs = [ImageJob("chan", i + 1, path) for i, path in enumerate(paths)]
+    records = list(engine.run(jobs))
+
+    assert model.batches == [3, 3, 1]
+    assert sorted(r["message_id"] for r in records) == list(range(1, 8))
+    assert all(r["detected_class"] == "bottle" for r in records)
+    assert engine.images == 7 and engine.failures == 0
+
+
+def test_second_run_is_served_from_the_cache(tmp_path):
+    images = str(tmp_path / "images")
+    write_images(images, "chan", 5)
+    cache_path = str(tmp_path / "cache.sqlite")
+
+    first_model = RecordingModel()
+    first = run_detection(images, output_csv=None, model=first_model, cache_path=cache_path,
+                          batch_size=2, imgsz=64, workers=1, dedup=False, derivatives=False)
+    second_model = RecordingModel()
+    second = run_detection(images, output_csv=None, model=second_model, cache_path=cache_path,
+                           batch_size=2, imgsz=64, workers=1, dedup=False, derivatives=False)
+
+    assert sum(first_model.batches) == 5
+    assert second_model.batches == []
+    assert len(second) == len(first) == 5
+    assert set(second["message_id"]) == set(range(1, 6))
+
+
+def test_shards_are_contiguous_and_cover_every_job():
+    jobs = [ImageJob("chan", i, f"{i}.jpg") for i in range(10)]
+    shards = shard_jobs(jobs, 4)
+
+    assert [len(shard) for shard in shards] == [3, 3, 2, 2]
+    assert [job for shard in shards for job in shard] == jobs
+    assert shard_jobs(jobs[:2], 8) == [[jobs[0]], [jobs[1]]]
+
+
+def test_sharded_run_matches_a_single_process_run(tmp_path):
+    images = str(tmp_path / "images")
+    write_images(images, "chan_a", 6)
+    write_images(images, "chan_b", 5, seed=100)
+    factory = StubModelFactory(cost_ms=0)
+    kwargs = dict(output_csv=None, model_factory=factory, cache_path=None, batch_size=2, imgsz=64,
+                  dedup=False, derivatives=False)
+
+    single = run_detection(images, workers=1, **kwargs)
+    sharded = run_detection(images, workers=2, **kwargs)
+
+    assert len(sharded) == 11
+    assert sharded.to_dict("records") == single.to_dict("records")
+    assert set(sharded["model_version"]) == set(single["model_version"]) == {"stub-0ms|imgsz=64"}
+
+
+def test_partition_records_name_the_images_to_detect(tmp_path):
+    images = str(tmp_path / "images")
+    paths = write_images(images, "chan", 4)
+    write_images(images, "other", 3)
+    records = [
+        {"channel_name": "chan", "message_id": 1, "image_path": paths[0]},
+        {"channel_name": "chan", "message_id": 2, "image_path": None},
+        {"channel_name": "chan", "message_id": 3, "image_path": paths[2]},
+        {"channel_name": "chan", "message_id": 9, "image_path": os.path.join(images, "chan", "9.jpg")},
+    ]
+    jobs = record_jobs(records)
+    assert [(job.message_id, job.path) for job in jobs] == [(1, paths[0]), (3, paths[2])]
+
+    model = RecordingModel()
+    df = run_detection(images, output_csv=None, model=model, cache_path=None, imgsz=64,
+                       dedup=False, derivatives=False, jobs=jobs)
+    assert sum(model.batches) == 2
+    assert list(zip(df["channel_name"], df["message_id"])) == [("chan", 1), ("chan", 3)]
+
+
+def test_repost_reuses_the_canonical_from_another_partition(tmp_path):
+    images = str(tmp_path / "images")
+    original = write_images(images, "origin", 1)[0]
+    repost = write_images(images, "chan", 1, seed=50)[0]
+    index = PHashIndex(os.path.join(images, "_phash_index.json"))
+    index.add("origin", 1, original, 42)
+    index.add("chan", 1, repost, 42)
+    index.save()
+    cache_path = str(tmp_path / "cache.sqlite")
+    kwargs = dict(output_csv=None, cache_path=cache_path, imgsz=64, derivatives=False)
+
+    # The original's own partition is detected first...
+    run_detection(images, model=RecordingModel(), jobs=record_jobs(
+        [{"channel_name": "origin", "message_id": 1, "image_path": original}]), **kwargs)
+    # ...so the repost's partition is served from the canonical's cached detections
+    model = RecordingModel()
+    df = run_detection(images, model=model, jobs=record_jobs(
+        [{"channel_name": "chan", "message_id": 1, "image_path": repost}]), **kwargs)
+
+    assert model.batches == []
+    assert list(zip(df["channel_name"], df["message_id"])) == [("chan", 1)]